@@ -13,15 +13,26 @@ def admin_dashboard():
         flash('Access denied. Admin privileges required.', 'error')
         return redirect(url_for('login'))
     
-    # Get all issues for dashboard
-    issues = simple_firebase_db.get_all_issues()
+    # Get one page of issues for dashboard
+    status_filter = request.args.get('status') or None
+    page = simple_firebase_db.list_issues(
+        cursor=request.args.get('cursor'),
+        status=status_filter,
+        direction=request.args.get('direction', 'next')
+    )
+    issues = page['issues']
+    status_counts = simple_firebase_db.get_issue_count_by_status()
     
     # Add username to each issue
+    users = simple_firebase_db.get_user_summaries(issue.get('student_id') for issue in issues)
     for issue in issues:
-        user = simple_firebase_db.get_user_by_id(issue['student_id'])
+        user = users.get(issue.get('student_id'))
         issue['username'] = user['username'] if user else 'Unknown'
     
-    return render_template('admin_dashboard.html', issues=issues, parse_datetime=parse_datetime)
+    return render_template('admin_dashboard.html', issues=issues,
+                           page=page, status_filter=status_filter,
+                           submission_count=status_counts.get('pending', 0),
+                           parse_datetime=parse_datetime)
 
 @admin_bp.route('/admin/create-subadmin', methods=['GET', 'POST'])
 def create_subadmin():
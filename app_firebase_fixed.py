@@ -1,11 +1,17 @@
 import os
 from datetime import datetime
-from flask import Flask, render_template, request, redirect, url_for, session, flash, g
+from flask import Flask, Response, render_template, request, redirect, url_for, session, flash, g
+import metrics
 from firebase_simple import simple_firebase_db
-from notification_service import notification_service
+from storage import StorageUnavailable
+from notification_outbox import notification_outbox
 
 app = Flask(__name__)
 app.secret_key = os.environ.get("SESSION_SECRET", "dev-secret-key-change-in-production")
+# Route accounting hooks go first so they see the DB calls of every other hook
+metrics.init_app(app)
+# Deliver queued notifications from startup, not only after the next enqueue
+notification_outbox.init_app(app)
 
 def parse_datetime(date_string):
     """Parse datetime string and return formatted string"""
@@ -20,17 +26,33 @@ def parse_datetime(date_string):
     except:
         return str(date_string)
 
+def queue_notification(kind, **kwargs):
+    """Queue a notification for background delivery and return (success, message)"""
+    if notification_outbox.enqueue(kind, **kwargs) is None:
+        return False, 'Notification queue unavailable'
+    return True, 'Notification queued'
+
 @app.before_request
 def load_logged_in_user():
+    user_id = session.get('user_id')
     username = session.get('username')
-    if username is None:
+    if user_id is None and username is None:
         g.user = None
     else:
-        user = simple_firebase_db.get_user_by_username(username)
-        if user is None:
+        if user_id is None:
+            # Session created before user ids were stored - resolve it once
+            user = simple_firebase_db.get_user_by_username(username)
+            user_id = user['id'] if user else None
+            if user_id:
+                session['user_id'] = user_id
+        
+        identity = simple_firebase_db.get_user_identity(user_id) if user_id else None
+        if identity is None:
             g.user = None
         else:
-            g.user = {"id": user["id"], "username": user["username"], "role": user["role"]}
+            g.user = dict(identity)
+            if session.get('role') != identity['role']:
+                session['role'] = identity['role']
     
     # Load system settings for all templates
     g.dynamic_settings = simple_firebase_db.get_system_settings()
@@ -108,9 +130,12 @@ def register():
             verification_code = simple_firebase_db.generate_verification_code()
             simple_firebase_db.store_verification_code(user_id, verification_code, 'registration')
             
-            # Send verification email
-            success, email_message = notification_service.send_verification_email(
-                email, first_name + ' ' + last_name, verification_code
+            # Queue verification email - a background worker sends it
+            success, _ = queue_notification(
+                'verification_email',
+                to_email=email,
+                user_name=first_name + ' ' + last_name,
+                verification_code=verification_code
             )
             
             if success:
@@ -145,7 +170,10 @@ def login():
                 flash(error_msg, 'error')
                 return render_template('login.html')
             
+            session['user_id'] = user['id']
             session['username'] = user['username']
+            session['role'] = user.get('role')
+            simple_firebase_db.remember_user_identity(user)
             success_msg = simple_firebase_db.get_setting('notification_messages.login_success') or 'Login successful!'
             flash(success_msg, 'success')
             return redirect(url_for('dashboard'))
@@ -191,8 +219,8 @@ def forgot_password():
             
             # Send reset link via email or SMS
             if reset_method == 'email':
-                success, message = notification_service.send_password_reset_email(
-                    contact_info, user_name, reset_url
+                success, message = queue_notification(
+                    'password_reset_email', to_email=contact_info, user_name=user_name, reset_url=reset_url
                 )
                 if success:
                     flash('Password reset link has been sent to your email address. Please check your inbox and spam folder.', 'success')
@@ -200,8 +228,8 @@ def forgot_password():
                     flash(f'Failed to send email: {message}. Please try again or contact IT support.', 'error')
                     return render_template('forgot_password.html')
             else:
-                success, message = notification_service.send_password_reset_sms(
-                    contact_info, user_name, reset_url
+                success, message = queue_notification(
+                    'password_reset_sms', phone_number=contact_info, user_name=user_name, reset_url=reset_url
                 )
                 if success:
                     flash('Password reset link has been sent to your phone via SMS. It may take a few minutes to arrive.', 'success')
@@ -226,26 +254,17 @@ def verify_email(user_id):
             return render_template('verify_email.html', user_id=user_id)
         
         # Verify the code
-        verified_user_id = simple_firebase_db.verify_code(verification_code, 'registration')
+        verified_user_id = simple_firebase_db.verify_code(verification_code, 'registration', user_id=user_id)
         
         if verified_user_id == user_id:
             # Mark user as email verified
-            user = simple_firebase_db.get_user_by_id(user_id)
-            if user:
-                user['email_verified'] = True
-                user['verified_at'] = datetime.now().isoformat()
-                success = simple_firebase_db._make_request(f'users/{user_id}', 'PUT', user)
-                
-                if success:
-                    # Also mark user as verified in the system
-                    simple_firebase_db._make_request(f'users/{user_id}', 'PUT', {'email_verified': True})
-                    success_msg = simple_firebase_db.get_setting('notification_messages.email_verified_success') or 'Email verified successfully! You can now log in.'
-                    flash(success_msg, 'success')
-                    return redirect(url_for('login'))
-                else:
-                    flash('Failed to update verification status. Please try again.', 'error')
+            success, message = simple_firebase_db.mark_email_verified(user_id)
+            if success:
+                success_msg = simple_firebase_db.get_setting('notification_messages.email_verified_success') or 'Email verified successfully! You can now log in.'
+                flash(success_msg, 'success')
+                return redirect(url_for('login'))
             else:
-                flash('User not found.', 'error')
+                flash(f'{message}. Please try again.', 'error')
         else:
             flash('Invalid or expired verification code. Please try again.', 'error')
         
@@ -303,31 +322,45 @@ def dashboard():
     
     if g.user['role'] == 'supaadmin' or g.user['role'] == 'subadmin':
         # Admin dashboard - simplified version
-        all_issues = simple_firebase_db.get_all_issues()
-        pending_issues = simple_firebase_db.get_issues_by_status('pending')
-        in_progress_issues = simple_firebase_db.get_issues_by_status('in_progress')
-        resolved_issues = simple_firebase_db.get_issues_by_status('resolved')
+        status_filter = request.args.get('status') or None
+        page = simple_firebase_db.list_issues(
+            cursor=request.args.get('cursor'),
+            status=status_filter,
+            direction=request.args.get('direction', 'next')
+        )
+        all_issues = page['issues']
+        status_counts = simple_firebase_db.get_issue_count_by_status()
         
         # Get user info for each issue
+        students = simple_firebase_db.get_user_summaries(issue.get('student_id') for issue in all_issues)
         for issue in all_issues:
-            student = simple_firebase_db.get_user_by_id(issue['student_id'])
+            student = students.get(issue.get('student_id'))
             issue['student_username'] = student['username'] if student else 'Unknown'
             issue['created_at_formatted'] = parse_datetime(issue.get('created_at'))
         
         stats = {
-            'total_issues': len(all_issues),
-            'pending_issues': len(pending_issues),
-            'in_progress_issues': len(in_progress_issues),
-            'resolved_issues': len(resolved_issues)
+            'total_issues': sum(status_counts.values()),
+            'pending_issues': status_counts.get('pending', 0),
+            'in_progress_issues': status_counts.get('in_progress', 0),
+            'resolved_issues': status_counts.get('resolved', 0)
         }
         
         return render_template('dashboard_admin.html', 
                              issues=all_issues, 
+                             page=page,
+                             status_filter=status_filter,
                              stats=stats,
                              user=g.user)
     else:
         # Student dashboard - simplified version
-        student_issues = simple_firebase_db.get_issues_by_student(g.user['id'])
+        status_filter = request.args.get('status') or None
+        page = simple_firebase_db.paginate_issues(
+            simple_firebase_db.get_issues_by_student(g.user['id']),
+            cursor=request.args.get('cursor'),
+            status=status_filter,
+            direction=request.args.get('direction', 'next')
+        )
+        student_issues = page['issues']
         
         # Format dates
         for issue in student_issues:
@@ -335,6 +368,8 @@ def dashboard():
         
         return render_template('dashboard_student.html', 
                              issues=student_issues, 
+                             page=page,
+                             status_filter=status_filter,
                              user=g.user)
 
 @app.route('/submit_issue', methods=['GET', 'POST'])
@@ -410,7 +445,7 @@ def list_users():
         flash('You do not have permission to view users.', 'error')
         return redirect(url_for('dashboard'))
     
-    users = simple_firebase_db.get_all_users()
+    users = simple_firebase_db.list_user_summaries()
     role_counts = simple_firebase_db.get_user_count_by_role()
     
     return render_template('users_list.html', 
@@ -469,12 +504,45 @@ def statistics():
     
     user_stats = simple_firebase_db.get_user_count_by_role()
     issue_stats = simple_firebase_db.get_issue_count_by_status()
+    category_stats = simple_firebase_db.get_issue_count_by_category()
     
     return render_template('statistics.html', 
                          user_stats=user_stats,
                          issue_stats=issue_stats,
+                         category_stats=category_stats,
+                         user=g.user)
+
+@app.route('/admin/outbox')
+def outbox_status():
+    if not g.user or g.user['role'] not in ['admin', 'subadmin', 'supaadmin']:
+        flash('You do not have permission to view the notification queue.', 'error')
+        return redirect(url_for('dashboard'))
+    
+    return render_template('outbox.html',
+                         queue_stats=notification_outbox.get_queue_stats(),
+                         dead_letters=notification_outbox.get_dead_letters(),
                          user=g.user)
 
+@app.route('/admin/outbox/requeue/<int:job_id>', methods=['POST'])
+def requeue_notification(job_id):
+    if not g.user or g.user['role'] not in ['admin', 'subadmin', 'supaadmin']:
+        flash('You do not have permission to manage the notification queue.', 'error')
+        return redirect(url_for('dashboard'))
+    
+    if notification_outbox.requeue(job_id):
+        flash('Notification queued for another attempt.', 'success')
+    else:
+        flash('Notification not found in the dead-letter list, or its link or code has expired.', 'error')
+    return redirect(url_for('outbox_status'))
+
+@app.route('/metrics')
+def metrics_endpoint():
+    # Admins in the browser, or a scraper holding METRICS_TOKEN
+    is_admin = g.user and g.user['role'] in ['admin', 'subadmin', 'supaadmin']
+    if not is_admin and not metrics.token_authorized(request.headers.get('Authorization')):
+        return Response('Forbidden\n', status=403, mimetype='text/plain')
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
 @app.errorhandler(404)
 def not_found_error(error):
     return render_template('404.html'), 404
@@ -483,5 +551,41 @@ def not_found_error(error):
 def internal_error(error):
     return render_template('500.html'), 500
 
+@app.errorhandler(StorageUnavailable)
+def storage_unavailable_error(error):
+    # Fail fast while the database is unreachable instead of acting on missing data
+    response = app.make_response((render_template('503.html'), 503))
+    response.headers['Retry-After'] = '30'
+    return response
+
+@app.cli.command('rebuild-indexes')
+def rebuild_indexes_command():
+    """Rebuild the user lookups and check the per-student issue index rule is deployed"""
+    failed = False
+    for rebuild in (simple_firebase_db.rebuild_user_indexes, simple_firebase_db.rebuild_student_issue_index):
+        success, message = rebuild()
+        print(f"{'✅' if success else '❌'} {message}")
+        failed = failed or not success
+    if failed:
+        raise SystemExit(1)
+
+@app.cli.command('reconcile-stats')
+def reconcile_stats_command():
+    """Recompute the /stats counters from users and issues and repair drift"""
+    success, message = simple_firebase_db.reconcile_counters()
+    print(f"{'✅' if success else '❌'} {message}")
+    if not success:
+        raise SystemExit(1)
+
+@app.cli.command('sweep-expired')
+def sweep_expired_command():
+    """Delete used and expired verification codes and password reset tokens"""
+    failed = False
+    for success, message in simple_firebase_db.sweep_expired_records():
+        print(f"{'✅' if success else '❌'} {message}")
+        failed = failed or not success
+    if failed:
+        raise SystemExit(1)
+
 if __name__ == '__main__':
     app.run(debug=True)
@@ -0,0 +1,362 @@
+"""
+Benchmark: data-access methods at several dataset sizes.
+
+Seeds synthetic users and issues into the local Firebase emulator (or a
+temporary SQLite database with --backend sql) and times the public storage
+methods at each scale. For every method it reports round trips, bytes
+transferred, median and first-call wall time, and peak Python memory
+(tracemalloc). Results are written to a JSON file; pass --compare with an
+earlier file to see the change per method and flag regressions.
+
+Run from the project root:
+    python -m benchmarks.bench_data_access --scales 1000,10000,100000
+    python -m benchmarks.bench_data_access --scales 1000 --compare bench_data_access.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+import requests
+from werkzeug.security import generate_password_hash
+
+from firebase_emulator import STATS_PATH
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+STATUSES = ['pending', 'in_progress', 'resolved']
+CATEGORIES = ['academic', 'exams_grades', 'technical', 'administration', 'facilities', 'welfare', 'other']
+PASSWORD = 'benchmark-password'
+
+
+def make_dataset(scale, seed=42):
+    """Synthetic users and issues as {id: record} dicts (one issue per user on average)"""
+    rng = random.Random(seed)
+    # Hashing is deliberately slow, so every user shares one hash
+    password_hash = generate_password_hash(PASSWORD)
+    started = datetime(2024, 1, 1)
+
+    users = {}
+    for number in range(scale):
+        users[f'user{number:07d}'] = {
+            'username': f'student{number}',
+            'password_hash': password_hash,
+            'role': 'student' if number % 50 else 'subadmin',
+            'created_at': (started + timedelta(minutes=number)).isoformat(),
+            'first_name': f'First{number}',
+            'last_name': f'Last{number}',
+            'email': f'student{number}@ktu.edu.gh',
+            'phone': f'+23320{number:07d}',
+            'student_id': f'CS{number:07d}',
+            'level': rng.choice(['100', '200', '300', '400']),
+            'department': rng.choice(['Computer Science', 'Information Technology']),
+            'profile_complete': True
+        }
+
+    user_ids = list(users)
+    issues = {}
+    for number in range(scale):
+        issues[f'issue{number:07d}'] = {
+            'student_id': rng.choice(user_ids),
+            'subject': f'Issue {number}',
+            'category': rng.choice(CATEGORIES),
+            'message': 'Lorem ipsum dolor sit amet, consectetur adipiscing elit. ' * 3,
+            'status': rng.choice(STATUSES),
+            'response': '',
+            'created_at': (started + timedelta(seconds=37 * number)).isoformat()
+        }
+    return users, issues
+
+
+class FirebaseTarget:
+    """SimpleFirebaseDB talking to a FirebaseEmulator in a child process.
+
+    Keeping the emulator out of this process means tracemalloc only sees
+    client-side allocations.
+    """
+
+    name = 'firebase'
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.directory = tempfile.TemporaryDirectory()
+        self.process = None
+        self.url = None
+        self.session = requests.Session()
+        self.db = None
+
+    def seed(self, users, issues):
+        data_path = os.path.join(self.directory.name, 'seed.json')
+        with open(data_path, 'w', encoding='utf-8') as data_file:
+            json.dump({'users': users, 'issues': issues}, data_file)
+
+        with socket.socket() as probe:
+            probe.bind(('127.0.0.1', 0))
+            port = probe.getsockname()[1]
+        self.process = subprocess.Popen(
+            [sys.executable, '-m', 'firebase_emulator', '--port', str(port), '--data', data_path,
+             '--latency-ms', str(self.latency * 1000), '--rules', 'database.rules.json'],
+            cwd=PROJECT_ROOT, stdout=subprocess.DEVNULL
+        )
+        self.url = f'http://127.0.0.1:{port}/'
+        deadline = time.monotonic() + 120
+        while True:
+            try:
+                self.session.get(self.url + STATS_PATH.lstrip('/'), timeout=1)
+                break
+            except requests.ConnectionError:
+                if time.monotonic() > deadline or self.process.poll() is not None:
+                    raise RuntimeError('Firebase emulator did not start')
+                time.sleep(0.1)
+
+        import firebase_simple
+        firebase_simple.FIREBASE_URL = self.url
+        self.db = firebase_simple.SimpleFirebaseDB()
+        for build in (self.db.rebuild_user_indexes, self.db.rebuild_student_issue_index,
+                      self.db.reconcile_counters):
+            success, message = build()
+            if not success:
+                raise RuntimeError(message)
+        self.db.initialize_default_settings()
+
+    def reset_counters(self):
+        self.session.delete(self.url + STATS_PATH.lstrip('/'))
+
+    def counters(self):
+        stats = self.session.get(self.url + STATS_PATH.lstrip('/')).json()
+        return stats['requests'], stats['bytes_in'] + stats['bytes_out']
+
+    def close(self):
+        if self.process is not None:
+            self.process.terminate()
+            self.process.wait()
+        self.session.close()
+        self.directory.cleanup()
+
+
+class SQLTarget:
+    """SQLStorage on a temporary SQLite file (no network, so no round trips or bytes)"""
+
+    name = 'sql'
+
+    def __init__(self, latency):
+        self.directory = tempfile.TemporaryDirectory()
+        self.db = None
+
+    def seed(self, users, issues):
+        import sql_storage
+        from sqlalchemy import insert
+        path = os.path.join(self.directory.name, f'bench-{len(users)}.db')
+        self.db = sql_storage.SQLStorage(f'sqlite:///{path}')
+        with self.db.engine.begin() as conn:
+            conn.execute(insert(sql_storage.users), [
+                dict(id=user_id, data=user, **sql_storage._columns(user, sql_storage.USER_COLUMNS))
+                for user_id, user in users.items()
+            ])
+            conn.execute(insert(sql_storage.issues), [
+                dict(id=issue_id, data=issue, **sql_storage._columns(issue, sql_storage.ISSUE_COLUMNS))
+                for issue_id, issue in issues.items()
+            ])
+        self.db.initialize_default_settings()
+
+    def reset_counters(self):
+        pass
+
+    def counters(self):
+        return None, None
+
+    def close(self):
+        self.directory.cleanup()
+
+
+def method_specs(db, users, issues, rng):
+    """(name, setup, call) for each benchmarked method; setup returns call args"""
+    user_ids = list(users)
+    issue_ids = list(issues)
+    pick_user = lambda: users[rng.choice(user_ids)]
+
+    def fresh_code():
+        user_id = rng.choice(user_ids)
+        code = db.generate_verification_code()
+        db.store_verification_code(user_id, code)
+        return code, 'registration', user_id
+
+    def fresh_token():
+        return (db.create_password_reset_token(rng.choice(user_ids)),)
+
+    def listing_page():
+        return (20, None, None)
+
+    def deep_page():
+        first = db.list_issues(page_size=20)
+        return (20, first['next_cursor'], None)
+
+    return [
+        ('get_user_by_username', lambda: (pick_user()['username'],), db.get_user_by_username),
+        ('get_user_by_email', lambda: (pick_user()['email'],), db.get_user_by_email),
+        ('get_user_by_id', lambda: (rng.choice(user_ids),), db.get_user_by_id),
+        ('get_users_by_ids', lambda: (rng.sample(user_ids, 20),), db.get_users_by_ids),
+        ('verify_password', lambda: (pick_user()['username'], PASSWORD), db.verify_password),
+        ('get_issue_by_id', lambda: (rng.choice(issue_ids),), db.get_issue_by_id),
+        ('get_issues_by_student', lambda: (issues[rng.choice(issue_ids)]['student_id'],), db.get_issues_by_student),
+        ('list_issues', listing_page, db.list_issues),
+        ('list_issues_page_2', deep_page, db.list_issues),
+        ('list_issues_status', lambda: (20, None, 'resolved'), db.list_issues),
+        ('get_issue_count_by_status', lambda: (), db.get_issue_count_by_status),
+        ('get_issue_count_by_category', lambda: (), db.get_issue_count_by_category),
+        ('get_user_count_by_role', lambda: (), db.get_user_count_by_role),
+        ('get_setting', lambda: ('system_info.name',), db.get_setting),
+        ('verify_code', fresh_code, db.verify_code),
+        ('verify_reset_token', fresh_token, db.verify_reset_token),
+        ('create_issue', lambda: (rng.choice(user_ids), 'Benchmark', 'academic', 'Body'), db.create_issue),
+        ('update_issue_status', lambda: (rng.choice(issue_ids), rng.choice(STATUSES), 'Noted'), db.update_issue_status),
+        ('get_all_issues', lambda: (), db.get_all_issues),
+        ('get_issue_summary', lambda: (), db.get_issue_summary),
+        ('get_all_users', lambda: (), db.get_all_users),
+    ]
+
+
+def run_method(target, setup, call, repeat):
+    """Time call(*setup()) repeat times; then measure peak memory of one more call"""
+    timings = []
+    round_trips = transferred = 0
+    for _ in range(repeat):
+        args = setup()
+        target.reset_counters()
+        started = time.perf_counter()
+        call(*args)
+        timings.append((time.perf_counter() - started) * 1000)
+        trips, size = target.counters()
+        if trips is not None:
+            round_trips += trips
+            transferred += size
+
+    args = setup()
+    tracemalloc.start()
+    call(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    counted = target.counters()[0] is not None
+    return {
+        'first_ms': round(timings[0], 3),
+        'median_ms': round(statistics.median(timings), 3),
+        'round_trips': round(round_trips / repeat, 2) if counted else None,
+        'bytes': int(transferred / repeat) if counted else None,
+        'peak_kib': round(peak / 1024, 1)
+    }
+
+
+def run_scale(backend, scale, repeat, latency, bulk_repeat):
+    target = (SQLTarget if backend == 'sql' else FirebaseTarget)(latency)
+    try:
+        started = time.perf_counter()
+        users, issues = make_dataset(scale)
+        target.seed(users, issues)
+        print(f"\n== {backend} @ {scale:,} users / {scale:,} issues (seeded in {time.perf_counter() - started:.1f}s)")
+        print(f"  {'method':<28} {'median ms':>10} {'first ms':>10} {'trips':>7} {'bytes':>12} {'peak KiB':>10}")
+
+        results = {}
+        rng = random.Random(7)
+        for name, setup, call in method_specs(target.db, users, issues, rng):
+            # Whole-collection reads are slow at scale; fewer repeats keep runs practical
+            count = bulk_repeat if name.startswith('get_all') or name == 'get_issue_summary' else repeat
+            result = run_method(target, setup, call, count)
+            results[name] = result
+            trips = '-' if result['round_trips'] is None else f"{result['round_trips']:g}"
+            size = '-' if result['bytes'] is None else f"{result['bytes']:,}"
+            print(f"  {name:<28} {result['median_ms']:>10.2f} {result['first_ms']:>10.2f} {trips:>7} {size:>12} "
+                  f"{result['peak_kib']:>10,.1f}")
+        return results
+    finally:
+        target.close()
+
+
+def compare(current, baseline, threshold):
+    """Print per-method changes against a baseline run; return the regressions"""
+    regressions = []
+    print(f"\n== Comparison with baseline ({baseline['meta'].get('timestamp', '?')})")
+    for scale, methods in current['results'].items():
+        old_methods = baseline['results'].get(scale)
+        if not old_methods:
+            print(f"  scale {scale}: not in baseline")
+            continue
+        print(f"  scale {scale}:")
+        for name, result in methods.items():
+            old = old_methods.get(name)
+            if not old:
+                continue
+            change = (result['median_ms'] - old['median_ms']) / old['median_ms'] if old['median_ms'] else 0.0
+            flags = []
+            if change > threshold:
+                flags.append('slower')
+            if (result['round_trips'] or 0) > (old['round_trips'] or 0):
+                flags.append('more round trips')
+            if (result['bytes'] or 0) > (old['bytes'] or 0) * (1 + threshold):
+                flags.append('more bytes')
+            if flags:
+                regressions.append((scale, name, flags))
+            print(f"    {name:<28} {old['median_ms']:>9.2f} -> {result['median_ms']:>9.2f} ms ({change:+.0%})"
+                  f"  trips {old['round_trips']} -> {result['round_trips']}"
+                  f"{'  ⚠️ ' + ', '.join(flags) if flags else ''}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--scales', default='1000,10000,100000', help='comma-separated record counts')
+    parser.add_argument('--backend', choices=['firebase', 'sql'], default='firebase')
+    parser.add_argument('--repeat', type=int, default=20, help='calls per method')
+    parser.add_argument('--bulk-repeat', type=int, default=3, help='calls per whole-collection method')
+    parser.add_argument('--latency-ms', type=float, default=0.0, help='emulated network latency per request')
+    parser.add_argument('--output', default='bench_data_access.json')
+    parser.add_argument('--compare', help='earlier results file to compare against')
+    parser.add_argument('--threshold', type=float, default=0.2, help='slowdown that counts as a regression')
+    parser.add_argument('--fail-on-regression', action='store_true')
+    args = parser.parse_args()
+
+    # The benchmark targets are built explicitly; keep the import-time global off the network
+    os.environ.setdefault('FIREBASE_SWEEP_INTERVAL', '0')
+    os.environ.setdefault('FIREBASE_URL', 'http://127.0.0.1:9/')
+    # Measure Firebase round trips, not reads served from another run's shared cache file
+    os.environ.setdefault('SHARED_CACHE_PATH', '')
+    report = {
+        'meta': {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'backend': args.backend,
+            'latency_ms': args.latency_ms,
+            'repeat': args.repeat,
+            'python': platform.python_version(),
+            'platform': platform.platform()
+        },
+        'results': {}
+    }
+    for scale in (int(value) for value in args.scales.split(',')):
+        report['results'][str(scale)] = run_scale(args.backend, scale, args.repeat, args.latency_ms / 1000,
+                                                  args.bulk_repeat)
+
+    with open(args.output, 'w', encoding='utf-8') as output:
+        json.dump(report, output, indent=2)
+    print(f"\nResults written to {args.output}")
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as baseline_file:
+            regressions = compare(report, json.load(baseline_file), args.threshold)
+        if regressions:
+            print(f"\n⚠️ {len(regressions)} regression(s)")
+            if args.fail_on_regression:
+                sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
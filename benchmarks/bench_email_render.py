@@ -0,0 +1,83 @@
+"""
+Benchmark: email body rendering.
+
+Compares rendering the Jinja email templates from scratch for every message
+with filling the skeletons EmailTemplates pre-renders at startup, and reports
+the cost of building the full MIME message on top. No SMTP connection is made.
+
+Run from the project root:
+    python -m benchmarks.bench_email_render --messages 5000
+"""
+
+import argparse
+import datetime
+import time
+
+from markupsafe import Markup
+
+from email_templates import EmailTemplates, SUPPORT_EMAIL
+
+
+def make_recipients(count):
+    return [{
+        'user_name': f'Student {number} <O\'Brien & Co>',
+        'reset_url': f'https://portal.ktu.edu.gh/reset_password/{number:032x}?a=1&b=2',
+    } for number in range(count)]
+
+
+def render_per_call(templates, recipients):
+    """Look up and render both templates for every message (no skeletons)"""
+    env = templates.env
+    with open(f'{templates.template_dir}/email.css', encoding='utf-8') as css_file:
+        css = Markup(css_file.read())
+    for values in recipients:
+        context = dict(values, email_css=css, support_email=SUPPORT_EMAIL,
+                       copyright_year=datetime.date.today().year)
+        env.get_template('password_reset.html').render(**context)
+        env.get_template('password_reset.txt').render(**context)
+
+
+def render_skeletons(templates, recipients):
+    for values in recipients:
+        templates.render('password_reset', **values)
+
+
+def render_and_build_mime(service_like, templates, recipients):
+    for values in recipients:
+        html, text = templates.render('password_reset', **values)
+        service_like._build_email('student@example.com', 'Password Reset', html, text)
+
+
+def timed(label, func, *args, messages):
+    started = time.perf_counter()
+    func(*args)
+    elapsed = time.perf_counter() - started
+    print(f"  {label:<32} {elapsed * 1000:9.1f} ms  {elapsed / messages * 1e6:8.1f} µs/msg")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--messages', type=int, default=5000)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    templates = EmailTemplates()
+    print(f"Startup compile: {(time.perf_counter() - started) * 1000:.1f} ms")
+
+    # _build_email only needs from_email, so avoid constructing the real service
+    from notification_service import NotificationService
+    service_like = NotificationService.__new__(NotificationService)
+    service_like.from_email = 'noreply@ktu.edu.gh'
+
+    recipients = make_recipients(args.messages)
+    print(f"Rendering {args.messages} password reset emails:")
+    per_call = timed('jinja render per message', render_per_call, templates, recipients, messages=args.messages)
+    skeleton = timed('precompiled skeleton', render_skeletons, templates, recipients, messages=args.messages)
+    timed('skeleton + MIME build', render_and_build_mime, service_like, templates, recipients,
+          messages=args.messages)
+    print(f"Skeleton speedup: {per_call / skeleton:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+"""
+Benchmark: admin dashboard issue aggregation.
+
+Compares the old dashboard data path (get_all_issues plus three
+get_issues_by_status calls) with a single get_issue_summary call. Firebase is
+replaced by an in-memory JSON payload so the numbers show round trips and the
+CPU spent decoding, sorting and counting, without network noise.
+
+Run from the project root:
+    python -m benchmarks.bench_issue_aggregation --issues 2000
+"""
+
+import argparse
+import json
+import os
+import random
+import time
+from datetime import datetime, timedelta
+
+# Count Firebase round trips, not reads served from a shared cache file (set before the import builds caches)
+os.environ.setdefault('SHARED_CACHE_PATH', '')
+
+from firebase_simple import SimpleFirebaseDB
+
+STATUSES = ['pending', 'in_progress', 'resolved']
+CATEGORIES = ['academic', 'exams_grades', 'technical', 'administration', 'facilities', 'welfare', 'other']
+
+
+class InMemoryFirebaseDB(SimpleFirebaseDB):
+    """SimpleFirebaseDB that serves GETs from a pre-encoded JSON tree and counts calls"""
+
+    def __init__(self, tree):
+        super().__init__()
+        # Every read must reach _make_request, even if a shared cache is configured
+        self._issue_cache = None
+        self._payloads = {key: json.dumps(value) for key, value in tree.items()}
+        self.round_trips = 0
+
+    def _make_request(self, endpoint, method='GET', data=None):
+        self.round_trips += 1
+        payload = self._payloads.get(endpoint)
+        # Decode on every call, as a real response would be
+        return json.loads(payload) if payload is not None else None
+
+
+def make_issues(count, seed=42):
+    """Build a synthetic issues tree"""
+    rng = random.Random(seed)
+    start = datetime(2025, 1, 1)
+    issues = {}
+    for i in range(count):
+        issues[f'-issue{i:07d}'] = {
+            'student_id': f'-user{rng.randrange(max(count // 4, 1)):07d}',
+            'subject': f'Issue {i}',
+            'category': rng.choice(CATEGORIES),
+            'message': 'Lorem ipsum dolor sit amet ' * 8,
+            'status': rng.choice(STATUSES),
+            'response': '',
+            'created_at': (start + timedelta(minutes=rng.randrange(500000))).isoformat()
+        }
+    return issues
+
+
+def old_dashboard(db):
+    all_issues = db.get_all_issues()
+    pending = db.get_issues_by_status('pending')
+    in_progress = db.get_issues_by_status('in_progress')
+    resolved = db.get_issues_by_status('resolved')
+    return len(all_issues), len(pending), len(in_progress), len(resolved)
+
+
+def new_dashboard(db):
+    summary = db.get_issue_summary()
+    counts = summary['status_counts']
+    return (len(summary['issues']), counts.get('pending', 0),
+            counts.get('in_progress', 0), counts.get('resolved', 0))
+
+
+def measure(db, fn, repeat):
+    db.round_trips = 0
+    started = time.process_time()
+    for _ in range(repeat):
+        result = fn(db)
+    cpu = (time.process_time() - started) / repeat
+    return result, db.round_trips // repeat, cpu
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--issues', type=int, default=2000)
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args()
+
+    db = InMemoryFirebaseDB({'issues': make_issues(args.issues)})
+    old_result, old_trips, old_cpu = measure(db, old_dashboard, args.repeat)
+    new_result, new_trips, new_cpu = measure(db, new_dashboard, args.repeat)
+    assert old_result == new_result, (old_result, new_result)
+
+    print(f"Issues: {args.issues} (mean of {args.repeat} runs)")
+    print(f"{'path':<28}{'round trips':>12}{'cpu ms':>10}")
+    print(f"{'get_all + 3x by_status':<28}{old_trips:>12}{old_cpu * 1000:>10.1f}")
+    print(f"{'get_issue_summary':<28}{new_trips:>12}{new_cpu * 1000:>10.1f}")
+    print(f"Round trips: {old_trips / new_trips:.1f}x fewer, CPU: {old_cpu / new_cpu:.1f}x less")
+
+
+if __name__ == '__main__':
+    main()
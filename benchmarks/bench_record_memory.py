@@ -0,0 +1,128 @@
+"""
+Benchmark: memory per cached user and issue record.
+
+Builds synthetic student profiles (~25 fields, as a fully completed profile
+holds) and issues, decodes them from JSON as a Firebase read would, and
+measures the Python heap held by plain dicts versus the compact
+UserRecord/IssueRecord forms kept by the user cache and the issue mirror.
+Also times reading a hot field (username/status) and a cold one
+(phone/message) across every record.
+
+Run from the project root:
+    python -m benchmarks.bench_record_memory --students 50000
+"""
+
+import argparse
+import gc
+import json
+import random
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+from records import IssueRecord, UserRecord
+
+STATUSES = ['pending', 'in_progress', 'resolved']
+CATEGORIES = ['academic', 'exams_grades', 'technical', 'administration', 'facilities', 'welfare', 'other']
+DEPARTMENTS = ['Computer Science', 'Information Technology', 'Computer Engineering']
+
+
+def make_users(count, seed=42):
+    """Synthetic /users tree with complete student profiles"""
+    rng = random.Random(seed)
+    start = datetime(2024, 1, 1)
+    users = {}
+    for i in range(count):
+        users[f'-user{i:07d}'] = {
+            'username': f'student{i}',
+            'password_hash': f'scrypt:32768:8:1${i:016x}$' + '0123456789abcdef' * 8,
+            'role': 'student',
+            'created_at': (start + timedelta(minutes=i)).isoformat(),
+            'updated_at': (start + timedelta(minutes=i, days=3)).isoformat(),
+            'first_name': f'First{i}',
+            'last_name': f'Last{i}',
+            'email': f'student{i}@ktu.edu.gh',
+            'email_verified': True,
+            'verified_at': (start + timedelta(minutes=i + 5)).isoformat(),
+            'phone': f'+23320{i:07d}',
+            'student_id': f'B{i:09d}',
+            'level': rng.choice(['100', '200', '300', '400']),
+            'department': rng.choice(DEPARTMENTS),
+            'programme': 'BTech ' + rng.choice(DEPARTMENTS),
+            'gender': rng.choice(['M', 'F']),
+            'date_of_birth': f'{rng.randrange(1998, 2006)}-0{rng.randrange(1, 10)}-1{rng.randrange(10)}',
+            'address': f'{rng.randrange(1, 200)} Station Road, Koforidua',
+            'hall': rng.choice(['Hall A', 'Hall B', 'Off campus']),
+            'emergency_contact_name': f'Guardian {i}',
+            'emergency_contact_phone': f'+23324{i:07d}',
+            'emergency_contact_relationship': rng.choice(['Parent', 'Sibling', 'Guardian']),
+            'nationality': 'Ghanaian',
+            'profile_complete': True
+        }
+    return users
+
+
+def make_issues(count, students, seed=42):
+    """Synthetic /issues tree spread over the given number of students"""
+    rng = random.Random(seed)
+    start = datetime(2025, 1, 1)
+    issues = {}
+    for i in range(count):
+        issues[f'-issue{i:07d}'] = {
+            'student_id': f'-user{rng.randrange(students):07d}',
+            'subject': f'Issue {i}',
+            'category': rng.choice(CATEGORIES),
+            'message': 'Lorem ipsum dolor sit amet ' * 8,
+            'status': rng.choice(STATUSES),
+            'response': '',
+            'created_at': (start + timedelta(minutes=rng.randrange(500000))).isoformat()
+        }
+    return issues
+
+
+def measure(build):
+    """Return (result, bytes still allocated by build())"""
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, size
+
+
+def time_reads(values, field):
+    started = time.perf_counter()
+    for value in values:
+        value.get(field)
+    return (time.perf_counter() - started) * 1000
+
+
+def compare(label, tree, record_type, hot_field, cold_field):
+    payload = json.dumps(tree)
+    count = len(tree)
+    plain, plain_bytes = measure(lambda: json.loads(payload))
+    compact, compact_bytes = measure(
+        lambda: {key: record_type.from_dict(value, key) for key, value in json.loads(payload).items()}
+    )
+
+    print(f"\n{label}: {count:,} records, {len(payload) / count:,.0f} JSON bytes each")
+    print(f"  {'':<16} {'bytes/record':>14} {'total MiB':>10} {hot_field + ' ms':>16} {cold_field + ' ms':>16}")
+    for name, values, size in (('dict', plain, plain_bytes), (record_type.__name__, compact, compact_bytes)):
+        hot = time_reads(values.values(), hot_field)
+        cold = time_reads(values.values(), cold_field)
+        print(f"  {name:<16} {size / count:>14,.0f} {size / 2 ** 20:>10,.1f} {hot:>16.1f} {cold:>16.1f}")
+    print(f"  saving: {1 - compact_bytes / plain_bytes:.0%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--students', type=int, default=50000)
+    parser.add_argument('--issues', type=int, default=None, help='defaults to the student count')
+    args = parser.parse_args()
+
+    compare('Users', make_users(args.students), UserRecord, 'username', 'phone')
+    compare('Issues', make_issues(args.issues or args.students, args.students), IssueRecord, 'status', 'message')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""
+Precompiled email templates.
+
+Email bodies live as Jinja files under ``templates/email/``. At startup every
+template is compiled once and rendered with the static context (shared CSS,
+support address, year) and a placeholder for each per-message variable. The
+result is a skeleton: a list of literal text chunks with holes for the
+variables. Sending a message then only escapes the variables and joins the
+chunks, instead of re-rendering the whole document per call.
+"""
+
+import datetime
+import os
+from markupsafe import Markup, escape
+from jinja2 import Environment, FileSystemLoader, StrictUndefined
+
+EMAIL_TEMPLATE_DIR = os.environ.get(
+    'EMAIL_TEMPLATE_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates', 'email')
+)
+SUPPORT_EMAIL = os.environ.get('SUPPORT_EMAIL', 'itsupport@ktu.edu.gh')
+
+# Marks a variable hole in a rendered skeleton; never appears in template text
+_HOLE = '\x00'
+
+
+class EmailSkeleton:
+    """A template pre-rendered down to literal chunks and variable holes"""
+
+    def __init__(self, name, rendered, variables, autoescape):
+        self.name = name
+        self.variables = tuple(variables)
+        self.autoescape = autoescape
+        # Even indexes are literal text, odd indexes are variable names
+        self._parts = rendered.split(_HOLE)
+
+    def render(self, **values):
+        missing = [name for name in self.variables if name not in values]
+        if missing:
+            raise KeyError(f"{self.name} needs {', '.join(missing)}")
+        parts = list(self._parts)
+        for index in range(1, len(parts), 2):
+            value = values[parts[index]]
+            parts[index] = str(escape(value)) if self.autoescape else str(value)
+        return ''.join(parts)
+
+
+class EmailTemplates:
+    """Compiles each email's HTML and text bodies once and renders them on demand"""
+
+    # Email name -> per-message variables
+    EMAILS = {
+        'password_reset': ('user_name', 'reset_url'),
+        'verification': ('user_name', 'verification_code'),
+    }
+
+    def __init__(self, template_dir=EMAIL_TEMPLATE_DIR, static_context=None):
+        self.template_dir = template_dir
+        self.env = Environment(
+            loader=FileSystemLoader(template_dir),
+            autoescape=lambda name: bool(name) and name.endswith('.html'),
+            undefined=StrictUndefined,
+            keep_trailing_newline=True
+        )
+        self.static_context = static_context or {}
+        self._skeletons = {}
+        self.load()
+
+    def load(self):
+        """(Re)compile every template - call after editing the files on disk"""
+        with open(os.path.join(self.template_dir, 'email.css'), encoding='utf-8') as css_file:
+            css = css_file.read()
+        context = {
+            'email_css': Markup(css),
+            'support_email': SUPPORT_EMAIL,
+            'copyright_year': datetime.date.today().year,
+        }
+        context.update(self.static_context)
+
+        skeletons = {}
+        for name, variables in self.EMAILS.items():
+            holes = {variable: Markup(f'{_HOLE}{variable}{_HOLE}') for variable in variables}
+            for extension in ('html', 'txt'):
+                filename = f'{name}.{extension}'
+                template = self.env.get_template(filename)
+                rendered = template.render(**context, **holes)
+                skeletons[filename] = EmailSkeleton(filename, rendered, variables, extension == 'html')
+        self._skeletons = skeletons
+        print(f"📨 Compiled {len(skeletons)} email templates from {self.template_dir}")
+
+    def render(self, name, **values):
+        """Return (html, text) bodies for an email"""
+        return (self._skeletons[f'{name}.html'].render(**values),
+                self._skeletons[f'{name}.txt'].render(**values))
@@ -0,0 +1,550 @@
+"""
+Local stand-in for the Firebase Realtime Database REST API.
+
+Implements the subset of the REST protocol the app uses, so firebase_simple
+can be exercised, load-tested and benchmarked offline:
+
+- GET/PUT/POST/PATCH/DELETE on ``/path.json`` (multi-path PATCH, push ids)
+- ``orderBy`` ($key, $value or a child) with ``equalTo``, ``startAt``,
+  ``endAt``, ``limitToFirst`` and ``limitToLast``; ``shallow=true``
+- ETags (``X-Firebase-ETag``, ``if-match`` -> 412, ``if-none-match`` -> 304)
+- ``print=silent`` and ``{".sv": "timestamp"}`` / ``{".sv": {"increment": n}}``
+- Server-sent event streaming (``Accept: text/event-stream``)
+
+Latency and failures can be injected per request, and every request is
+counted (round trips and bytes) for benchmarks; a standalone emulator serves
+the counters at ``/.emulator/stats``.
+
+Run standalone and point the app at it (--rules enforces the shipped .indexOn rules):
+    python -m firebase_emulator --port 9000 --latency-ms 40 --jitter-ms 10 --rules database.rules.json
+    FIREBASE_URL=http://127.0.0.1:9000/ python main.py
+
+Or embed it:
+    emulator = FirebaseEmulator(latency=0.02)
+    url = emulator.start()
+"""
+
+import argparse
+import copy
+import hashlib
+import json
+import queue
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlparse
+
+# GET returns request counters, DELETE resets them (not a valid Firebase path)
+STATS_PATH = '/.emulator/stats'
+
+PUSH_CHARS = '-0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ_abcdefghijklmnopqrstuvwxyz'
+
+
+class PushIdGenerator:
+    """Chronologically sortable 20-character keys, generated like Firebase's"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._last_time = 0
+        self._last_random = [0] * 12
+
+    def __call__(self):
+        with self._lock:
+            now = int(time.time() * 1000)
+            if now == self._last_time:
+                # Same millisecond - increment the random part to keep ordering
+                for index in range(11, -1, -1):
+                    if self._last_random[index] != 63:
+                        self._last_random[index] += 1
+                        break
+                    self._last_random[index] = 0
+            else:
+                self._last_time = now
+                self._last_random = [random.randrange(64) for _ in range(12)]
+
+            stamp = []
+            for _ in range(8):
+                stamp.append(PUSH_CHARS[now % 64])
+                now //= 64
+            return ''.join(reversed(stamp)) + ''.join(PUSH_CHARS[value] for value in self._last_random)
+
+
+def _order_key(value):
+    """Firebase sort order: null, false, true, numbers, strings, objects"""
+    if value is None:
+        return (0,)
+    if value is False:
+        return (1,)
+    if value is True:
+        return (2,)
+    if isinstance(value, (int, float)):
+        return (3, value)
+    if isinstance(value, str):
+        return (4, value)
+    return (5,)
+
+
+def _etag(value):
+    return hashlib.md5(json.dumps(value, sort_keys=True, separators=(',', ':')).encode('utf-8')).hexdigest()
+
+
+class EmulatorError(Exception):
+    """A request the Realtime Database would reject, with its HTTP status"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class PreconditionFailed(EmulatorError):
+    """An if-match write whose ETag no longer matches; carries the current value"""
+
+    def __init__(self, current, etag):
+        super().__init__(412, 'precondition failed')
+        self.current = current
+        self.etag = etag
+
+
+def indexes_from_rules(rules):
+    """{path: [child, ...]} from the .indexOn entries of a database.rules.json document"""
+    indexes = {}
+
+    def walk(node, path):
+        for key, value in node.items():
+            if key == '.indexOn':
+                indexes[path] = [value] if isinstance(value, str) else list(value)
+            elif isinstance(value, dict) and not key.startswith('.'):
+                walk(value, f'{path}/{key}'.strip('/'))
+
+    walk(rules.get('rules', rules), '')
+    return indexes
+
+
+class FirebaseEmulator:
+    """In-memory Realtime Database served over HTTP on a background thread"""
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0.0, jitter=0.0,
+                 failure_rate=0.0, failure_status=503, keep_alive=30.0,
+                 required_indexes=None, data=None, seed=None):
+        self.host = host
+        self.port = port
+        # Injected delay per request: latency +/- uniform jitter, in seconds
+        self.latency = latency
+        self.jitter = jitter
+        # Fraction of requests answered with failure_status instead of being served
+        self.failure_rate = failure_rate
+        self.failure_status = failure_status
+        self.keep_alive = keep_alive
+        # {'issues': ['created_at']} - when set, ordering by other children is rejected
+        # with 400 like a database whose rules lack .indexOn
+        self.required_indexes = required_indexes
+        self.data = copy.deepcopy(data) if data else {}
+
+        self._lock = threading.RLock()
+        self._random = random.Random(seed)
+        self._push_id = PushIdGenerator()
+        self._subscribers = []
+        self._server = None
+        self._thread = None
+        self.reset_stats()
+
+    # Lifecycle
+    @property
+    def url(self):
+        return f"http://{self.host}:{self._server.server_port}/"
+
+    def start(self):
+        """Start serving in a background thread and return the base URL"""
+        handler = type('Handler', (EmulatorRequestHandler,), {'emulator': self})
+        self._server = ThreadingHTTPServer((self.host, self.port), handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, name='firebase-emulator', daemon=True)
+        self._thread.start()
+        return self.url
+
+    def stop(self):
+        """Close every stream and stop the server"""
+        self.drop_streams()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    # Statistics
+    def reset_stats(self):
+        """Zero the request counters"""
+        with self._lock:
+            self.stats = {'requests': 0, 'bytes_in': 0, 'bytes_out': 0, 'failures_injected': 0, 'by_method': {}}
+
+    def _count(self, method=None, bytes_in=0, bytes_out=0):
+        with self._lock:
+            self.stats['bytes_in'] += bytes_in
+            self.stats['bytes_out'] += bytes_out
+            if method is not None:
+                self.stats['requests'] += 1
+                self.stats['by_method'][method] = self.stats['by_method'].get(method, 0) + 1
+
+    def _inject(self):
+        """Sleep for the configured latency; return True if this request should fail"""
+        delay = self.latency + (self._random.uniform(-self.jitter, self.jitter) if self.jitter else 0.0)
+        if delay > 0:
+            time.sleep(delay)
+        if self.failure_rate and self._random.random() < self.failure_rate:
+            with self._lock:
+                self.stats['failures_injected'] += 1
+            return True
+        return False
+
+    # Tree access
+    def get(self, keys):
+        node = self.data
+        for key in keys:
+            if not isinstance(node, dict) or key not in node:
+                return None
+            node = node[key]
+        return node
+
+    def _resolve(self, keys, value):
+        """Replace server values ({".sv": ...}) with what they evaluate to"""
+        if isinstance(value, dict):
+            if '.sv' in value:
+                server_value = value['.sv']
+                if server_value == 'timestamp':
+                    return int(time.time() * 1000)
+                if isinstance(server_value, dict) and 'increment' in server_value:
+                    current = self.get(keys)
+                    current = current if isinstance(current, (int, float)) and not isinstance(current, bool) else 0
+                    return current + server_value['increment']
+                raise EmulatorError(400, 'Invalid server value')
+            resolved = {}
+            for key, child in value.items():
+                child = self._resolve(keys + [key], child)
+                if child is not None:
+                    resolved[key] = child
+            return resolved or None
+        return value
+
+    def _set(self, keys, value):
+        """Write value at keys (None deletes), pruning empty parents like Firebase"""
+        value = self._resolve(keys, value)
+        if not keys:
+            self.data = value if isinstance(value, dict) else {}
+            return
+        parents = [self.data]
+        node = self.data
+        for key in keys[:-1]:
+            child = node.get(key)
+            if not isinstance(child, dict):
+                if value is None:
+                    return
+                child = node[key] = {}
+            node = child
+            parents.append(node)
+        if value is None:
+            node.pop(keys[-1], None)
+            for depth in range(len(keys) - 1, 0, -1):
+                if parents[depth]:
+                    break
+                parents[depth - 1].pop(keys[depth - 1], None)
+        else:
+            node[keys[-1]] = value
+
+    # Operations
+    def read(self, keys, query):
+        with self._lock:
+            value = copy.deepcopy(self.get(keys))
+        if query.get('shallow') is True:
+            if query.keys() - {'shallow'}:
+                raise EmulatorError(400, 'Mixing shallow with other query parameters is not allowed')
+            return {key: True if isinstance(child, dict) else child for key, child in value.items()} \
+                if isinstance(value, dict) else value
+        if 'orderBy' in query:
+            return self._query(keys, value, query)
+        if query.keys() & {'equalTo', 'startAt', 'endAt', 'limitToFirst', 'limitToLast'}:
+            raise EmulatorError(400, 'orderBy must be defined when other query parameters are defined')
+        return value
+
+    def _query(self, keys, value, query):
+        order_by = query['orderBy']
+        if order_by not in ('$key', '$value'):
+            # Checked before looking at the data: Firebase rejects the query even on an empty node
+            path = '/'.join(keys)
+            if self.required_indexes is not None and order_by not in self.required_indexes.get(path, []):
+                raise EmulatorError(400, f'Index not defined, add ".indexOn": "{order_by}", for path "/{path}", to the rules')
+        if not isinstance(value, dict):
+            return value
+        if order_by == '$key':
+            sort_value = lambda item: item[0]
+        elif order_by == '$value':
+            sort_value = lambda item: item[1]
+        else:
+            sort_value = lambda item: item[1].get(order_by) if isinstance(item[1], dict) else None
+
+        key_order = (lambda item: (4, item[0])) if order_by == '$key' else (lambda item: _order_key(sort_value(item)))
+        items = sorted(value.items(), key=lambda item: (key_order(item), item[0]))
+        if 'equalTo' in query:
+            target = _order_key(query['equalTo'])
+            items = [item for item in items if key_order(item) == target]
+        if 'startAt' in query:
+            bound = _order_key(query['startAt'])
+            items = [item for item in items if key_order(item) >= bound]
+        if 'endAt' in query:
+            bound = _order_key(query['endAt'])
+            items = [item for item in items if key_order(item) <= bound]
+        if 'limitToFirst' in query:
+            items = items[:int(query['limitToFirst'])]
+        if 'limitToLast' in query:
+            items = items[-int(query['limitToLast']):] if int(query['limitToLast']) else []
+        return dict(items)
+
+    def write(self, method, keys, body, if_match=None, want_etag=False):
+        """Apply a PUT/POST/PATCH/DELETE and return (response value, etag or None)"""
+        with self._lock:
+            if if_match is not None:
+                current = self.get(keys)
+                if if_match != _etag(current):
+                    raise PreconditionFailed(copy.deepcopy(current), _etag(current))
+
+            if method == 'PUT':
+                self._set(keys, body)
+                changes, result = [keys], copy.deepcopy(self.get(keys))
+            elif method == 'DELETE':
+                self._set(keys, None)
+                changes, result = [keys], None
+            elif method == 'POST':
+                name = self._push_id()
+                self._set(keys + [name], body)
+                changes, result = [keys + [name]], {'name': name}
+            elif method == 'PATCH':
+                if not isinstance(body, dict):
+                    raise EmulatorError(400, 'Invalid data; couldn\'t parse JSON object')
+                child_paths = {key: [part for part in key.split('/') if part] for key in body}
+                for key, child_keys in child_paths.items():
+                    self._set(keys + child_keys, body[key])
+                changes = [keys + child_keys for child_keys in child_paths.values()]
+                result = {key: copy.deepcopy(self.get(keys + child_keys)) for key, child_keys in child_paths.items()}
+            else:
+                raise EmulatorError(405, f'Unsupported method {method}')
+
+            self._notify(method, keys, changes)
+            # Hashing a large subtree is costly, so only when the client asked for it
+            return result, _etag(self.get(keys)) if want_etag else None
+
+    # Streaming
+    def subscribe(self, keys):
+        """Register a stream; returns (queue, initial value)"""
+        events = queue.Queue()
+        with self._lock:
+            self._subscribers.append((keys, events))
+            return events, copy.deepcopy(self.get(keys))
+
+    def drop_streams(self):
+        """End every open stream, as Firebase does when it closes idle or migrated connections"""
+        with self._lock:
+            for subscriber in self._subscribers:
+                subscriber[1].put(None)
+
+    def unsubscribe(self, events):
+        with self._lock:
+            self._subscribers = [subscriber for subscriber in self._subscribers if subscriber[1] is not events]
+
+    def _notify(self, method, keys, changes):
+        """Queue put/patch events for every stream the changed paths fall under (lock held)"""
+        for base, events in self._subscribers:
+            depth = len(base)
+            if any(base[:len(changed)] == changed for changed in changes if len(changed) <= depth):
+                # An ancestor of the stream root changed - resend the whole node
+                events.put(('put', {'path': '/', 'data': copy.deepcopy(self.get(base))}))
+                continue
+            inside = [changed for changed in changes if changed[:depth] == base]
+            if not inside:
+                continue
+            if method == 'PATCH' and keys[:depth] == base:
+                data = {'/'.join(changed[len(keys):]): copy.deepcopy(self.get(changed)) for changed in inside}
+                events.put(('patch', {'path': '/' + '/'.join(keys[depth:]), 'data': data}))
+            else:
+                for changed in inside:
+                    events.put(('put', {'path': '/' + '/'.join(changed[depth:]), 'data': copy.deepcopy(self.get(changed))}))
+
+
+class EmulatorRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Headers and body go out in separate writes; without this, delayed ACKs
+    # stall every keep-alive response by ~40ms
+    disable_nagle_algorithm = True
+    emulator = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _parse(self):
+        parsed = urlparse(self.path)
+        if not parsed.path.endswith('.json'):
+            raise EmulatorError(404, 'Not Found - paths must end in .json')
+        keys = [unquote(part) for part in parsed.path[:-len('.json')].split('/') if part]
+        query = {}
+        for name, values in parse_qs(parsed.query).items():
+            value = values[0]
+            if name in ('print', 'format', 'auth', 'timeout', 'writeSizeLimit'):
+                query[name] = value
+                continue
+            try:
+                query[name] = json.loads(value)
+            except ValueError:
+                raise EmulatorError(400, f'Invalid {name} parameter')
+        return keys, query
+
+    def _body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        raw = self.rfile.read(length) if length else b''
+        self.emulator._count(bytes_in=len(raw))
+        try:
+            return json.loads(raw or b'null')
+        except ValueError:
+            raise EmulatorError(400, 'Invalid data; couldn\'t parse JSON object, array, or value.')
+
+    def _send_json(self, status, value, etag=None, silent=False, counted=True):
+        body = b'' if silent else json.dumps(value, separators=(',', ':')).encode('utf-8')
+        self.send_response(204 if silent and status == 200 else status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        if etag is not None:
+            self.send_header('ETag', etag)
+        self.end_headers()
+        self.wfile.write(body)
+        if counted:
+            self.emulator._count(bytes_out=len(body))
+
+    def _handle(self, method):
+        emulator = self.emulator
+        if urlparse(self.path).path == STATS_PATH:
+            # Out-of-band counters for load tests against a standalone emulator
+            if method == 'DELETE':
+                emulator.reset_stats()
+            self._send_json(200, emulator.stats, counted=False)
+            return
+        emulator._count(method)
+        try:
+            keys, query = self._parse()
+            body = self._body() if method in ('PUT', 'POST', 'PATCH') else None
+            if emulator._inject():
+                self._send_json(emulator.failure_status, {'error': 'Injected failure'})
+                return
+            silent = query.get('print') == 'silent'
+            wants_etag = self.headers.get('X-Firebase-ETag', '').lower() == 'true'
+
+            if method == 'GET':
+                if 'text/event-stream' in self.headers.get('Accept', ''):
+                    self._stream(keys)
+                    return
+                value = emulator.read(keys, query)
+                if_none_match = self.headers.get('if-none-match')
+                etag = _etag(value) if wants_etag or if_none_match else None
+                if if_none_match is not None and if_none_match == etag:
+                    self.send_response(304)
+                    self.send_header('ETag', etag)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                self._send_json(200, value, etag if wants_etag else None, silent)
+                return
+
+            result, etag = emulator.write(method, keys, body, if_match=self.headers.get('if-match'),
+                                          want_etag=wants_etag)
+            self._send_json(200, result, etag, silent)
+        except PreconditionFailed as conflict:
+            self._send_json(412, conflict.current, conflict.etag)
+        except EmulatorError as error:
+            self._send_json(error.status, {'error': str(error)})
+
+    def _stream(self, keys):
+        events, initial = self.emulator.subscribe(keys)
+        try:
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream')
+            self.send_header('Cache-Control', 'no-cache')
+            self.send_header('Transfer-Encoding', 'chunked')
+            self.end_headers()
+            self._send_event('put', {'path': '/', 'data': initial})
+            while True:
+                try:
+                    event = events.get(timeout=self.emulator.keep_alive)
+                except queue.Empty:
+                    self._send_event('keep-alive', None)
+                    continue
+                if event is None:
+                    self.wfile.write(b'0\r\n\r\n')
+                    self.close_connection = True
+                    return
+                self._send_event(*event)
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True
+        finally:
+            self.emulator.unsubscribe(events)
+
+    def _send_event(self, name, data):
+        payload = f"event: {name}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n".encode('utf-8')
+        self.wfile.write(b'%x\r\n%s\r\n' % (len(payload), payload))
+        self.wfile.flush()
+        self.emulator._count(bytes_out=len(payload))
+
+    def do_GET(self):
+        self._handle('GET')
+
+    def do_PUT(self):
+        self._handle('PUT')
+
+    def do_POST(self):
+        self._handle('POST')
+
+    def do_PATCH(self):
+        self._handle('PATCH')
+
+    def do_DELETE(self):
+        self._handle('DELETE')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Local Firebase Realtime Database REST stand-in')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=9000)
+    parser.add_argument('--latency-ms', type=float, default=0.0, help='delay added to every request')
+    parser.add_argument('--jitter-ms', type=float, default=0.0, help='uniform +/- variation on the delay')
+    parser.add_argument('--failure-rate', type=float, default=0.0, help='fraction of requests that fail')
+    parser.add_argument('--failure-status', type=int, default=503)
+    parser.add_argument('--keep-alive', type=float, default=30.0, help='seconds between stream keep-alives')
+    parser.add_argument('--index', action='append', default=None, metavar='PATH:CHILD',
+                        help="only allow orderBy on indexed children, e.g. issues:created_at (repeatable)")
+    parser.add_argument('--rules', help='database.rules.json whose .indexOn entries are enforced like --index')
+    parser.add_argument('--data', help='JSON file to load as the initial database')
+    args = parser.parse_args()
+
+    required_indexes = None
+    if args.rules:
+        with open(args.rules, encoding='utf-8') as rules_file:
+            required_indexes = indexes_from_rules(json.load(rules_file))
+    if args.index:
+        required_indexes = required_indexes or {}
+        for rule in args.index:
+            path, _, child = rule.partition(':')
+            required_indexes.setdefault(path.strip('/'), []).append(child)
+
+    data = None
+    if args.data:
+        with open(args.data, encoding='utf-8') as data_file:
+            data = json.load(data_file)
+
+    emulator = FirebaseEmulator(args.host, args.port, args.latency_ms / 1000, args.jitter_ms / 1000,
+                                args.failure_rate, args.failure_status, args.keep_alive, required_indexes, data)
+    url = emulator.start()
+    print(f"🔥 Firebase emulator listening on {url} (set FIREBASE_URL={url})")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        emulator.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,66 +1,539 @@
 import os
-import requests
+import copy
+import hmac
 import json
-import secrets
-import string
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote, unquote
 from datetime import datetime, timedelta
-from werkzeug.security import generate_password_hash, check_password_hash
+from werkzeug.security import generate_password_hash
+import metrics
+from firebase_transport import FirebaseTransport, FirebaseUnavailable
+from ttl_cache import TTLCache
+from shared_cache import SharedCache, SHARED_CACHE_PATH
+from issue_mirror import IssueMirror
+from records import IssueRecord, UserRecord, expand
+from single_flight import SingleFlight
+from storage import StorageBackend, ISSUE_PAGE_SIZE
+
+# Where data lives: 'firebase' (Realtime Database over REST) or 'sql' (see sql_storage.py)
+STORAGE_BACKEND = os.environ.get('STORAGE_BACKEND', 'firebase').lower()
 
 # Firebase Realtime Database URL - configurable via environment variable
 FIREBASE_URL = os.environ.get('FIREBASE_URL', "https://csp5-d0355-default-rtdb.firebaseio.com/")
 
-class SimpleFirebaseDB:
-    def __init__(self):
+# How long a resolved login identity (id, username, role) is reused, in seconds
+IDENTITY_CACHE_TTL = int(os.environ.get('IDENTITY_CACHE_TTL', '60'))
+
+# How long user records fetched for listing joins are reused, in seconds
+USER_CACHE_TTL = int(os.environ.get('USER_CACHE_TTL', '120'))
+
+# How long past expiry cached users and identities may be served while Firebase is unreachable
+STALE_IF_ERROR_TTL = float(os.environ.get('FIREBASE_STALE_IF_ERROR_TTL', '600'))
+
+# Maximum concurrent Firebase reads when fetching a batch of records
+BATCH_FETCH_WORKERS = int(os.environ.get('BATCH_FETCH_WORKERS', '8'))
+
+# Upper bound on server queries made to fill one filtered page
+MAX_PAGE_QUERIES = 5
+
+# Largest ordered query used to read past issues sharing one created_at
+MAX_TIE_WINDOW = 1000
+
+# Seconds before retrying a query Firebase rejected for lack of an .indexOn rule
+INDEX_RETRY_INTERVAL = float(os.environ.get('FIREBASE_INDEX_RETRY_INTERVAL', '300'))
+
+# Serve issue reads from a live in-memory mirror fed by Firebase streaming
+MIRROR_ISSUES = os.environ.get('FIREBASE_MIRROR_ISSUES', 'false').lower() == 'true'
+
+# How long cached system settings are served before revalidating with the ETag
+SETTINGS_CACHE_TTL = float(os.environ.get('SETTINGS_CACHE_TTL', '30'))
+
+# How long a settings document whose ETag went unverified may stand in during an outage
+SETTINGS_STALE_TTL = float(os.environ.get('SETTINGS_STALE_TTL', '86400'))
+
+# How long a whole-/issues snapshot is reused when the streaming mirror is off (0 disables)
+ISSUE_SNAPSHOT_TTL = float(os.environ.get('ISSUE_SNAPSHOT_TTL', '5'))
+
+# Seconds between background sweeps of expired records (0 disables the sweeper)
+SWEEP_INTERVAL = float(os.environ.get('FIREBASE_SWEEP_INTERVAL', '900'))
+
+# Paths deleted per multi-path write when sweeping
+SWEEP_BATCH_SIZE = int(os.environ.get('FIREBASE_SWEEP_BATCH_SIZE', '500'))
+
+# Conflicting writes tolerated by an ETag-guarded update before giving up
+GUARDED_UPDATE_ATTEMPTS = 5
+
+# Secondary user indexes kept under /indexes/{node}/{value} -> user id
+USER_INDEXES = {
+    'username': 'usernames',
+    'email': 'emails',
+    'student_id': 'student_ids',
+    'phone': 'phones'
+}
+
+# Fields never written to a user cache; nothing served from a cache needs them
+CREDENTIAL_FIELDS = ('password_hash', 'password')
+
+# Characters Firebase does not allow in keys, plus the escape character itself
+_KEY_ESCAPES = {'%': '%25', '.': '%2E', '$': '%24', '#': '%23', '[': '%5B', ']': '%5D', '/': '%2F'}
+
+def index_key(value):
+    """Encode a value (e.g. an email address) so it can be used as a Firebase key"""
+    return ''.join(_KEY_ESCAPES.get(ch, ch) for ch in str(value))
+
+@metrics.instrument_methods
+class SimpleFirebaseDB(StorageBackend):
+    def __init__(self, transport=None):
         self.base_url = FIREBASE_URL
+        # Shared keep-alive connection pool used by every DB method
+        self.transport = transport or FirebaseTransport()
+        self._indexes_ready = False
+        self._summaries_ready = False
+        self._stats_ready = False
+        # Indexes ('issues/created_at') Firebase rejected queries for, with when it last did
+        self._missing_indexes = {}
+        # Logged-in user identities keyed by user id
+        self._identity_cache = self._make_cache('identities', IDENTITY_CACHE_TTL, STALE_IF_ERROR_TTL)
+        # User records used by batch lookups, without credentials
+        self._user_cache = self._make_cache('users', USER_CACHE_TTL, STALE_IF_ERROR_TTL, record_type=UserRecord)
+        # /user_summaries entries used by username joins
+        self._summary_cache = self._make_cache('user_summaries', USER_CACHE_TTL, STALE_IF_ERROR_TTL)
+        # Settings document plus its ETag, revalidated once the entry expires
+        self._settings_cache = self._make_cache('settings', SETTINGS_CACHE_TTL, SETTINGS_STALE_TTL)
+        # Whole /issues tree; callers modify it, so only the shared cache (a fresh copy per read) holds it
+        self._issue_cache = None
+        if SHARED_CACHE_PATH and ISSUE_SNAPSHOT_TTL > 0:
+            self._issue_cache = self._make_cache('issues', ISSUE_SNAPSHOT_TTL, STALE_IF_ERROR_TTL)
+        self._executor = None
+        self._executor_pid = None
+        self._executor_lock = threading.Lock()
+        self._issue_mirror = None
+        # Identical GETs issued concurrently share one HTTP call
+        self._in_flight = SingleFlight()
+        # Process that owns the running sweeper thread
+        self._sweeper_pid = None
         print("🔥 Simple Firebase connection initialized!")
     
-    def _make_request(self, endpoint, method='GET', data=None):
-        """Make HTTP request to Firebase"""
+    def _send(self, endpoint, method='GET', data=None, headers=None, params=None):
+        """Send a request to Firebase and return the raw response"""
         url = f"{self.base_url}{endpoint}.json"
+        started = time.perf_counter()
+        status = 'error'
+        response = None
         try:
-            if method == 'GET':
-                response = requests.get(url)
-            elif method == 'PUT':
-                response = requests.put(url, json=data)
-            elif method == 'POST':
-                response = requests.post(url, json=data)
-            elif method == 'DELETE':
-                response = requests.delete(url)
+            response = self.transport.request(method, url, json=data, headers=headers, params=params)
+            status = str(response.status_code)
+            return response
+        finally:
+            sent = response.request.body if response is not None else None
+            metrics.record_firebase_call(
+                method.upper(), status, time.perf_counter() - started,
+                len(sent or b''), len(response.content) if response is not None else 0
+            )
+    
+    @staticmethod
+    def _make_cache(namespace, ttl, stale_ttl=0, record_type=None):
+        """Host-wide cache shared by all workers, or per-process if SHARED_CACHE_PATH is empty.
+        
+        With a record_type both tiers hold and return compact records: the
+        per-process cache packs values in memory, the shared cache stores
+        their to_row() form.
+        """
+        if SHARED_CACHE_PATH:
+            return SharedCache(namespace, ttl, stale_ttl=stale_ttl, record_type=record_type)
+        pack = record_type.from_dict if record_type is not None else None
+        return TTLCache(ttl, stale_ttl=stale_ttl, pack=pack)
+    
+    def _get_executor(self):
+        """Bounded thread pool for concurrent reads, recreated after a fork"""
+        pid = os.getpid()
+        if self._executor is None or self._executor_pid != pid:
+            with self._executor_lock:
+                if self._executor is None or self._executor_pid != pid:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=BATCH_FETCH_WORKERS, thread_name_prefix='firebase-fetch'
+                    )
+                    self._executor_pid = pid
+        return self._executor
+    
+    def _get_issue_mirror(self):
+        """Return the issue mirror if enabled and in sync, starting it on first use"""
+        if not MIRROR_ISSUES:
+            return None
+        mirror = self._issue_mirror
+        if mirror is None or mirror.pid != os.getpid():
+            with self._executor_lock:
+                if self._issue_mirror is None or self._issue_mirror.pid != os.getpid():
+                    self._issue_mirror = IssueMirror(self.base_url, self.transport, 'issues',
+                                                     record_type=IssueRecord)
+                    self._issue_mirror.start()
+                mirror = self._issue_mirror
+        return mirror if mirror.ready else None
+    
+    def _fetch_issues_tree(self):
+        """Get the whole /issues node, from the mirror or a recent shared snapshot"""
+        mirror = self._get_issue_mirror()
+        if mirror is not None:
+            return mirror.get_all()
+        if self._issue_cache is None:
+            return self._make_request('issues')
+        
+        issues = self._issue_cache.get('issues')
+        if issues is not None:
+            return issues
+        try:
+            issues = self._make_request('issues')
+        except FirebaseUnavailable:
+            issues = self._issue_cache.get_stale('issues')
+            if issues is None:
+                raise
+            return issues
+        if issues is not None:
+            self._issue_cache.set('issues', issues)
+        return issues
+    
+    def _issues_changed(self):
+        """Drop the issue snapshot after a write so no worker serves it again"""
+        if self._issue_cache is not None:
+            self._issue_cache.invalidate('issues')
+    
+    def _make_request(self, endpoint, method='GET', data=None, params=None):
+        """Make HTTP request to Firebase.
+        
+        Returns None for a missing record or a failed write. A read that cannot
+        reach Firebase raises FirebaseUnavailable rather than pass for "not found".
+        Concurrent identical reads are coalesced into one request.
+        """
+        if method != 'GET':
+            return self._request(endpoint, method, data, params)
+        
+        key = (endpoint, tuple(sorted((params or {}).items())))
+        value, role = self._in_flight.do(key, lambda: self._request(endpoint, method, data, params),
+                                         clone=copy.deepcopy)
+        metrics.firebase_coalesced.inc(endpoint.split('/', 1)[0] or '/', role)
+        return value
+    
+    def _request(self, endpoint, method, data, params):
+        """Send one request and decode it for _make_request"""
+        try:
+            response = self._send(endpoint, method, data, params=params)
             
             if response.status_code in [200, 201]:
                 return response.json()
             else:
                 print(f"Firebase request failed: {response.status_code}")
                 return None
+        except FirebaseUnavailable as e:
+            print(f"Firebase unavailable: {e}")
+            if method == 'GET':
+                raise
+            return None
         except Exception as e:
             print(f"Firebase request error: {e}")
             return None
     
-    # User Management
-    def get_user_by_username(self, username):
-        """Get user by username"""
+    # Partial Updates
+    def update(self, path, fields):
+        """PATCH only the given fields at path, without echoing them back.
+        
+        Keys may be nested paths ('issues/abc/status'), so one call can change
+        several records together - use '' as the path to write from the root.
+        A None value deletes that key. Returns True on success.
+        """
+        try:
+            response = self._send(path, 'PATCH', fields, params={'print': 'silent'})
+        except Exception as e:
+            print(f"Firebase request error: {e}")
+            return False
+        if response.status_code in [200, 204]:
+            return True
+        print(f"Firebase request failed: {response.status_code}")
+        return False
+    
+    def update_guarded(self, path, mutate, max_attempts=GUARDED_UPDATE_ATTEMPTS):
+        """Optimistic read-modify-write of the value at path using ETags.
+        
+        mutate(current) returns the new value, or None to abort. The write is a
+        conditional PUT that Firebase rejects with 412 if the value changed
+        since it was read; mutate is then re-run on the fresh value.
+        Returns (success, value the write replaced).
+        """
+        try:
+            response = self._send(path, 'GET', headers={'X-Firebase-ETag': 'true'})
+            for _ in range(max_attempts):
+                # 412 carries the current value and its ETag, like a fresh read
+                if response.status_code not in [200, 412]:
+                    print(f"Firebase request failed: {response.status_code}")
+                    return False, None
+                current = response.json()
+                new_value = mutate(copy.deepcopy(current))
+                if new_value is None:
+                    return False, current
+                response = self._send(path, 'PUT', new_value,
+                                      headers={'if-match': response.headers.get('ETag', '')},
+                                      params={'print': 'silent'})
+                if response.status_code in [200, 204]:
+                    return True, current
+                if response.status_code != 412:
+                    print(f"Firebase request failed: {response.status_code}")
+                    return False, None
+            print(f"⚠️ Gave up updating {path} after {max_attempts} conflicting writes")
+            return False, None
+        except Exception as e:
+            print(f"Firebase request error: {e}")
+            return False, None
+    
+    def _exists(self, path):
+        """Check a record exists without downloading it"""
+        return bool(self._make_request(path, params={'shallow': 'true'}))
+    
+    # Server-side query indexes (.indexOn rules in database.rules.json)
+    def _index_usable(self, index):
+        """Whether to send a query needing index; retried a while after Firebase rejected it"""
+        rejected_at = self._missing_indexes.get(index)
+        return rejected_at is None or time.monotonic() - rejected_at >= INDEX_RETRY_INTERVAL
+    
+    def _index_rejected(self, index, response, fallback=None):
+        """Record a 400 for a query needing index, logging loudly when the fallback first kicks in"""
+        path, child = index.rsplit('/', 1)
+        if index not in self._missing_indexes:
+            print(f"❌ Firebase rejected a query ordered by {child} on /{path}: {response.text[:200]}")
+            print(f"❌ Until then {fallback or f'reads needing it download the whole /{path} tree'}; "
+                  f"add \".indexOn\": \"{child}\" there (deploy database.rules.json). "
+                  f"Retrying the query every {INDEX_RETRY_INTERVAL:g}s")
+        self._missing_indexes[index] = time.monotonic()
+    
+    def _index_served(self, index):
+        """Record that a query needing index succeeded"""
+        if self._missing_indexes.pop(index, None) is not None:
+            print(f"✅ Firebase now serves queries ordered by {index.rsplit('/', 1)[1]}; leaving the fallback")
+    
+    # User Indexes
+    def _user_indexes_ready(self):
+        """Check whether the /indexes tree has been built (cached once it has)"""
+        if not self._indexes_ready:
+            self._indexes_ready = bool(self._make_request('indexes/_meta'))
+        return self._indexes_ready
+    
+    def _lookup_user_id(self, field, value):
+        """Resolve a user id from a secondary index with a single keyed read"""
+        if not value:
+            return None
+        key = quote(index_key(value), safe='')
+        return self._make_request(f'indexes/{USER_INDEXES[field]}/{key}')
+    
+    def _find_user_by_field(self, field, value):
+        """Get user whose field equals value, using the index when available"""
+        if self._user_indexes_ready():
+            user_id = self._lookup_user_id(field, value)
+            if not user_id:
+                return None
+            user = self.get_user_by_id(user_id)
+            # Guard against stale index entries
+            if user and user.get(field) == value:
+                return user
+            return None
+        
+        # Indexes not built yet - fall back to scanning the users tree
         users = self._make_request('users')
         if users:
             for user_id, user_data in users.items():
-                if user_data.get('username') == username:
+                if user_data.get(field) == value:
                     user_data['id'] = user_id
                     return user_data
         return None
     
+    def _user_index_updates(self, user_id, old_data, new_data):
+        """Build multi-path index updates for a user whose fields changed"""
+        updates = {}
+        old_data = old_data or {}
+        for field, node in USER_INDEXES.items():
+            old_value = old_data.get(field)
+            new_value = new_data.get(field, old_value)
+            if old_value and old_value != new_value:
+                updates[f'indexes/{node}/{index_key(old_value)}'] = None
+            if new_value:
+                updates[f'indexes/{node}/{index_key(new_value)}'] = user_id
+        return updates
+    
+    def rebuild_user_indexes(self):
+        """Rebuild all user indexes from the users tree (one-shot backfill)"""
+        users = self._make_request('users') or {}
+        indexes = {node: {} for node in USER_INDEXES.values()}
+        duplicates = 0
+        
+        for user_id, user_data in users.items():
+            if not isinstance(user_data, dict):
+                continue
+            for field, node in USER_INDEXES.items():
+                value = user_data.get(field)
+                if not value:
+                    continue
+                key = index_key(value)
+                if key in indexes[node] and indexes[node][key] != user_id:
+                    duplicates += 1
+                    print(f"⚠️ Duplicate {field} '{value}' for users {indexes[node][key]} and {user_id}")
+                indexes[node][key] = user_id
+        
+        meta = {
+            'built_at': datetime.now().isoformat(),
+            'user_count': len(users)
+        }
+        indexes['_meta'] = meta
+        summaries = {user_id: self.user_summary(user_data)
+                     for user_id, user_data in users.items() if isinstance(user_data, dict)}
+        summaries['_meta'] = meta
+        # Both nodes are replaced whole by one multi-path write
+        if self._make_request('', 'PATCH', {'indexes': indexes, 'user_summaries': summaries}) is None:
+            return False, "Failed to write indexes"
+        
+        self._indexes_ready = True
+        self._summaries_ready = True
+        for user_id in users:
+            self._summary_cache.invalidate(user_id)
+        return True, f"Indexed {len(users)} users ({duplicates} duplicate values)"
+    
+    # User Summaries
+    def _user_summaries_ready(self):
+        """Check whether /user_summaries has been backfilled (cached once it has)"""
+        if not self._summaries_ready:
+            self._summaries_ready = bool(self._make_request('user_summaries/_meta'))
+        return self._summaries_ready
+    
+    def _user_summary_updates(self, user_id, old_data, new_data):
+        """Multi-path update for a user's summary node, empty if no summary field changed"""
+        summary = self.user_summary(new_data)
+        if old_data is not None and self.user_summary(old_data) == summary:
+            return {}
+        return {f'user_summaries/{user_id}': summary}
+    
+    def _get_user_summary(self, user_id):
+        """Fetch one summary node, falling back to a recently cached copy if Firebase is down"""
+        try:
+            summary = self._make_request(f'user_summaries/{user_id}')
+        except FirebaseUnavailable:
+            summary = self._summary_cache.get_stale(user_id)
+            if summary is None:
+                raise
+            return summary
+        if summary:
+            self._summary_cache.set(user_id, summary)
+        return summary
+    
+    def get_user_summaries(self, user_ids):
+        """Get {user_id: summary} from /user_summaries, never downloading full profiles"""
+        if not self._user_summaries_ready():
+            return super().get_user_summaries(user_ids)
+        
+        summaries = {}
+        missing = []
+        for user_id in dict.fromkeys(user_ids):
+            if not user_id:
+                continue
+            summary = self._summary_cache.get(user_id)
+            if summary is not None:
+                summaries[user_id] = dict(summary, id=user_id)
+            else:
+                missing.append(user_id)
+        
+        if len(missing) == 1:
+            fetched = [self._get_user_summary(missing[0])]
+        elif missing:
+            fetched = self._get_executor().map(metrics.propagate_context(self._get_user_summary), missing)
+        else:
+            fetched = []
+        
+        for user_id, summary in zip(missing, fetched):
+            if summary:
+                summaries[user_id] = dict(summary, id=user_id)
+        return summaries
+    
+    def list_user_summaries(self):
+        """Get every user's summary, sorted by username"""
+        if not self._user_summaries_ready():
+            return super().list_user_summaries()
+        
+        summaries = self._make_request('user_summaries') or {}
+        summary_list = [dict(summary, id=user_id) for user_id, summary in summaries.items()
+                        if user_id != '_meta' and isinstance(summary, dict)]
+        return sorted(summary_list, key=lambda x: x.get('username', ''))
+    
+    # User Management
     def get_user_by_id(self, user_id):
-        """Get user by ID"""
-        user = self._make_request(f'users/{user_id}')
+        """Get user by ID, falling back to a recently cached copy if Firebase is down"""
+        try:
+            user = self._make_request(f'users/{user_id}')
+        except FirebaseUnavailable:
+            user = self._user_cache.get_stale(user_id)
+            if user is None:
+                raise
+            return expand(user)
         if user:
             user['id'] = user_id
+            self._user_cache.set(user_id, {key: value for key, value in user.items() if key not in CREDENTIAL_FIELDS})
             return user
         return None
     
-    def verify_password(self, username, password):
-        """Verify user password"""
-        user = self.get_user_by_username(username)
-        if user and check_password_hash(user.get('password_hash', user.get('password', '')), password):
-            return user
-        return None
+    def get_user_identity(self, user_id):
+        """Get the minimal identity (id, username, role) for a logged-in user"""
+        identity = self._identity_cache.get(user_id)
+        if identity is not None:
+            return identity
+        
+        try:
+            return self.remember_user_identity(self.get_user_by_id(user_id))
+        except FirebaseUnavailable:
+            # Keep signed-in users signed in through an outage
+            identity = self._identity_cache.get_stale(user_id)
+            if identity is None:
+                raise
+            return identity
+    
+    def remember_user_identity(self, user):
+        """Cache the identity of a user record that was already fetched"""
+        if not user or not user.get('id') or not user.get('username'):
+            return None
+        identity = {'id': user['id'], 'username': user['username'], 'role': user.get('role')}
+        self._identity_cache.set(user['id'], identity)
+        return identity
+    
+    def invalidate_user_identity(self, user_id):
+        """Forget the cached identity and record for a user (password or role changed)"""
+        self._identity_cache.invalidate(user_id)
+        self._user_cache.invalidate(user_id)
+        self._summary_cache.invalidate(user_id)
+    
+    def get_users_by_ids(self, user_ids):
+        """Get many users at once as {user_id: user}, fetching cache misses concurrently.
+        
+        Cache hits are returned as the compact UserRecords the cache
+        stores, so treat the results as read-only.
+        """
+        users = {}
+        missing = []
+        for user_id in dict.fromkeys(user_ids):
+            if not user_id:
+                continue
+            user = self._user_cache.get(user_id)
+            if user is not None:
+                users[user_id] = user
+            else:
+                missing.append(user_id)
+        
+        if len(missing) == 1:
+            fetched = [self.get_user_by_id(missing[0])]
+        elif missing:
+            fetched = self._get_executor().map(metrics.propagate_context(self.get_user_by_id), missing)
+        else:
+            fetched = []
+        
+        for user_id, user in zip(missing, fetched):
+            if user:
+                users[user_id] = user
+        return users
     
     def get_all_users(self):
         """Get all users"""
@@ -72,102 +545,112 @@ class SimpleFirebaseDB:
                 user_list.append(user_data)
         return sorted(user_list, key=lambda x: x.get('username', ''))
     
-    def get_user_by_student_id(self, student_id):
-        """Get user by student ID"""
-        users = self._make_request('users')
-        if users:
-            for user_id, user_data in users.items():
-                if user_data.get('student_id') == student_id:
-                    user_data['id'] = user_id
-                    return user_data
-        return None
-    
-    def get_user_by_email(self, email):
-        """Get user by email"""
-        users = self._make_request('users')
-        if users:
-            for user_id, user_data in users.items():
-                if user_data.get('email') == email:
-                    user_data['id'] = user_id
-                    return user_data
-        return None
-    
     def create_user(self, username, password, role, **additional_data):
         """Create new user with extended information"""
-        # Check if user exists
-        if self.get_user_by_username(username):
-            return None, "User already exists"
-        
-        # Check if student ID already exists (if provided)
-        student_id = additional_data.get('student_id')
-        if student_id and self.get_user_by_student_id(student_id):
-            return None, "Student ID already exists"
-        
-        # Check if email already exists (if provided)
-        email = additional_data.get('email')
-        if email and self.get_user_by_email(email):
-            return None, "Email address already exists"
-        
-        user_data = {
-            'username': username,
-            'password_hash': generate_password_hash(password),
-            'role': role,
-            'created_at': datetime.now().isoformat(),
-            # Personal Information
-            'first_name': additional_data.get('first_name', ''),
-            'last_name': additional_data.get('last_name', ''),
-            'email': additional_data.get('email', ''),
-            'phone': additional_data.get('phone', ''),
-            'date_of_birth': additional_data.get('date_of_birth', ''),
-            'gender': additional_data.get('gender', ''),
-            # Academic Information
-            'student_id': additional_data.get('student_id', ''),
-            'level': additional_data.get('level', ''),
-            'department': additional_data.get('department', ''),
-            'program': additional_data.get('program', ''),
-            # Additional Information
-            'address': additional_data.get('address', ''),
-            'emergency_contact_name': additional_data.get('emergency_contact_name', ''),
-            'emergency_contact_phone': additional_data.get('emergency_contact_phone', ''),
-            # System fields
-            'terms_accepted': additional_data.get('terms_accepted', False),
-            'profile_complete': True
-        }
+        error = self._check_new_user(username, additional_data)
+        if error:
+            return None, error
+        
+        user_data = self._new_user_record(username, password, role, additional_data)
         
         result = self._make_request('users', 'POST', user_data)
         if result:
-            return result.get('name'), "User created successfully"
+            user_id = result.get('name')
+            updates = self._user_index_updates(user_id, None, user_data)
+            updates.update(self._user_summary_updates(user_id, None, user_data))
+            updates.update(self._counter_updates('users_by_role', {role: 1}))
+            if self._make_request('', 'PATCH', updates) is None:
+                print(f"⚠️ Failed to index user {user_id}; run 'flask rebuild-indexes' and 'flask reconcile-stats'")
+            return user_id, "User created successfully"
         return None, "Failed to create user"
     
+    def _save_user(self, user_id, user_data, old_data=None):
+        """Write a full user record and its index entries in one multi-path PATCH"""
+        updates = self._user_index_updates(user_id, old_data, user_data)
+        updates.update(self._user_summary_updates(user_id, old_data, user_data))
+        old_role = (old_data or {}).get('role')
+        new_role = user_data.get('role')
+        if old_data is not None and old_role != new_role:
+            updates.update(self._counter_updates('users_by_role', {old_role or 'unknown': -1, new_role or 'unknown': 1}))
+        updates[f'users/{user_id}'] = user_data
+        result = self._make_request('', 'PATCH', updates)
+        self.invalidate_user_identity(user_id)
+        return result is not None
+    
+    def delete_user(self, user_id):
+        """Permanently delete a user, their index entries and update the counters"""
+        user = self.get_user_by_id(user_id)
+        if not user:
+            return False, "User not found"
+        
+        updates = self._counter_updates('users_by_role', {user.get('role') or 'unknown': -1})
+        for field, node in USER_INDEXES.items():
+            if user.get(field):
+                updates[f'indexes/{node}/{index_key(user[field])}'] = None
+        updates[f'users/{user_id}'] = None
+        updates[f'user_summaries/{user_id}'] = None
+        result = self._make_request('', 'PATCH', updates)
+        self.invalidate_user_identity(user_id)
+        if result is None:
+            return False, "Failed to delete user"
+        return True, "User deleted successfully"
+    
+    def update_user_profile(self, user_id, profile_data):
+        """Update profile fields for a user, keeping the indexes in sync"""
+        current_user = self.get_user_by_id(user_id)
+        if not current_user:
+            return False, "User not found"
+        
+        updated_user = dict(current_user)
+        updated_user.update(profile_data)
+        updated_user['updated_at'] = datetime.now().isoformat()
+        
+        if self._save_user(user_id, updated_user, current_user):
+            return True, "Profile updated successfully"
+        return False, "Failed to update profile"
+    
     def update_user_password(self, username, new_password):
         """Update user password"""
         user = self.get_user_by_username(username)
         if not user:
             return False, "User not found"
         
-        # Hash the new password
-        hashed_password = generate_password_hash(new_password)
-        
-        # Get current user data and update password
-        user_id = user['id']
-        current_user = self.get_user_by_id(user_id)
-        if current_user:
-            current_user['password'] = hashed_password
-            current_user['updated_at'] = datetime.now().isoformat()
-            
-            result = self._make_request(f'users/{user_id}', 'PUT', current_user)
-            if result:
-                return True, "Password updated successfully"
-        
+        if self._update_user_fields(user['id'], {
+            'password_hash': generate_password_hash(new_password),
+            'password': None,  # drop any legacy field so it cannot shadow the new hash
+            'updated_at': datetime.now().isoformat()
+        }):
+            return True, "Password updated successfully"
         return False, "Failed to update password"
     
-    def generate_verification_code(self):
-        """Generate a 6-digit verification code"""
-        import random
-        return str(random.randint(100000, 999999))
+    def _update_user_fields(self, user_id, fields):
+        """PATCH fields that no index or counter depends on, then drop cached copies"""
+        result = self.update(f'users/{user_id}', fields)
+        self.invalidate_user_identity(user_id)
+        return result
+    
+    def mark_email_verified(self, user_id):
+        """Flag a user's email address as verified"""
+        if not self._exists(f'users/{user_id}'):
+            return False, "User not found"
+        if self._update_user_fields(user_id, {
+            'email_verified': True,
+            'verified_at': datetime.now().isoformat()
+        }):
+            return True, "Email verified successfully"
+        return False, "Failed to update verification status"
+    
+    @staticmethod
+    def _verification_code_path(user_id, purpose):
+        """Path of the single live code for a user and purpose"""
+        return f'verification_codes/{index_key(purpose)}/{index_key(user_id)}'
     
     def store_verification_code(self, user_id, code, purpose='registration'):
-        """Store verification code for email verification"""
+        """Store verification code for email verification.
+        
+        Codes are keyed by purpose and user, so issuing a new code replaces
+        the previous one and verification is a single keyed read.
+        """
         verification_data = {
             'user_id': user_id,
             'code': code,
@@ -177,136 +660,398 @@ class SimpleFirebaseDB:
             'expires_at': (datetime.now() + timedelta(minutes=15)).isoformat()  # 15 min expiry
         }
         
-        result = self._make_request('verification_codes', 'POST', verification_data)
-        return result.get('name') if result else None
-    
-    def verify_code(self, code, purpose='registration'):
-        """Verify and use a verification code"""
-        codes = self._make_request('verification_codes')
-        if codes:
-            for code_id, code_data in codes.items():
-                if (code_data.get('code') == code and 
-                    code_data.get('purpose') == purpose and
-                    not code_data.get('used', False)):
-                    
-                    # Check if not expired
-                    expires_at = datetime.fromisoformat(code_data['expires_at'])
-                    if datetime.now() < expires_at:
-                        # Mark as used
-                        code_data['used'] = True
-                        code_data['used_at'] = datetime.now().isoformat()
-                        self._make_request(f'verification_codes/{code_id}', 'PUT', code_data)
-                        return code_data['user_id']
+        path = self._verification_code_path(user_id, purpose)
+        result = self._make_request(quote(path, safe='/'), 'PUT', verification_data)
+        self._ensure_sweeper()
+        return path if result else None
+    
+    def verify_code(self, code, purpose='registration', user_id=None):
+        """Verify and use a verification code.
+        
+        With user_id this is one keyed read; without it every live code for
+        the purpose is scanned. Codes issued before they were keyed (stored
+        under push ids) are still accepted until they expire.
+        """
+        if user_id is not None:
+            path = self._verification_code_path(user_id, purpose)
+            code_data = self._make_request(quote(path, safe='/'))
+            candidates = {path: code_data} if isinstance(code_data, dict) else {}
+        else:
+            codes = self._make_request(quote(f'verification_codes/{index_key(purpose)}', safe='/')) or {}
+            candidates = {f'verification_codes/{index_key(purpose)}/{key}': value
+                          for key, value in codes.items() if isinstance(value, dict)}
+        
+        verified_user_id = self._use_verification_code(candidates, code)
+        # A keyed code for this user supersedes any older one; otherwise try the old layout
+        if verified_user_id is None and not (user_id is not None and candidates):
+            verified_user_id = self._use_verification_code(self._legacy_verification_codes(purpose, user_id), code)
+        return verified_user_id
+    
+    def _legacy_verification_codes(self, purpose, user_id=None):
+        """Live codes still in the pre-keyed layout, verification_codes/{push_id}.
+        
+        Only legacy records have a user_id child at that level, so one
+        indexed query (.indexOn user_id on /verification_codes) returns them
+        without downloading the keyed codes.
+        """
+        index = 'verification_codes/user_id'
+        if not self._index_usable(index):
+            return {}
+        params = {'orderBy': '"user_id"'}
+        if user_id is not None:
+            params['equalTo'] = json.dumps(user_id)
+        else:
+            params['startAt'] = '""'
+        try:
+            response = self._send('verification_codes', params=params)
+        except FirebaseUnavailable:
+            raise
+        except Exception as e:
+            print(f"Firebase request error: {e}")
+            return {}
+        if response.status_code != 200:
+            if response.status_code == 400:
+                self._index_rejected(index, response, 'codes issued before the keyed layout are not checked')
+            else:
+                print(f"Firebase legacy code query failed: {response.status_code} {response.text[:200]}")
+            return {}
+        self._index_served(index)
+        
+        codes = response.json() or {}
+        return {f'verification_codes/{key}': value for key, value in codes.items()
+                if isinstance(value, dict) and 'code' in value and value.get('purpose') == purpose
+                and (user_id is None or value.get('user_id') == user_id)}
+    
+    def _use_verification_code(self, candidates, code):
+        """Delete the first unused, unexpired candidate matching code and return its user id"""
+        for path, code_data in candidates.items():
+            if (hmac.compare_digest(str(code_data.get('code', '')), str(code)) and
+                not code_data.get('used', False)):
+                
+                # Check if not expired
+                expires_at = datetime.fromisoformat(code_data['expires_at'])
+                if datetime.now() < expires_at:
+                    # Codes are single use - remove it rather than keep a used copy
+                    self._make_request(quote(path, safe='/'), 'DELETE')
+                    return code_data['user_id']
         return None
     
-    def generate_reset_token(self):
-        """Generate a secure reset token"""
-        return ''.join(secrets.choice(string.ascii_letters + string.digits) for _ in range(32))
+    def _expired_verification_codes(self, now):
+        """Paths of used or expired verification codes (including pre-keyed records)"""
+        codes = self._make_request('verification_codes') or {}
+        stale = []
+        for key, value in codes.items():
+            if not isinstance(value, dict):
+                continue
+            if 'code' in value:
+                # Record from before codes were keyed by purpose and user
+                if self._is_stale(value, now):
+                    stale.append(f'verification_codes/{key}')
+                continue
+            for user_key, record in value.items():
+                if self._is_stale(record, now):
+                    stale.append(f'verification_codes/{key}/{user_key}')
+        return stale
+    
+    def _delete_paths(self, paths):
+        """Delete many paths with batched multi-path null writes; returns the count deleted"""
+        deleted = 0
+        for start in range(0, len(paths), SWEEP_BATCH_SIZE):
+            batch = paths[start:start + SWEEP_BATCH_SIZE]
+            if self._make_request('', 'PATCH', {path: None for path in batch}) is None:
+                break
+            deleted += len(batch)
+        return deleted
+    
+    def sweep_verification_codes(self):
+        """Delete used and expired verification codes"""
+        stale = self._expired_verification_codes(datetime.now())
+        deleted = self._delete_paths(stale)
+        if deleted < len(stale):
+            return False, f"Removed {deleted} of {len(stale)} stale verification codes"
+        return True, f"Removed {deleted} stale verification codes"
+    
+    def _ensure_sweeper(self):
+        """Start the periodic sweeper thread for this process, if enabled"""
+        if SWEEP_INTERVAL <= 0 or self._sweeper_pid == os.getpid():
+            return
+        with self._executor_lock:
+            if self._sweeper_pid == os.getpid():
+                return
+            self._sweeper_pid = os.getpid()
+            threading.Thread(target=self._run_sweeper, name='firebase-sweeper', daemon=True).start()
+    
+    def _run_sweeper(self):
+        while True:
+            # Jitter so workers forked together do not sweep in lockstep
+            time.sleep(SWEEP_INTERVAL * random.uniform(0.8, 1.2))
+            try:
+                for success, message in self.sweep_expired_records():
+                    if not success:
+                        print(f"⚠️ Sweep incomplete: {message}")
+            except Exception as e:
+                print(f"⚠️ Sweep failed: {e}")
     
     def create_password_reset_token(self, user_id):
         """Create a password reset token for a user"""
         token = self.generate_reset_token()
+        token_hash = self._reset_token_hash(token)
         expires_at = (datetime.now() + timedelta(hours=1)).isoformat()  # Token expires in 1 hour
         
         reset_data = {
             'user_id': user_id,
-            'token': token,
+            'token_hash': token_hash,
             'expires_at': expires_at,
             'created_at': datetime.now().isoformat(),
             'used': False
         }
         
-        result = self._make_request('password_resets', 'POST', reset_data)
+        result = self._make_request(f'password_resets/{token_hash}', 'PUT', reset_data)
+        self._ensure_sweeper()
         if result:
             return token
         return None
     
     def verify_reset_token(self, token):
         """Verify if a reset token is valid and not expired"""
-        resets = self._make_request('password_resets')
-        if resets:
-            for reset_id, reset_data in resets.items():
-                if (reset_data.get('token') == token and 
-                    not reset_data.get('used', False)):
-                    
-                    # Check if token is not expired
-                    expires_at = datetime.fromisoformat(reset_data['expires_at'])
-                    if datetime.now() < expires_at:
-                        return reset_data['user_id'], reset_id
+        if not token:
+            return None, None
+        token_hash = self._reset_token_hash(token)
+        reset_data = self._make_request(f'password_resets/{token_hash}')
+        if (isinstance(reset_data, dict) and
+            hmac.compare_digest(str(reset_data.get('token_hash', '')), token_hash) and
+            not self._is_stale(reset_data, datetime.now())):
+            return reset_data['user_id'], token_hash
         return None, None
     
     def use_reset_token(self, reset_id):
         """Mark a reset token as used"""
-        reset_data = self._make_request(f'password_resets/{reset_id}')
-        if reset_data:
-            reset_data['used'] = True
-            reset_data['used_at'] = datetime.now().isoformat()
-            self._make_request(f'password_resets/{reset_id}', 'PUT', reset_data)
-            return True
-        return False
+        result = self._make_request(f'password_resets/{reset_id}', 'PATCH', {
+            'used': True,
+            'used_at': datetime.now().isoformat()
+        })
+        return result is not None
+    
+    def sweep_reset_tokens(self):
+        """Delete used and expired reset tokens, plus any stored before tokens were hashed"""
+        resets = self._make_request('password_resets') or {}
+        now = datetime.now()
+        stale = [f'password_resets/{reset_id}' for reset_id, reset_data in resets.items()
+                 if self._is_stale(reset_data, now) or 'token' in reset_data]
+        deleted = self._delete_paths(stale)
+        if deleted < len(stale):
+            return False, f"Removed {deleted} of {len(stale)} stale reset tokens"
+        return True, f"Removed {deleted} stale reset tokens"
     
     def reset_user_password(self, user_id, new_password):
         """Reset user password using user ID"""
-        user = self.get_user_by_id(user_id)
-        if not user:
+        if not self._exists(f'users/{user_id}'):
             return False, "User not found"
         
-        # Hash the new password
-        hashed_password = generate_password_hash(new_password)
-        
-        # Update user password
-        user['password'] = hashed_password
-        user['updated_at'] = datetime.now().isoformat()
-        user['password_reset_at'] = datetime.now().isoformat()
-        
-        result = self._make_request(f'users/{user_id}', 'PUT', user)
-        if result:
+        now = datetime.now().isoformat()
+        if self._update_user_fields(user_id, {
+            'password_hash': generate_password_hash(new_password),
+            'password': None,
+            'updated_at': now,
+            'password_reset_at': now
+        }):
             return True, "Password reset successfully"
         
         return False, "Failed to reset password"
     
-    def find_user_for_reset(self, contact_info, student_id, method):
-        """Find user by email/phone and verify with student ID"""
-        users = self._make_request('users')
-        if users:
-            for user_id, user_data in users.items():
-                # Check if contact info matches email or phone based on method
-                contact_match = False
-                if method == 'email' and user_data.get('email') == contact_info:
-                    contact_match = True
-                elif method == 'phone' and user_data.get('phone') == contact_info:
-                    contact_match = True
-                
-                # Verify student ID matches
-                if contact_match and user_data.get('student_id') == student_id:
-                    user_data['id'] = user_id
-                    return user_data
-        return None
-    
     # Issue Management
     def get_all_issues(self):
         """Get all issues"""
-        issues = self._make_request('issues')
+        issues = self._fetch_issues_tree()
+        issue_list = []
+        if issues:
+            for issue_id, issue_data in issues.items():
+                issue_data['id'] = issue_id
+                issue_list.append(issue_data)
+        return sorted(issue_list, key=self._issue_sort_key, reverse=True)
+    
+    def get_issue_summary(self):
+        """Get all issues plus per-status and per-category counts from one fetch"""
+        issues = self._fetch_issues_tree()
         issue_list = []
+        status_counts = {}
+        category_counts = {}
         if issues:
             for issue_id, issue_data in issues.items():
                 issue_data['id'] = issue_id
                 issue_list.append(issue_data)
-        return sorted(issue_list, key=lambda x: x.get('created_at', ''), reverse=True)
+                status = issue_data.get('status', 'unknown')
+                status_counts[status] = status_counts.get(status, 0) + 1
+                category = issue_data.get('category', 'unknown')
+                category_counts[category] = category_counts.get(category, 0) + 1
+        issue_list.sort(key=self._issue_sort_key, reverse=True)
+        return {
+            'issues': issue_list,
+            'status_counts': status_counts,
+            'category_counts': category_counts
+        }
+    
+    def _query_issue_window(self, bound, older, limit):
+        """Fetch up to limit issues strictly older/newer than bound, nearest first.
+        
+        Uses server-side ordering on created_at, which needs
+        ".indexOn": ["created_at"] on /issues in the database rules.
+        Firebase can only bound on created_at, so issues sharing the bound's
+        created_at are told apart by id here; a window made up only of such
+        ties is re-read with a larger limit.
+        Returns (issues, exhausted) or None if the query is rejected or cannot
+        get past a tie, in which case callers fall back to a scan.
+        """
+        requested = limit + 1 if bound else limit
+        while True:
+            params = {'orderBy': '"created_at"'}
+            if older:
+                params['limitToLast'] = requested
+                if bound:
+                    params['endAt'] = json.dumps(bound[0])
+            else:
+                params['limitToFirst'] = requested
+                if bound:
+                    params['startAt'] = json.dumps(bound[0])
+            
+            try:
+                response = self._send('issues', params=params)
+            except FirebaseUnavailable:
+                # Falling back to the whole tree would only hit the same outage harder
+                raise
+            except Exception as e:
+                print(f"Firebase request error: {e}")
+                return None
+            if response.status_code != 200:
+                if response.status_code == 400:
+                    self._index_rejected('issues/created_at', response)
+                else:
+                    print(f"Firebase ordered query failed: {response.status_code} {response.text[:200]}")
+                return None
+            self._index_served('issues/created_at')
+            
+            issues = response.json() or {}
+            window = []
+            for issue_id, issue_data in issues.items():
+                issue_data['id'] = issue_id
+                key = self._issue_sort_key(issue_data)
+                if bound and (key >= bound if older else key <= bound):
+                    continue
+                window.append(issue_data)
+            exhausted = len(issues) < requested
+            if window or exhausted or not bound:
+                window.sort(key=self._issue_sort_key, reverse=older)
+                return window, exhausted
+            
+            # The server bounds on created_at only, so every row tied with the cursor's
+            # created_at and was filtered out by id - read further past the tie
+            if requested >= MAX_TIE_WINDOW:
+                print(f"⚠️ Over {MAX_TIE_WINDOW} issues share created_at {bound[0]}; scanning instead")
+                return None
+            requested = min(requested * 2, MAX_TIE_WINDOW)
+    
+    def list_issues(self, page_size=ISSUE_PAGE_SIZE, cursor=None, status=None, direction='next'):
+        """Get one page of issues (newest first) plus next/previous cursors.
+        
+        direction='next' returns issues older than cursor, 'prev' newer ones.
+        Only about one page of issues is downloaded per call.
+        """
+        older = direction != 'prev'
+        if self._index_usable('issues/created_at') and self._get_issue_mirror() is None:
+            start = bound = self.parse_issue_cursor(cursor)
+            matches = []
+            for _ in range(MAX_PAGE_QUERIES):
+                result = self._query_issue_window(bound, older, page_size + 1)
+                if result is None:
+                    break
+                window, exhausted = result
+                for issue in window:
+                    if not status or issue.get('status') == status:
+                        matches.append(issue)
+                if len(matches) > page_size or exhausted or not window:
+                    return self._build_issue_page(matches, page_size, start, older)
+                bound = self._issue_sort_key(window[-1])
+            else:
+                # Query budget used up on a sparse filter - resume from where the scan stopped
+                page = self._build_issue_page(matches, page_size, start, older)
+                scan_cursor = f"{bound[0]}|{bound[1]}"
+                if older and not page['next_cursor']:
+                    page['next_cursor'] = scan_cursor
+                elif not older and not page['prev_cursor']:
+                    page['prev_cursor'] = scan_cursor
+                return page
+        
+        mirror = self._get_issue_mirror()
+        if mirror is not None:
+            # Sort and filter the compact records; only the page is expanded
+            page = self.paginate_issues(self._mirrored_issue_records(mirror), page_size, cursor, status, direction)
+            page['issues'] = [expand(record) for record in page['issues']]
+            return page
+        return self.paginate_issues(self.get_all_issues(), page_size, cursor, status, direction)
+    
+    def _mirrored_issue_records(self, mirror, student_id=None):
+        """Mirrored IssueRecords (optionally one student's), newest first"""
+        records = [record for record in mirror.records().values()
+                   if isinstance(record, IssueRecord) and (student_id is None or record.student_id == student_id)]
+        records.sort(key=self._issue_sort_key, reverse=True)
+        return records
+    
+    def _query_student_issues(self, student_id):
+        """Fetch one student's issues with a single equalTo query.
+        
+        Needs ".indexOn": ["student_id"] on /issues in the database rules.
+        Returns the issues or None if Firebase rejects the query.
+        """
+        params = {'orderBy': '"student_id"', 'equalTo': json.dumps(student_id)}
+        try:
+            response = self._send('issues', params=params)
+        except FirebaseUnavailable:
+            raise
+        except Exception as e:
+            print(f"Firebase request error: {e}")
+            return None
+        if response.status_code != 200:
+            if response.status_code == 400:
+                self._index_rejected('issues/student_id', response)
+            else:
+                print(f"Firebase student query failed: {response.status_code} {response.text[:200]}")
+            return None
+        self._index_served('issues/student_id')
+        
+        issues = []
+        for issue_id, issue_data in (response.json() or {}).items():
+            issue_data['id'] = issue_id
+            issues.append(issue_data)
+        return issues
+    
+    def rebuild_student_issue_index(self):
+        """Check that Firebase serves per-student issue queries (.indexOn student_id on /issues)"""
+        if self._query_student_issues('') is None:
+            return False, "Firebase rejected the per-student issue query; deploy database.rules.json (see replit.md)"
+        return True, "Per-student issue queries are indexed by Firebase"
     
     def get_issues_by_student(self, student_id):
-        """Get issues by student ID"""
+        """Get issues by student ID, newest first"""
+        mirror = self._get_issue_mirror()
+        if mirror is not None:
+            return [expand(record) for record in self._mirrored_issue_records(mirror, student_id)]
+        
+        if self._index_usable('issues/student_id'):
+            issues = self._query_student_issues(student_id)
+            if issues is not None:
+                return sorted(issues, key=self._issue_sort_key, reverse=True)
+        
+        # No student_id index on the server - scan every issue
         issues = self.get_all_issues()
         return [issue for issue in issues if issue.get('student_id') == student_id]
     
-    def get_issues_by_status(self, status):
-        """Get issues by status"""
-        issues = self.get_all_issues()
-        return [issue for issue in issues if issue.get('status') == status]
-    
     def get_issue_by_id(self, issue_id):
         """Get issue by ID"""
-        issue = self._make_request(f'issues/{issue_id}')
+        mirror = self._get_issue_mirror()
+        if mirror is not None:
+            issue = mirror.get(issue_id)
+        else:
+            issue = self._make_request(f'issues/{issue_id}')
         if issue:
             issue['id'] = issue_id
             return issue
@@ -314,188 +1059,184 @@ class SimpleFirebaseDB:
     
     def create_issue(self, student_id, subject, category, message):
         """Create new issue"""
-        issue_data = {
-            'student_id': student_id,
-            'subject': subject,
-            'category': category,
-            'message': message,
-            'status': 'pending',
-            'response': '',
-            'created_at': datetime.now().isoformat()
-        }
+        issue_data = self._new_issue_record(student_id, subject, category, message)
         
         result = self._make_request('issues', 'POST', issue_data)
         if result:
-            return result.get('name'), "Issue created successfully"
+            self._issues_changed()
+            issue_id = result.get('name')
+            updates = self._counter_updates('issues_by_status', {'pending': 1})
+            updates.update(self._counter_updates('issues_by_category', {category: 1}))
+            if self._make_request('', 'PATCH', updates) is None:
+                self._flag_counter_drift('create_issue', f"issue {issue_id} was created")
+            return issue_id, "Issue created successfully"
         return None, "Failed to create issue"
     
     def update_issue_status(self, issue_id, status, response=None):
-        """Update issue status"""
-        update_data = {
-            'status': status,
-            'updated_at': datetime.now().isoformat()
-        }
-        if response:
-            update_data['response'] = response
-        
-        # Get current issue data
-        current_issue = self.get_issue_by_id(issue_id)
-        if current_issue:
-            current_issue.update(update_data)
-            result = self._make_request(f'issues/{issue_id}', 'PUT', current_issue)
-            if result:
-                return True, "Issue updated successfully"
-        return False, "Failed to update issue"
+        """Update issue status.
+        
+        The issue (status, updated_at, response) is rewritten with one
+        ETag-guarded PUT so concurrent admins cannot count the same transition
+        twice. Firebase only guards single-location writes, so the /stats
+        move follows in its own PATCH; if that fails the drift is flagged for
+        'flask reconcile-stats'.
+        """
+        def apply(issue):
+            if issue is None:
+                return None
+            issue['status'] = status
+            issue['updated_at'] = datetime.now().isoformat()
+            if response:
+                issue['response'] = response
+            return issue
+        
+        swapped, old_issue = self.update_guarded(f'issues/{issue_id}', apply)
+        if not swapped:
+            return False, "Failed to update issue"
+        self._issues_changed()
+        
+        old_status = old_issue.get('status')
+        if old_status != status:
+            moved = self.update('', self._counter_updates('issues_by_status', {old_status or 'unknown': -1, status: 1}))
+            if not moved:
+                self._flag_counter_drift('update_issue_status', f"issue {issue_id} moved {old_status} -> {status}")
+        return True, "Issue updated successfully"
+    
+    def delete_issue(self, issue_id):
+        """Permanently delete an issue and update the counters"""
+        issue = self.get_issue_by_id(issue_id)
+        if not issue:
+            return False, "Issue not found"
+        
+        updates = self._counter_updates('issues_by_status', {issue.get('status', 'unknown'): -1})
+        updates.update(self._counter_updates('issues_by_category', {issue.get('category', 'unknown'): -1}))
+        updates[f'issues/{issue_id}'] = None
+        if self._make_request('', 'PATCH', updates) is None:
+            return False, "Failed to delete issue"
+        self._issues_changed()
+        return True, "Issue deleted successfully"
     
     # System Settings Management
-    def get_system_settings(self):
-        """Get all system settings"""
-        settings = self._make_request('system_settings')
-        if not settings:
-            # Return default settings if none exist
-            return self.get_default_system_settings()
+    def _load_system_settings(self):
+        """Get the stored settings document from the cache, revalidating by ETag"""
+        entry = self._settings_cache.get('system')
+        if entry is not None:
+            return entry['settings']
+        
+        # Requests arriving during a revalidation wait for it instead of repeating it
+        settings, _ = self._in_flight.do('system_settings', self._revalidate_settings)
         return settings
     
-    def get_default_system_settings(self):
-        """Get default system settings"""
-        return {
-            'system_info': {
-                'name': 'KTU Student Portal',
-                'full_name': 'Koforidua Technical University Student Portal',
-                'description': 'Submit and track your academic concerns',
-                'contact_email': 'support@ktu.edu.gh',
-                'phone': '+233-000-000-000'
-            },
-            'categories': {
-                'academic': {'name': 'Academic', 'description': 'Course content, schedules, lecturer issues'},
-                'exams_grades': {'name': 'Exams & Grades', 'description': 'Missing grades, exam timetables, remark requests'},
-                'technical': {'name': 'Technical', 'description': 'Portal issues, software problems'},
-                'administration': {'name': 'Administration', 'description': 'Registration, ID cards, fee clearance'},
-                'facilities': {'name': 'Facilities', 'description': 'Library, labs, study spaces'},
-                'welfare': {'name': 'Welfare', 'description': 'Counseling, conflicts, special needs'},
-                'other': {'name': 'Other', 'description': 'Any other concerns'}
-            },
-            'academic_levels': {
-                '100': 'Level 100',
-                '200': 'Level 200',
-                '300': 'Level 300',
-                '400': 'Level 400',
-                'graduate': 'Graduate',
-                'postgraduate': 'Postgraduate'
-            },
-            'index_prefixes': {
-                'CS': 'Computer Science',
-                'IT': 'Information Technology',
-                'EE': 'Electrical Engineering',
-                'ME': 'Mechanical Engineering',
-                'CE': 'Civil Engineering',
-                'BA': 'Business Administration'
-            },
-            'email_settings': {
-                'from_name': 'KTU Student Portal',
-                'from_email': 'noreply@ktu.edu.gh',
-                'support_email': 'support@ktu.edu.gh'
-            },
-            'registration_settings': {
-                'require_email_verification': True,
-                'allowed_email_domain': '@ktu.edu.gh',
-                'min_password_length': 8,
-                'require_index_prefix': False
-            },
-            'notification_messages': {
-                'registration_success': 'Registration successful! Please check your email for verification code.',
-                'email_verification_required': 'Please verify your email address before logging in.',
-                'login_success': 'Login successful!',
-                'invalid_credentials': 'Invalid username or password.',
-                'access_denied': 'Access denied. Admin privileges required.'
-            }
-        }
+    def _revalidate_settings(self):
+        """Conditionally re-read the settings document and refresh the cache"""
+        entry = self._settings_cache.get_stale('system')
+        headers = {'X-Firebase-ETag': 'true'}
+        if entry is not None:
+            headers['if-none-match'] = entry['etag']
+        
+        try:
+            response = self._send('system_settings', headers=headers)
+        except FirebaseUnavailable:
+            # Stale settings beat defaults; without a copy the caller decides
+            if entry is None:
+                raise
+            return entry['settings']
+        except Exception as e:
+            print(f"Firebase request error: {e}")
+            return entry['settings'] if entry else None
+        
+        if response.status_code == 304 and entry is not None:
+            self._settings_cache.set('system', entry)
+            return entry['settings']
+        if response.status_code == 200:
+            settings = response.json()
+            self._settings_cache.set('system', {'etag': response.headers.get('ETag'), 'settings': settings})
+            return settings
+        
+        print(f"Firebase request failed: {response.status_code}")
+        return entry['settings'] if entry else None
+    
+    def invalidate_settings_cache(self):
+        """Force the next settings read, in every worker, to go to Firebase"""
+        self._settings_cache.invalidate('system')
+    
+    def _patch_settings(self, updates):
+        """PATCH only the changed settings subtrees ({'categories/x': value, ...})"""
+        # Seed the defaults first so a partial write never becomes the whole document
+        if not self._load_system_settings() and not self.initialize_default_settings():
+            return False
+        result = self._make_request('system_settings', 'PATCH', updates)
+        self.invalidate_settings_cache()
+        return result is not None
     
     def update_system_settings(self, settings_data):
         """Update system settings"""
         result = self._make_request('system_settings', 'PUT', settings_data)
+        self.invalidate_settings_cache()
         return result is not None
     
-    def get_setting(self, setting_path):
-        """Get a specific setting by path (e.g., 'system_info.name')"""
-        settings = self.get_system_settings()
-        keys = setting_path.split('.')
-        current = settings
-        
-        for key in keys:
-            if isinstance(current, dict) and key in current:
-                current = current[key]
-            else:
+    # Statistics
+    @staticmethod
+    def _counter_updates(group, deltas):
+        """Multi-path updates that atomically add deltas to /stats/{group}/{key}"""
+        updates = {}
+        for key, delta in deltas.items():
+            if delta:
+                updates[f'stats/{group}/{index_key(key)}'] = {'.sv': {'increment': delta}}
+        return updates
+    
+    def _flag_counter_drift(self, db_method, change):
+        """Log, count and record (best effort) a change whose /stats update failed"""
+        print(f"⚠️ Counters not updated after {change}; run 'flask reconcile-stats'")
+        metrics.counter_write_failures.inc(db_method)
+        # reconcile_counters rewrites stats/_meta, clearing the flag
+        self.update('stats/_meta', {'needs_reconcile': datetime.now().isoformat()})
+    
+    def _get_counters(self, group):
+        """Read a materialized counter group, or None if counters were never reconciled"""
+        if not self._stats_ready:
+            self._stats_ready = bool(self._make_request('stats/_meta'))
+            if not self._stats_ready:
                 return None
-        
-        return current
+        counters = self._make_request(f'stats/{group}') or {}
+        return {unquote(key): count for key, count in counters.items() if count}
     
-    def update_setting(self, setting_path, value):
-        """Update a specific setting by path"""
-        settings = self.get_system_settings()
-        keys = setting_path.split('.')
-        current = settings
+    def reconcile_counters(self):
+        """Recompute all counters from source data and repair any drift.
         
-        # Navigate to the parent of the target setting
-        for key in keys[:-1]:
-            if key not in current:
-                current[key] = {}
-            current = current[key]
-        
-        # Update the target setting
-        current[keys[-1]] = value
+        Increments that land while this runs can be overwritten, so run it
+        when traffic is low (or again afterwards).
+        """
+        summary = self.get_issue_summary()
+        actual = {
+            'issues_by_status': summary['status_counts'],
+            'issues_by_category': summary['category_counts'],
+            'users_by_role': self._count_users_by_role()
+        }
+        stored = self._make_request('stats') or {}
         
-        return self.update_system_settings(settings)
-    
-    def add_category(self, key, name, description):
-        """Add a new concern category"""
-        settings = self.get_system_settings()
-        if 'categories' not in settings:
-            settings['categories'] = {}
+        drift = {}
+        for group, counts in actual.items():
+            current = stored.get(group) or {}
+            encoded = {index_key(key): count for key, count in counts.items()}
+            for key in set(current) | set(encoded):
+                difference = encoded.get(key, 0) - (current.get(key) or 0)
+                if difference:
+                    drift[f'{group}/{key}'] = difference
+            actual[group] = encoded
         
-        settings['categories'][key] = {
-            'name': name,
-            'description': description
+        actual['_meta'] = {
+            'reconciled_at': datetime.now().isoformat(),
+            'drift': drift or None
         }
+        if self._make_request('stats', 'PUT', actual) is None:
+            return False, "Failed to write counters"
         
-        return self.update_system_settings(settings)
+        self._stats_ready = True
+        return True, f"Counters reconciled ({len(drift)} drifted values repaired)"
     
-    def remove_category(self, key):
-        """Remove a concern category"""
-        settings = self.get_system_settings()
-        if 'categories' in settings and key in settings['categories']:
-            del settings['categories'][key]
-            return self.update_system_settings(settings)
-        return False
-    
-    def add_index_prefix(self, prefix, description):
-        """Add a new index number prefix"""
-        settings = self.get_system_settings()
-        if 'index_prefixes' not in settings:
-            settings['index_prefixes'] = {}
-        
-        settings['index_prefixes'][prefix] = description
-        return self.update_system_settings(settings)
-    
-    def remove_index_prefix(self, prefix):
-        """Remove an index number prefix"""
-        settings = self.get_system_settings()
-        if 'index_prefixes' in settings and prefix in settings['index_prefixes']:
-            del settings['index_prefixes'][prefix]
-            return self.update_system_settings(settings)
-        return False
-    
-    def initialize_default_settings(self):
-        """Initialize system with default settings if none exist"""
-        current_settings = self._make_request('system_settings')
-        if not current_settings:
-            default_settings = self.get_default_system_settings()
-            return self.update_system_settings(default_settings)
-        return True
-    
-    # Statistics
-    def get_user_count_by_role(self):
-        """Get user count by role"""
+    def _count_users_by_role(self):
+        """Count users by role from the full users tree"""
         users = self.get_all_users()
         role_counts = {}
         for user in users:
@@ -503,14 +1244,27 @@ class SimpleFirebaseDB:
             role_counts[role] = role_counts.get(role, 0) + 1
         return role_counts
     
+    def get_user_count_by_role(self):
+        """Get user count by role"""
+        counts = self._get_counters('users_by_role')
+        return counts if counts is not None else self._count_users_by_role()
+    
     def get_issue_count_by_status(self):
         """Get issue count by status"""
-        issues = self.get_all_issues()
-        status_counts = {}
-        for issue in issues:
-            status = issue.get('status', 'unknown')
-            status_counts[status] = status_counts.get(status, 0) + 1
-        return status_counts
+        counts = self._get_counters('issues_by_status')
+        return counts if counts is not None else self.get_issue_summary()['status_counts']
+    
+    def get_issue_count_by_category(self):
+        """Get issue count by category"""
+        counts = self._get_counters('issues_by_category')
+        return counts if counts is not None else self.get_issue_summary()['category_counts']
+
+def create_storage():
+    """Build the storage backend selected by STORAGE_BACKEND"""
+    if STORAGE_BACKEND in ('sql', 'sqlite'):
+        from sql_storage import SQLStorage
+        return SQLStorage()
+    return SimpleFirebaseDB()
 
 # Global instance
-simple_firebase_db = SimpleFirebaseDB()
+simple_firebase_db = create_storage()
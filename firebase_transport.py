@@ -0,0 +1,246 @@
+"""
+Pooled HTTP transport for the Firebase Realtime Database REST API.
+
+Every Firebase call goes through a single shared ``requests.Session`` so TCP and
+TLS connections are kept alive and reused across requests instead of being
+re-established for each read. The pool is sized for the number of gunicorn
+threads that may talk to Firebase at the same time.
+
+Each call has an overall deadline that caps the timeouts of every attempt.
+Idempotent requests that fail with a network error, timeout or 429/5xx are
+retried with jittered backoff while a shared retry budget allows it, and a
+circuit breaker rejects calls outright once Firebase keeps failing. Either
+way the caller gets FirebaseUnavailable instead of waiting out a hung socket.
+"""
+
+import os
+import random
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+import metrics
+from storage import StorageUnavailable
+
+
+def _env_int(name, default):
+    """Read an integer from the environment, falling back to default"""
+    try:
+        return int(os.environ.get(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def _env_float(name, default):
+    """Read a float from the environment, falling back to default"""
+    try:
+        return float(os.environ.get(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+class FirebaseUnavailable(StorageUnavailable):
+    """Firebase did not answer usefully: breaker open, deadline passed or retries exhausted"""
+
+
+class CircuitBreaker:
+    """Fails calls fast after repeated upstream failures, probing again after a cooldown.
+
+    closed: calls pass; failure_threshold consecutive failures open the breaker.
+    open: calls are rejected until cooldown seconds have passed.
+    half-open: one probe call passes; success closes the breaker, failure reopens it.
+    """
+
+    def __init__(self, failure_threshold=None, cooldown=None):
+        self.failure_threshold = failure_threshold or _env_int('FIREBASE_BREAKER_THRESHOLD', 5)
+        self.cooldown = cooldown or _env_float('FIREBASE_BREAKER_COOLDOWN', 30.0)
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at < self.cooldown:
+            return 'open'
+        return 'half-open'
+
+    def allow(self):
+        """Whether a call may go out now"""
+        with self._lock:
+            state = self.state
+            if state == 'closed':
+                return True
+            if state == 'half-open' and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._probing or self.failures >= self.failure_threshold:
+                if self.opened_at is None or self._probing:
+                    print(f"⚠️ Firebase circuit breaker open after {self.failures} failures")
+                self.opened_at = time.monotonic()
+            self._probing = False
+
+
+class RetryBudget:
+    """Token bucket that caps retries at a fraction of recent requests.
+
+    Every request earns ratio tokens and every retry spends one, so an outage
+    adds at most ratio extra load on Firebase instead of multiplying it.
+    """
+
+    def __init__(self, ratio=None, max_tokens=None):
+        self.ratio = ratio if ratio is not None else _env_float('FIREBASE_RETRY_BUDGET_RATIO', 0.2)
+        self.max_tokens = max_tokens or _env_float('FIREBASE_RETRY_BUDGET_MAX', 10.0)
+        self._tokens = self.max_tokens
+        self._lock = threading.Lock()
+
+    def deposit(self):
+        with self._lock:
+            self._tokens = min(self.max_tokens, self._tokens + self.ratio)
+
+    def withdraw(self):
+        """Spend a token for one retry; False if the budget is exhausted"""
+        with self._lock:
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+
+class FirebaseTransport:
+    """Thread-safe keep-alive HTTP transport shared by all Firebase calls"""
+
+    SUPPORTED_METHODS = ('GET', 'PUT', 'POST', 'PATCH', 'DELETE')
+    # POST pushes a new child, so repeating it could create duplicates
+    IDEMPOTENT_METHODS = ('GET', 'PUT', 'PATCH', 'DELETE')
+    # Statuses worth retrying: throttling and server-side failures
+    RETRYABLE_STATUSES = (429, 500, 502, 503, 504)
+
+    def __init__(self, pool_connections=None, pool_maxsize=None, pool_block=None,
+                 connect_timeout=None, read_timeout=None, deadline=None, max_attempts=None,
+                 breaker=None, retry_budget=None):
+        # Number of distinct hosts kept in the pool (Firebase is normally one host)
+        self.pool_connections = pool_connections or _env_int('FIREBASE_POOL_CONNECTIONS', 4)
+        # Connections kept per host - should be at least the gunicorn thread count
+        self.pool_maxsize = pool_maxsize or _env_int(
+            'FIREBASE_POOL_MAXSIZE', _env_int('GUNICORN_THREADS', 10)
+        )
+        # Wait for a free pooled connection instead of opening throwaway ones
+        if pool_block is None:
+            pool_block = os.environ.get('FIREBASE_POOL_BLOCK', 'false').lower() == 'true'
+        self.pool_block = pool_block
+        self.connect_timeout = connect_timeout or _env_float('FIREBASE_CONNECT_TIMEOUT', 3.05)
+        self.read_timeout = read_timeout or _env_float('FIREBASE_READ_TIMEOUT', 10.0)
+        # Total time one call may take, including retries and backoff
+        self.deadline = deadline or _env_float('FIREBASE_DEADLINE', 8.0)
+        self.max_attempts = max_attempts or _env_int('FIREBASE_MAX_ATTEMPTS', 3)
+        self.backoff_base = _env_float('FIREBASE_BACKOFF_BASE', 0.1)
+        self.backoff_max = _env_float('FIREBASE_BACKOFF_MAX', 2.0)
+        self.breaker = breaker or CircuitBreaker()
+        self.retry_budget = retry_budget or RetryBudget()
+
+        self._session = None
+        self._session_pid = None
+        self._lock = threading.Lock()
+
+    @property
+    def timeout(self):
+        """(connect, read) timeout tuple passed to requests"""
+        return (self.connect_timeout, self.read_timeout)
+
+    def _build_session(self):
+        """Create a session with a keep-alive connection pool mounted for http(s)"""
+        session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=self.pool_connections,
+            pool_maxsize=self.pool_maxsize,
+            pool_block=self.pool_block,
+            max_retries=0
+        )
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        session.headers.update({'Connection': 'keep-alive'})
+        return session
+
+    def _get_session(self):
+        """Return the shared session, rebuilding it after a fork (gunicorn preload)"""
+        pid = os.getpid()
+        session = self._session
+        if session is not None and self._session_pid == pid:
+            return session
+
+        with self._lock:
+            if self._session is None or self._session_pid != pid:
+                self._session = self._build_session()
+                self._session_pid = pid
+            return self._session
+
+    def request(self, method, url, json=None, params=None, headers=None, timeout=None, stream=False):
+        """Send a request over the pooled session and return the raw response.
+
+        Raises FirebaseUnavailable when the breaker is open or the call could
+        not get a non-retryable answer before its deadline. Streaming requests
+        are long-lived and manage their own reconnects, so they skip both.
+        """
+        method = method.upper()
+        if method not in self.SUPPORTED_METHODS:
+            raise ValueError(f"Unsupported HTTP method: {method}")
+
+        session = self._get_session()
+        if stream:
+            return session.request(method, url, json=json, params=params, headers=headers,
+                                   timeout=timeout or self.timeout, stream=True)
+
+        if not self.breaker.allow():
+            metrics.firebase_rejections.inc(method)
+            raise FirebaseUnavailable('Firebase circuit breaker is open')
+
+        self.retry_budget.deposit()
+        connect_timeout, read_timeout = timeout or self.timeout
+        deadline = time.monotonic() + self.deadline
+        attempts = self.max_attempts if method in self.IDEMPOTENT_METHODS else 1
+        for attempt in range(1, attempts + 1):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise FirebaseUnavailable(f"Firebase {method} missed its {self.deadline:g}s deadline")
+            try:
+                response = session.request(method, url, json=json, params=params, headers=headers,
+                                           timeout=(min(connect_timeout, remaining), min(read_timeout, remaining)))
+            except requests.RequestException as error:
+                failure = error
+            else:
+                if response.status_code not in self.RETRYABLE_STATUSES:
+                    self.breaker.record_success()
+                    return response
+                failure = f"HTTP {response.status_code}"
+                response.close()
+
+            self.breaker.record_failure()
+            # Full jitter keeps workers that failed together from retrying together
+            backoff = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+            if (attempt == attempts or time.monotonic() + backoff >= deadline or
+                    not self.breaker.allow() or not self.retry_budget.withdraw()):
+                raise FirebaseUnavailable(f"Firebase {method} failed after {attempt} attempt(s): {failure}")
+            metrics.firebase_retries.inc(method)
+            time.sleep(backoff)
+
+    def close(self):
+        """Close all pooled connections"""
+        with self._lock:
+            if self._session is not None:
+                self._session.close()
+            self._session = None
+            self._session_pid = None
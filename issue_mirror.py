@@ -0,0 +1,224 @@
+"""
+Live in-memory mirror of a Firebase node using the REST streaming API.
+
+The mirror opens ``{path}.json`` with ``Accept: text/event-stream`` and applies
+the ``put``/``patch`` events Firebase sends to a local dict. Firebase starts
+every stream with a full ``put`` of the node, so reconnecting also resyncs the
+whole copy. Reads are only served while the stream is connected and synced;
+otherwise callers fall back to normal REST reads.
+"""
+
+import json
+import os
+import socket
+import threading
+import time
+
+
+class IssueMirror:
+    """Background copy of a Firebase node kept current by server-sent events"""
+
+    def __init__(self, base_url, transport, path='issues',
+                 reconnect_delay=1.0, max_reconnect_delay=30.0, read_timeout=90.0, record_type=None):
+        self.url = f"{base_url}{path}.json"
+        self.transport = transport
+        self.path = path
+        # Compact form children are held in (e.g. records.IssueRecord); None keeps dicts
+        self.record_type = record_type
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        # Firebase sends keep-alive events every ~30s; a silent socket is dead
+        self.read_timeout = read_timeout
+
+        self._data = {}
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+        self._response = None
+        self.pid = os.getpid()
+        self.reconnects = 0
+        self.last_event_at = None
+
+    @property
+    def ready(self):
+        """True while the stream is connected and the copy is in sync"""
+        return self._ready.is_set()
+
+    def start(self):
+        """Start the background streaming thread"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name=f'firebase-mirror-{self.path}', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop streaming and drop the local copy"""
+        self._stopped.set()
+        self._ready.clear()
+        response = self._response
+        if response is not None:
+            # close() waits for the streaming thread's blocked read (up to the next
+            # keep-alive); shutting the socket down first ends that read at once
+            connection = getattr(response.raw, 'connection', None)
+            sock = getattr(connection, 'sock', None)
+            if sock is not None:
+                try:
+                    sock.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+            response.close()
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join(timeout=5)
+
+    def wait_until_ready(self, timeout=None):
+        """Block until the initial sync has completed"""
+        return self._ready.wait(timeout)
+
+    def get_all(self):
+        """Return {key: copy of record} for every mirrored record"""
+        with self._lock:
+            return {key: self._unpack(value) for key, value in self._data.items()}
+
+    def get(self, key):
+        """Return a copy of one mirrored record, or None"""
+        with self._lock:
+            return self._unpack(self._data.get(key))
+
+    def records(self):
+        """Return {key: stored record} without copying; the records must not be modified"""
+        with self._lock:
+            return dict(self._data)
+
+    def _pack(self, key, value):
+        if self.record_type is not None and isinstance(value, dict):
+            return self.record_type.from_dict(value, key)
+        return value
+
+    def _unpack(self, value):
+        if self.record_type is not None and isinstance(value, self.record_type):
+            return value.to_dict()
+        return dict(value) if isinstance(value, dict) else value
+
+    def __len__(self):
+        with self._lock:
+            return len(self._data)
+
+    # Streaming
+    def _run(self):
+        delay = self.reconnect_delay
+        while not self._stopped.is_set():
+            try:
+                self._stream()
+                delay = self.reconnect_delay
+            except Exception as e:
+                if self._stopped.is_set():
+                    break
+                print(f"⚠️ Firebase mirror for /{self.path} disconnected: {e}")
+            finally:
+                self._ready.clear()
+                self._response = None
+
+            if self._stopped.wait(delay):
+                break
+            self.reconnects += 1
+            delay = min(delay * 2, self.max_reconnect_delay)
+
+    def _stream(self):
+        response = self.transport.request(
+            'GET', self.url,
+            headers={'Accept': 'text/event-stream'},
+            timeout=(self.transport.connect_timeout, self.read_timeout),
+            stream=True
+        )
+        self._response = response
+        if response.status_code != 200:
+            response.close()
+            raise ConnectionError(f"stream returned {response.status_code}")
+
+        # Firebase streams with chunked encoding; reading whole chunks (rather than
+        # fixed-size blocks) delivers each event as soon as it arrives
+        chunked = 'chunked' in response.headers.get('Transfer-Encoding', '').lower()
+        event, data_lines = None, []
+        for line in response.iter_lines(chunk_size=None if chunked else 1, decode_unicode=True):
+            if self._stopped.is_set():
+                break
+            if line is None:
+                continue
+            if line == '':
+                if event:
+                    self._dispatch(event, '\n'.join(data_lines))
+                event, data_lines = None, []
+            elif line.startswith('event:'):
+                event = line[6:].strip()
+            elif line.startswith('data:'):
+                data_lines.append(line[5:].strip())
+
+        if not self._stopped.is_set():
+            raise ConnectionError("stream closed by server")
+
+    def _dispatch(self, event, payload):
+        self.last_event_at = time.time()
+        if event == 'keep-alive':
+            return
+        if event in ('cancel', 'auth_revoked'):
+            raise ConnectionError(f"stream {event}: {payload}")
+        if event not in ('put', 'patch'):
+            return
+
+        message = json.loads(payload)
+        keys = [key for key in message.get('path', '/').split('/') if key]
+        with self._lock:
+            if event == 'put':
+                self._put(keys, message.get('data'))
+            else:
+                for child, value in (message.get('data') or {}).items():
+                    self._put(keys + [key for key in child.split('/') if key], value)
+
+        # The first put of a (re)connected stream is a full resync
+        if event == 'put' and not keys:
+            self._ready.set()
+
+    def _put(self, keys, value):
+        """Set (or delete, when value is None) the value at keys in the local copy"""
+        if not keys:
+            value = value if isinstance(value, dict) else {}
+            self._data = {key: self._pack(key, child) for key, child in value.items()}
+            return
+
+        if len(keys) == 1:
+            if value is None:
+                self._data.pop(keys[0], None)
+            else:
+                self._data[keys[0]] = self._pack(keys[0], value)
+            return
+
+        # A change inside one child: edit a plain copy of it, then store it packed again
+        child = self._unpack(self._data.get(keys[0]))
+        if not isinstance(child, dict):
+            if value is None:
+                return
+            child = {}
+        self._put_nested(child, keys[1:], value)
+        if child:
+            self._data[keys[0]] = self._pack(keys[0], child)
+        else:
+            # Firebase drops nodes left without children
+            self._data.pop(keys[0], None)
+
+    @staticmethod
+    def _put_nested(node, keys, value):
+        """Set (or delete) the value at keys inside a plain dict"""
+        for key in keys[:-1]:
+            child = node.get(key)
+            if not isinstance(child, dict):
+                if value is None:
+                    return
+                child = node[key] = {}
+            node = child
+
+        if value is None:
+            node.pop(keys[-1], None)
+        else:
+            node[keys[-1]] = value
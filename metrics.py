@@ -0,0 +1,291 @@
+"""
+Per-route accounting of Firebase calls, emails and request latency.
+
+Counters and latency histograms are kept in process and rendered in the
+Prometheus text format by ``render()`` (served at ``/metrics``). Every
+Firebase round trip is attributed to the Flask route (endpoint) that caused
+it and to the outermost storage method that issued it, so expensive routes
+such as ``dashboard`` can be found from a single scrape. Work done outside a
+request (outbox workers, sweepers) is labelled ``background``.
+
+Each gunicorn worker keeps its own registry; Prometheus sums them when every
+worker is scraped, or per-worker numbers can be read as-is.
+"""
+
+import contextvars
+import functools
+import hmac
+import inspect
+import os
+import threading
+import time
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Add Server-Timing / X-DB-Calls headers with the DB cost of each response
+DEBUG_HEADERS = os.environ.get('METRICS_DEBUG_HEADERS', 'true').lower() == 'true'
+
+# Bearer token accepted at /metrics in place of an admin session (for scrapers)
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+BACKGROUND = 'background'
+
+# Label of the catch-all histogram bucket
+INF_LABEL = 'le="+Inf"'
+
+# Endpoint of the Flask request being served, if any
+_route = contextvars.ContextVar('metrics_route', default=BACKGROUND)
+# Outermost storage method running in this context
+_db_method = contextvars.ContextVar('metrics_db_method', default=None)
+# RequestStats of the Flask request being served, if any
+_request_stats = contextvars.ContextVar('metrics_request_stats', default=None)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Counter:
+    """Monotonic counter with a fixed set of label names"""
+
+    kind = 'counter'
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def value(self, *label_values):
+        with self._lock:
+            return self._values.get(label_values, 0)
+
+    def samples(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        for label_values, value in values:
+            yield f'{self.name}{_format_labels(self.labels, label_values)} {value:g}'
+
+
+class Histogram:
+    """Cumulative latency histogram with a fixed set of label names"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        # label values -> [per-bucket counts..., +Inf count, sum]
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, seconds, *label_values):
+        with self._lock:
+            entry = self._values.get(label_values)
+            if entry is None:
+                entry = self._values[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+            for position, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    entry[position] += 1
+            entry[-2] += 1
+            entry[-1] += seconds
+
+    def count(self, *label_values):
+        with self._lock:
+            entry = self._values.get(label_values)
+            return entry[-2] if entry else 0
+
+    def samples(self):
+        with self._lock:
+            values = sorted((key, list(entry)) for key, entry in self._values.items())
+        for label_values, entry in values:
+            for bound, count in zip(self.buckets, entry):
+                labels = _format_labels(self.labels, label_values, f'le="{bound:g}"')
+                yield f'{self.name}_bucket{labels} {count}'
+            yield f'{self.name}_bucket{_format_labels(self.labels, label_values, INF_LABEL)} {entry[-2]}'
+            yield f'{self.name}_sum{_format_labels(self.labels, label_values)} {entry[-1]:.6f}'
+            yield f'{self.name}_count{_format_labels(self.labels, label_values)} {entry[-2]}'
+
+
+class RequestStats:
+    """Firebase cost of one Flask request, shared with the threads it fans out to"""
+
+    def __init__(self):
+        self.db_calls = 0
+        self.db_seconds = 0.0
+        self.db_bytes = 0
+        self._lock = threading.Lock()
+
+    def add(self, seconds, size):
+        with self._lock:
+            self.db_calls += 1
+            self.db_seconds += seconds
+            self.db_bytes += size
+
+
+http_requests = Counter('http_requests_total', 'Flask requests handled', ('route', 'method', 'status'))
+http_latency = Histogram('http_request_duration_seconds', 'Flask request latency', ('route', 'method'))
+http_db_calls = Counter('http_request_firebase_calls_total', 'Firebase round trips made while serving a route',
+                        ('route',))
+firebase_requests = Counter('firebase_requests_total', 'Firebase REST round trips',
+                            ('route', 'db_method', 'verb', 'status'))
+firebase_latency = Histogram('firebase_request_duration_seconds', 'Firebase REST round-trip latency',
+                             ('route', 'db_method', 'verb'))
+firebase_bytes = Counter('firebase_bytes_total', 'Bytes sent to and received from Firebase',
+                         ('route', 'db_method', 'direction'))
+db_method_calls = Counter('db_method_calls_total', 'Storage method calls', ('route', 'db_method'))
+db_method_latency = Histogram('db_method_duration_seconds', 'Storage method latency', ('db_method',))
+firebase_retries = Counter('firebase_retries_total', 'Firebase requests retried after a failure', ('verb',))
+firebase_rejections = Counter('firebase_breaker_rejections_total',
+                              'Firebase requests failed fast by the open circuit breaker', ('verb',))
+firebase_coalesced = Counter('firebase_coalesced_reads_total',
+                             'Firebase GETs by top-level node; followers shared a leader request',
+                             ('node', 'role'))
+counter_write_failures = Counter('firebase_counter_write_failures_total',
+                                 'Writes whose /stats counter update failed, leaving the counters to reconcile',
+                                 ('db_method',))
+emails_sent = Counter('emails_total', 'Emails handed to the SMTP relay', ('mode', 'outcome'))
+email_latency = Histogram('email_send_duration_seconds', 'SMTP send latency per email', ('mode',))
+
+REGISTRY = [
+    http_requests, http_latency, http_db_calls,
+    firebase_requests, firebase_latency, firebase_bytes, firebase_retries, firebase_rejections,
+    firebase_coalesced, counter_write_failures,
+    db_method_calls, db_method_latency,
+    emails_sent, email_latency,
+]
+
+
+def render():
+    """All metrics in the Prometheus text exposition format"""
+    lines = []
+    for metric in REGISTRY:
+        lines.append(f'# HELP {metric.name} {metric.help_text}')
+        lines.append(f'# TYPE {metric.name} {metric.kind}')
+        lines.extend(metric.samples())
+    return '\n'.join(lines) + '\n'
+
+
+def record_firebase_call(verb, status, seconds, bytes_out, bytes_in):
+    """Account one Firebase round trip to the current route and storage method"""
+    route = _route.get()
+    db_method = _db_method.get() or 'unknown'
+    firebase_requests.inc(route, db_method, verb, status)
+    firebase_latency.observe(seconds, route, db_method, verb)
+    firebase_bytes.inc(route, db_method, 'out', amount=bytes_out)
+    firebase_bytes.inc(route, db_method, 'in', amount=bytes_in)
+    stats = _request_stats.get()
+    if stats is not None:
+        stats.add(seconds, bytes_out + bytes_in)
+
+
+def record_email(mode, success, seconds):
+    """Account one email send attempt"""
+    emails_sent.inc(mode, 'sent' if success else 'failed')
+    email_latency.observe(seconds, mode)
+
+
+def instrument_methods(cls):
+    """Class decorator: time every public method and tag Firebase calls made inside it.
+
+    Only the outermost storage method is recorded, so a method built on
+    other public methods is counted once, together with all of its calls.
+    """
+    for name in dir(cls):
+        # Plain functions only - static methods and properties are left alone
+        if not name.startswith('_') and inspect.isfunction(inspect.getattr_static(cls, name)):
+            setattr(cls, name, _timed_method(name, getattr(cls, name)))
+    return cls
+
+
+def _timed_method(name, method):
+    if getattr(method, '_metrics_wrapped', False):
+        return method
+
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        if _db_method.get() is not None:
+            return method(*args, **kwargs)
+        token = _db_method.set(name)
+        started = time.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            db_method_calls.inc(_route.get(), name)
+            db_method_latency.observe(time.perf_counter() - started, name)
+            _db_method.reset(token)
+
+    wrapper._metrics_wrapped = True
+    return wrapper
+
+
+def propagate_context(fn):
+    """Wrap fn so calls on pool threads keep the caller's route and storage method"""
+    context = contextvars.copy_context()
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        return context.copy().run(fn, *args, **kwargs)
+    return wrapper
+
+
+def token_authorized(header):
+    """True if an Authorization header carries the configured scrape token"""
+    if not METRICS_TOKEN or not header or not header.startswith('Bearer '):
+        return False
+    return hmac.compare_digest(header[len('Bearer '):].encode(), METRICS_TOKEN.encode())
+
+
+def init_app(app):
+    """Instrument the Flask request lifecycle; register before other before_request hooks"""
+    from flask import g, request
+
+    @app.before_request
+    def start_request_metrics():
+        g._metrics_started = time.perf_counter()
+        _route.set(request.endpoint or 'unmatched')
+        _request_stats.set(RequestStats())
+
+    @app.after_request
+    def finish_request_metrics(response):
+        stats = _finish_request(g, request, response.status_code)
+        if DEBUG_HEADERS and stats is not None:
+            response.headers['X-DB-Calls'] = str(stats.db_calls)
+            response.headers['Server-Timing'] = f'db;dur={stats.db_seconds * 1000:.1f};desc="{stats.db_calls} calls"'
+        return response
+
+    @app.teardown_request
+    def reset_request_metrics(error=None):
+        # Requests that raised never reached after_request
+        _finish_request(g, request, 500)
+        _route.set(BACKGROUND)
+        _request_stats.set(None)
+
+
+def _finish_request(g, request, status):
+    """Record a finished request once and return its RequestStats"""
+    started = g.pop('_metrics_started', None)
+    if started is None:
+        return None
+    route = _route.get()
+    http_requests.inc(route, request.method, status)
+    http_latency.observe(time.perf_counter() - started, route, request.method)
+    stats = _request_stats.get()
+    if stats is not None:
+        http_db_calls.inc(route, amount=stats.db_calls)
+    return stats
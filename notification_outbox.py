@@ -0,0 +1,289 @@
+"""
+Durable outbox for outgoing notifications (emails and SMS).
+
+Routes enqueue a job and return immediately; a small pool of worker threads
+drains the queue in the background. Jobs are persisted in a local SQLite file
+so they survive restarts and can be shared by every gunicorn worker on the
+host. Failed jobs are retried with exponential backoff and moved to a
+dead-letter state after too many attempts.
+"""
+
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+from notification_service import notification_service
+from private_files import create_private
+
+# Payloads hold live reset links and codes, so the file is 0600 in a 0700 directory.
+# Installs that already have ./notification_outbox.db keep using it (tightened to 0600).
+_LEGACY_DB_PATH = 'notification_outbox.db'
+OUTBOX_DB_PATH = os.environ.get('OUTBOX_DB_PATH') or (
+    _LEGACY_DB_PATH if os.path.exists(_LEGACY_DB_PATH) else os.path.join('instance', 'notification_outbox.db')
+)
+OUTBOX_WORKERS = int(os.environ.get('OUTBOX_WORKERS', '2'))
+OUTBOX_MAX_ATTEMPTS = int(os.environ.get('OUTBOX_MAX_ATTEMPTS', '5'))
+OUTBOX_BACKOFF_BASE = float(os.environ.get('OUTBOX_BACKOFF_BASE', '5'))
+OUTBOX_BACKOFF_MAX = float(os.environ.get('OUTBOX_BACKOFF_MAX', '900'))
+# A job claimed longer than this ago is assumed lost (worker crashed) and retried
+OUTBOX_LEASE_SECONDS = float(os.environ.get('OUTBOX_LEASE_SECONDS', '300'))
+OUTBOX_POLL_INTERVAL = float(os.environ.get('OUTBOX_POLL_INTERVAL', '2'))
+# Delivered jobs are kept this long (seconds) for the status page, then purged
+OUTBOX_SENT_RETENTION = float(os.environ.get('OUTBOX_SENT_RETENTION', str(7 * 24 * 3600)))
+# Seconds between purges of delivered jobs, run by an idle worker (0 disables)
+OUTBOX_PURGE_INTERVAL = float(os.environ.get('OUTBOX_PURGE_INTERVAL', '3600'))
+# Dead-lettered payloads are erased after this many seconds; the reset links and codes they
+# carry are dead by then (reset tokens last 1 hour, verification codes 15 minutes)
+OUTBOX_DEAD_PAYLOAD_TTL = float(os.environ.get('OUTBOX_DEAD_PAYLOAD_TTL', '3600'))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox_jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL,
+    claimed_at REAL,
+    last_error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_outbox_due ON outbox_jobs (status, next_attempt_at);
+"""
+
+
+class NotificationOutbox:
+    """SQLite-backed job queue drained by a bounded pool of worker threads"""
+
+    def __init__(self, service, db_path=OUTBOX_DB_PATH, workers=OUTBOX_WORKERS,
+                 max_attempts=OUTBOX_MAX_ATTEMPTS):
+        self.service = service
+        self.db_path = db_path
+        self.workers = workers
+        self.max_attempts = max_attempts
+        # Job kind -> NotificationService method that performs the send
+        self.handlers = {
+            'email': service.send_email,
+            'verification_email': service.send_verification_email,
+            'password_reset_email': service.send_password_reset_email,
+            'password_reset_sms': service.send_password_reset_sms
+        }
+
+        self._local = threading.local()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._threads = []
+        self._pid = None
+        self._start_lock = threading.Lock()
+        self._purged_at = 0.0
+
+        create_private(db_path)
+        conn = self._connect()
+        conn.executescript(SCHEMA)
+        conn.close()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _db(self):
+        """Per-thread connection (sqlite3 connections are not shareable)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or getattr(self._local, 'pid', None) != os.getpid():
+            conn = self._local.conn = self._connect()
+            self._local.pid = os.getpid()
+        return conn
+
+    # Producer API
+    def enqueue(self, kind, **kwargs):
+        """Persist a notification job and wake a worker. Returns the job id."""
+        if kind not in self.handlers:
+            raise ValueError(f"Unknown notification kind: {kind}")
+        now = time.time()
+        try:
+            cursor = self._db().execute(
+                'INSERT INTO outbox_jobs (kind, payload, next_attempt_at, created_at, updated_at) '
+                'VALUES (?, ?, ?, ?, ?)',
+                (kind, json.dumps(kwargs), now, now, now)
+            )
+        except sqlite3.Error as e:
+            print(f"❌ Failed to enqueue {kind} notification: {e}")
+            return None
+        self.start()
+        self._wakeup.set()
+        return cursor.lastrowid
+
+    # Workers
+    def init_app(self, app):
+        """Start the workers with the app so jobs left from before a restart are delivered.
+
+        The before_request hook restarts them in gunicorn workers forked
+        after the app was imported (threads do not survive a fork).
+        """
+        self.start()
+        app.before_request(self.start)
+
+    def start(self):
+        """Start the worker threads for this process (again after a fork)"""
+        if self._pid == os.getpid() and self._threads:
+            return
+        with self._start_lock:
+            if self._pid == os.getpid() and self._threads:
+                return
+            self._pid = os.getpid()
+            self._stopped.clear()
+            self._threads = []
+            for number in range(self.workers):
+                thread = threading.Thread(target=self._worker, name=f'outbox-worker-{number}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def stop(self, timeout=5):
+        """Stop the worker threads after their current job"""
+        self._stopped.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def _worker(self):
+        while not self._stopped.is_set():
+            try:
+                job = self._claim_next()
+            except sqlite3.Error as e:
+                print(f"⚠️ Outbox claim failed: {e}")
+                job = None
+            if job is None:
+                self._purge_if_due()
+                self._wakeup.wait(OUTBOX_POLL_INTERVAL)
+                self._wakeup.clear()
+                continue
+            self._run_job(job)
+
+    def _purge_if_due(self):
+        now = time.time()
+        if OUTBOX_PURGE_INTERVAL <= 0 or now - self._purged_at < OUTBOX_PURGE_INTERVAL:
+            return
+        self._purged_at = now
+        try:
+            purged = self.purge_sent(OUTBOX_SENT_RETENTION)
+            erased = self.erase_dead_payloads(OUTBOX_DEAD_PAYLOAD_TTL)
+        except sqlite3.Error as e:
+            print(f"⚠️ Outbox purge failed: {e}")
+            return
+        if purged:
+            print(f"🧹 Purged {purged} delivered notification jobs")
+        if erased:
+            print(f"🧹 Erased the payloads of {erased} expired dead-lettered jobs")
+
+    def _claim_next(self):
+        """Atomically claim the oldest due job (safe across processes)"""
+        now = time.time()
+        conn = self._db()
+        while True:
+            row = conn.execute(
+                "SELECT id FROM outbox_jobs WHERE "
+                "(status = 'pending' AND next_attempt_at <= ?) OR "
+                "(status = 'in_progress' AND claimed_at < ?) "
+                "ORDER BY next_attempt_at LIMIT 1",
+                (now, now - OUTBOX_LEASE_SECONDS)
+            ).fetchone()
+            if row is None:
+                return None
+            claimed = conn.execute(
+                "UPDATE outbox_jobs SET status = 'in_progress', claimed_at = ?, updated_at = ? "
+                "WHERE id = ? AND (status = 'pending' OR (status = 'in_progress' AND claimed_at < ?))",
+                (now, now, row['id'], now - OUTBOX_LEASE_SECONDS)
+            ).rowcount
+            if claimed:
+                return conn.execute('SELECT * FROM outbox_jobs WHERE id = ?', (row['id'],)).fetchone()
+            # Another worker won the race - try the next job
+
+    def _run_job(self, job):
+        attempts = job['attempts'] + 1
+        try:
+            success, message = self.handlers[job['kind']](**json.loads(job['payload']))
+        except Exception as e:
+            success, message = False, f"{type(e).__name__}: {e}"
+
+        now = time.time()
+        conn = self._db()
+        if success:
+            # Drop the payload once delivered - it holds codes and reset links
+            conn.execute(
+                "UPDATE outbox_jobs SET status = 'sent', attempts = ?, payload = '{}', last_error = NULL, "
+                "updated_at = ? WHERE id = ?",
+                (attempts, now, job['id'])
+            )
+        elif attempts >= self.max_attempts:
+            print(f"❌ Outbox job {job['id']} ({job['kind']}) dead-lettered: {message}")
+            conn.execute(
+                "UPDATE outbox_jobs SET status = 'dead', attempts = ?, last_error = ?, updated_at = ? WHERE id = ?",
+                (attempts, message, now, job['id'])
+            )
+        else:
+            delay = min(OUTBOX_BACKOFF_BASE * 2 ** (attempts - 1), OUTBOX_BACKOFF_MAX)
+            delay *= random.uniform(0.8, 1.2)
+            conn.execute(
+                "UPDATE outbox_jobs SET status = 'pending', attempts = ?, last_error = ?, "
+                "next_attempt_at = ?, updated_at = ? WHERE id = ?",
+                (attempts, message, now + delay, now, job['id'])
+            )
+
+    # Admin API
+    def get_queue_stats(self):
+        """Job counts by status, plus the age of the oldest pending job in seconds"""
+        conn = self._db()
+        counts = {status: 0 for status in ('pending', 'in_progress', 'sent', 'dead')}
+        for row in conn.execute('SELECT status, COUNT(*) AS count FROM outbox_jobs GROUP BY status'):
+            counts[row['status']] = row['count']
+        oldest = conn.execute("SELECT MIN(created_at) FROM outbox_jobs WHERE status = 'pending'").fetchone()[0]
+        counts['oldest_pending_age'] = round(time.time() - oldest, 1) if oldest else 0
+        return counts
+
+    def get_dead_letters(self, limit=50):
+        """Most recent jobs that exhausted their retries"""
+        rows = self._db().execute(
+            "SELECT id, kind, attempts, last_error, created_at, updated_at FROM outbox_jobs "
+            "WHERE status = 'dead' ORDER BY updated_at DESC LIMIT ?",
+            (limit,)
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    def requeue(self, job_id):
+        """Move a dead-lettered job back to the queue with a fresh retry budget (unless its payload was erased)"""
+        now = time.time()
+        updated = self._db().execute(
+            "UPDATE outbox_jobs SET status = 'pending', attempts = 0, next_attempt_at = ?, updated_at = ? "
+            "WHERE id = ? AND status = 'dead' AND payload != '{}'",
+            (now, now, job_id)
+        ).rowcount
+        if updated:
+            self.start()
+            self._wakeup.set()
+        return bool(updated)
+
+    def erase_dead_payloads(self, older_than_seconds=OUTBOX_DEAD_PAYLOAD_TTL):
+        """Blank the payloads of dead-lettered jobs created longer ago than the given age"""
+        cutoff = time.time() - older_than_seconds
+        return self._db().execute(
+            "UPDATE outbox_jobs SET payload = '{}' WHERE status = 'dead' AND payload != '{}' AND created_at < ?",
+            (cutoff,)
+        ).rowcount
+
+    def purge_sent(self, older_than_seconds=OUTBOX_SENT_RETENTION):
+        """Delete delivered jobs older than the given age"""
+        cutoff = time.time() - older_than_seconds
+        return self._db().execute(
+            "DELETE FROM outbox_jobs WHERE status = 'sent' AND updated_at < ?", (cutoff,)
+        ).rowcount
+
+
+# Global instance
+notification_outbox = NotificationOutbox(notification_service)
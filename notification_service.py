@@ -1,11 +1,130 @@
 import smtplib
 import os
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
+import threading
+import time
+import base64
+import secrets
+from email.header import Header
 from email.mime.base import MIMEBase
 from email import encoders
 import requests
 import json
+import metrics
+from email_templates import EmailTemplates
+
+# Fixed MIME headers for the bodies of multipart/alternative emails
+TEXT_PART_HEADERS = 'Content-Type: text/plain; charset="utf-8"\nMIME-Version: 1.0\nContent-Transfer-Encoding: base64\n\n'
+HTML_PART_HEADERS = 'Content-Type: text/html; charset="utf-8"\nMIME-Version: 1.0\nContent-Transfer-Encoding: base64\n\n'
+
+
+class SMTPSession:
+    """An authenticated SMTP connection plus usage bookkeeping"""
+    
+    def __init__(self, smtp):
+        self.smtp = smtp
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+        self.messages_sent = 0
+
+
+class SMTPSessionPool:
+    """Keeps authenticated SMTP connections alive and reuses them between messages"""
+    
+    def __init__(self, server, port, user, password, max_sessions=None,
+                 max_messages_per_session=None, idle_timeout=None):
+        self.server = server
+        self.port = port
+        self.user = user
+        self.password = password
+        self.max_sessions = max_sessions or int(os.environ.get('SMTP_POOL_SIZE', '2'))
+        # Recycle a connection after this many messages (relays often cap per-session sends)
+        self.max_messages_per_session = max_messages_per_session or int(os.environ.get('SMTP_MAX_MESSAGES_PER_SESSION', '100'))
+        # Drop idle connections before the relay times them out
+        self.idle_timeout = idle_timeout or float(os.environ.get('SMTP_IDLE_TIMEOUT', '60'))
+        
+        self._idle = []
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.max_sessions)
+        self.connections_opened = 0
+    
+    def _open(self):
+        """Connect, secure and authenticate a new SMTP session"""
+        print(f"🔗 Connecting to SMTP server {self.server}:{self.port}...")
+        if self.port == 465:
+            # Use SSL for port 465
+            smtp = smtplib.SMTP_SSL(self.server, self.port, timeout=30)
+        else:
+            # Use STARTTLS for port 587
+            smtp = smtplib.SMTP(self.server, self.port, timeout=30)
+            smtp.starttls()
+        try:
+            smtp.login(self.user, self.password)
+        except smtplib.SMTPException:
+            self._close(smtp)
+            raise
+        self.connections_opened += 1
+        print("✅ SMTP session authenticated")
+        return SMTPSession(smtp)
+    
+    @staticmethod
+    def _close(smtp):
+        try:
+            smtp.quit()
+        except Exception:
+            try:
+                smtp.close()
+            except Exception:
+                pass
+    
+    def acquire(self):
+        """Take a live session from the pool, opening one if none is idle"""
+        self._slots.acquire()
+        try:
+            while True:
+                with self._lock:
+                    session = self._idle.pop() if self._idle else None
+                if session is None:
+                    return self._open()
+                if time.monotonic() - session.last_used < self.idle_timeout:
+                    return session
+                self._close(session.smtp)
+        except Exception:
+            self._slots.release()
+            raise
+    
+    def release(self, session, broken=False):
+        """Return a session to the pool, closing it if broken or worn out"""
+        try:
+            if broken or session.messages_sent >= self.max_messages_per_session:
+                self._close(session.smtp)
+            else:
+                session.last_used = time.monotonic()
+                with self._lock:
+                    self._idle.append(session)
+        finally:
+            self._slots.release()
+    
+    def reconnect(self, session):
+        """Replace a dropped connection in place, keeping the session's pool slot"""
+        self._close(session.smtp)
+        fresh = self._open()
+        session.smtp = fresh.smtp
+        session.created_at = fresh.created_at
+        session.messages_sent = 0
+    
+    def send(self, session, from_email, to_email, message):
+        """Send one message over a session"""
+        session.smtp.sendmail(from_email, to_email, message)
+        session.messages_sent += 1
+        session.last_used = time.monotonic()
+    
+    def close_all(self):
+        """Close every idle session"""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for session in idle:
+            self._close(session.smtp)
+
 
 class NotificationService:
     def __init__(self):
@@ -17,6 +136,12 @@ class NotificationService:
         # Set a proper from email address
         self.from_email = os.environ.get('FROM_EMAIL', 'noreply@ktu.edu.gh')
         
+        # Reused, authenticated SMTP connections
+        self.smtp_pool = SMTPSessionPool(self.smtp_server, self.smtp_port, self.email_user, self.email_password)
+        
+        # Email bodies, compiled once from templates/email
+        self.templates = EmailTemplates()
+        
         # Import Firebase DB for dynamic settings
         from firebase_simple import simple_firebase_db
         self.firebase_db = simple_firebase_db
@@ -24,61 +149,68 @@ class NotificationService:
         # SMS configuration (using a simple SMS API - you can replace with your preferred provider)
         self.sms_api_key = os.environ.get('SMS_API_KEY', '')
         self.sms_api_url = os.environ.get('SMS_API_URL', 'https://api.sms-provider.com/send')
+    
+    @staticmethod
+    def _header(value):
+        """Header value safe for the wire: single line, RFC 2047 encoded if not ASCII"""
+        value = ' '.join(str(value).splitlines())
+        return value if value.isascii() else Header(value, 'utf-8').encode()
+    
+    def _build_email(self, to_email, subject, html_content, text_content=None):
+        """Assemble the multipart/alternative message and return it as a string.
+        
+        Part headers never change, so the message is joined from fixed chunks and
+        base64 bodies rather than run through email.generator on every send.
+        """
+        boundary = f"==============={secrets.token_hex(12)}=="
+        chunks = [
+            f'Content-Type: multipart/alternative; boundary="{boundary}"\n'
+            f"MIME-Version: 1.0\n"
+            f"From: KTU Student Portal <{self._header(self.from_email)}>\n"
+            f"To: {self._header(to_email)}\n"
+            f"Subject: {self._header(subject)}\n\n"
+        ]
         
+        # Add text part if provided
+        if text_content:
+            chunks += [f"--{boundary}\n", TEXT_PART_HEADERS, base64.encodebytes(text_content.encode('utf-8')).decode('ascii')]
+        
+        # Add HTML part
+        chunks += [f"--{boundary}\n", HTML_PART_HEADERS, base64.encodebytes(html_content.encode('utf-8')).decode('ascii')]
+        chunks.append(f"--{boundary}--\n")
+        return ''.join(chunks)
+    
+    def _deliver(self, session, to_email, message):
+        """Send over a pooled session, reconnecting once if the relay dropped it"""
+        try:
+            self.smtp_pool.send(session, self.from_email, to_email, message)
+        except smtplib.SMTPServerDisconnected:
+            print("🔁 SMTP session dropped, reconnecting...")
+            self.smtp_pool.reconnect(session)
+            self.smtp_pool.send(session, self.from_email, to_email, message)
+    
     def send_email(self, to_email, subject, html_content, text_content=None):
-        """Send email using SMTP"""
+        """Send email using a pooled SMTP session"""
         print(f"🔄 Attempting to send email to: {to_email}")
         print(f"📧 Using SMTP: {self.smtp_server}:{self.smtp_port}")
-        print(f"👤 Auth user: {self.email_user}")
-        print(f"📨 From: {self.from_email}")
         
+        session = None
+        sent = False
+        started = time.perf_counter()
         try:
-            # Create message
-            msg = MIMEMultipart('alternative')
-            msg['From'] = f"KTU Student Portal <{self.from_email}>"
-            msg['To'] = to_email
-            msg['Subject'] = subject
-            
-            # Add text part if provided
-            if text_content:
-                text_part = MIMEText(text_content, 'plain')
-                msg.attach(text_part)
-            
-            # Add HTML part
-            html_part = MIMEText(html_content, 'html')
-            msg.attach(html_part)
-            
-            print("📝 Message created successfully")
-            
-            # Connect to server and send email with improved error handling
-            print("🔗 Connecting to SMTP server...")
-            if self.smtp_port == 465:
-                # Use SSL for port 465
-                server = smtplib.SMTP_SSL(self.smtp_server, self.smtp_port)
-            else:
-                # Use STARTTLS for port 587
-                server = smtplib.SMTP(self.smtp_server, self.smtp_port)
-                server.starttls()
-            
-            print("🔒 Starting TLS and authenticating...")
-            
-            # Try authentication
-            try:
-                server.login(self.email_user, self.email_password)
-                print("✅ Authentication successful")
-            except smtplib.SMTPAuthenticationError as auth_error:
-                print(f"❌ Authentication failed: {auth_error}")
-                server.quit()
-                return False, f"Authentication failed: {str(auth_error)}. Check your app password."
-            
-            print("📤 Sending email...")
-            text = msg.as_string()
-            server.sendmail(self.from_email, to_email, text)
-            server.quit()
+            message = self._build_email(to_email, subject, html_content, text_content)
+            session = self.smtp_pool.acquire()
+            self._deliver(session, to_email, message)
+            self.smtp_pool.release(session)
+            session = None
+            sent = True
             
             print("✅ Email sent successfully!")
             return True, "Email sent successfully"
             
+        except smtplib.SMTPAuthenticationError as auth_error:
+            print(f"❌ Authentication failed: {auth_error}")
+            return False, f"Authentication failed: {str(auth_error)}. Check your app password."
         except smtplib.SMTPException as smtp_error:
             error_msg = f"SMTP Error: {str(smtp_error)}"
             print(f"❌ {error_msg}")
@@ -87,6 +219,57 @@ class NotificationService:
             error_msg = f"Failed to send email: {str(e)}"
             print(f"❌ {error_msg}")
             return False, error_msg
+        finally:
+            if session is not None:
+                self.smtp_pool.release(session, broken=True)
+            metrics.record_email('single', sent, time.perf_counter() - started)
+    
+    def send_bulk(self, messages):
+        """Send many emails over one SMTP session.
+        
+        messages is an iterable of dicts with to_email, subject, html_content and
+        optional text_content. Returns a list of (success, message) per email.
+        """
+        results = []
+        session = None
+        started = time.monotonic()
+        try:
+            for item in messages:
+                to_email = item['to_email']
+                sent_at = time.perf_counter()
+                try:
+                    message = self._build_email(to_email, item['subject'], item['html_content'], item.get('text_content'))
+                    if session is None:
+                        session = self.smtp_pool.acquire()
+                    elif session.messages_sent >= self.smtp_pool.max_messages_per_session:
+                        # Recycle worn-out session
+                        self.smtp_pool.release(session)
+                        session = self.smtp_pool.acquire()
+                    self._deliver(session, to_email, message)
+                    results.append((True, "Email sent successfully"))
+                except smtplib.SMTPRecipientsRefused as refused:
+                    # The session is still usable - only this recipient failed
+                    results.append((False, f"Recipient refused: {refused.recipients}"))
+                except smtplib.SMTPAuthenticationError as auth_error:
+                    results.append((False, f"Authentication failed: {str(auth_error)}. Check your app password."))
+                    if session is not None:
+                        self.smtp_pool.release(session, broken=True)
+                        session = None
+                except (smtplib.SMTPException, OSError) as error:
+                    results.append((False, f"SMTP Error: {str(error)}"))
+                    if session is not None:
+                        self.smtp_pool.release(session, broken=True)
+                        session = None
+                metrics.record_email('bulk', results[-1][0], time.perf_counter() - sent_at)
+        finally:
+            if session is not None:
+                self.smtp_pool.release(session)
+        
+        elapsed = time.monotonic() - started
+        sent = sum(1 for success, _ in results if success)
+        rate = sent / elapsed if elapsed > 0 else 0.0
+        print(f"📤 Bulk send: {sent}/{len(results)} delivered in {elapsed:.1f}s ({rate:.1f} msg/s)")
+        return results
     
     def send_sms(self, phone_number, message):
         """Send SMS using SMS API"""
@@ -119,99 +302,7 @@ class NotificationService:
     def send_password_reset_email(self, to_email, user_name, reset_url):
         """Send password reset email with HTML template"""
         subject = "Password Reset - KTU Student Concern Portal"
-        
-        html_content = f"""
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <meta charset="UTF-8">
-            <meta name="viewport" content="width=device-width, initial-scale=1.0">
-            <title>Password Reset</title>
-            <style>
-                body {{ font-family: Arial, sans-serif; line-height: 1.6; color: #333; }}
-                .container {{ max-width: 600px; margin: 0 auto; padding: 20px; }}
-                .header {{ background-color: #007bff; color: white; padding: 20px; text-align: center; }}
-                .content {{ padding: 30px; background-color: #f8f9fa; }}
-                .button {{ 
-                    display: inline-block; 
-                    padding: 12px 30px; 
-                    background-color: #007bff; 
-                    color: white; 
-                    text-decoration: none; 
-                    border-radius: 5px; 
-                    margin: 20px 0;
-                }}
-                .footer {{ padding: 20px; text-align: center; color: #666; font-size: 12px; }}
-                .warning {{ background-color: #fff3cd; border: 1px solid #ffeaa7; padding: 15px; border-radius: 5px; margin: 20px 0; }}
-            </style>
-        </head>
-        <body>
-            <div class="container">
-                <div class="header">
-                    <h1>🔐 Password Reset Request</h1>
-                    <p>Koforidua Technical University - Student Concern Portal</p>
-                </div>
-                
-                <div class="content">
-                    <h2>Hello {user_name},</h2>
-                    
-                    <p>We received a request to reset your password for your KTU Student Concern Portal account.</p>
-                    
-                    <p>Click the button below to reset your password:</p>
-                    
-                    <div style="text-align: center;">
-                        <a href="{reset_url}" class="button">Reset My Password</a>
-                    </div>
-                    
-                    <div class="warning">
-                        <strong>⚠️ Important:</strong>
-                        <ul>
-                            <li>This link will expire in 1 hour for security reasons</li>
-                            <li>If you didn't request this reset, please ignore this email</li>
-                            <li>Never share this link with anyone</li>
-                        </ul>
-                    </div>
-                    
-                    <p>If the button doesn't work, you can copy and paste this link into your browser:</p>
-                    <p style="word-break: break-all; background-color: #e9ecef; padding: 10px; border-radius: 3px;">
-                        {reset_url}
-                    </p>
-                    
-                    <p>If you need help, contact IT Support at itsupport@ktu.edu.gh</p>
-                    
-                    <p>Best regards,<br>
-                    KTU IT Support Team</p>
-                </div>
-                
-                <div class="footer">
-                    <p>© 2025 Koforidua Technical University<br>
-                    This is an automated message, please do not reply to this email.</p>
-                </div>
-            </div>
-        </body>
-        </html>
-        """
-        
-        text_content = f"""
-        Password Reset - KTU Student Concern Portal
-        
-        Hello {user_name},
-        
-        We received a request to reset your password for your KTU Student Concern Portal account.
-        
-        Please click the following link to reset your password:
-        {reset_url}
-        
-        This link will expire in 1 hour for security reasons.
-        
-        If you didn't request this reset, please ignore this email.
-        
-        If you need help, contact IT Support at itsupport@ktu.edu.gh
-        
-        Best regards,
-        KTU IT Support Team
-        """
-        
+        html_content, text_content = self.templates.render('password_reset', user_name=user_name, reset_url=reset_url)
         return self.send_email(to_email, subject, html_content, text_content)
     
     def send_password_reset_sms(self, phone_number, user_name, reset_url):
@@ -225,96 +316,8 @@ Link expires in 1 hour. If you didn't request this, ignore this message."""
     def send_verification_email(self, to_email, user_name, verification_code):
         """Send email verification code"""
         subject = "Email Verification - KTU Student Portal"
-        
-        html_content = f"""
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <meta charset="UTF-8">
-            <meta name="viewport" content="width=device-width, initial-scale=1.0">
-            <title>Email Verification</title>
-            <style>
-                body {{ font-family: Arial, sans-serif; line-height: 1.6; color: #333; }}
-                .container {{ max-width: 600px; margin: 0 auto; padding: 20px; }}
-                .header {{ background-color: #007bff; color: white; padding: 20px; text-align: center; }}
-                .content {{ padding: 30px; background-color: #f8f9fa; }}
-                .code {{ 
-                    display: inline-block; 
-                    padding: 15px 30px; 
-                    background-color: #28a745; 
-                    color: white; 
-                    font-size: 24px;
-                    font-weight: bold;
-                    letter-spacing: 3px;
-                    border-radius: 5px; 
-                    margin: 20px 0;
-                }}
-                .footer {{ padding: 20px; text-align: center; color: #666; font-size: 12px; }}
-                .warning {{ background-color: #fff3cd; border: 1px solid #ffeaa7; padding: 15px; border-radius: 5px; margin: 20px 0; }}
-            </style>
-        </head>
-        <body>
-            <div class="container">
-                <div class="header">
-                    <h1>📧 Email Verification</h1>
-                    <p>Koforidua Technical University - Student Portal</p>
-                </div>
-                
-                <div class="content">
-                    <h2>Hello {user_name},</h2>
-                    
-                    <p>Thank you for registering with the CS Department Student Portal!</p>
-                    
-                    <p>Please use the verification code below to complete your registration:</p>
-                    
-                    <div style="text-align: center;">
-                        <div class="code">{verification_code}</div>
-                    </div>
-                    
-                    <div class="warning">
-                        <strong>⚠️ Important:</strong>
-                        <ul>
-                            <li>This code will expire in 15 minutes</li>
-                            <li>Enter this code on the verification page</li>
-                            <li>If you didn't create an account, please ignore this email</li>
-                        </ul>
-                    </div>
-                    
-                    <p>If you need help, contact IT Support at itsupport@ktu.edu.gh</p>
-                    
-                    <p>Best regards,<br>
-                    IT Support Team<br>
-                    Koforidua Technical University</p>
-                </div>
-                
-                <div class="footer">
-                    <p>© 2025 Koforidua Technical University<br>
-                    This is an automated message, please do not reply to this email.</p>
-                </div>
-            </div>
-        </body>
-        </html>
-        """
-        
-        text_content = f"""
-        Email Verification - CS Department Portal
-        
-        Hello {user_name},
-        
-        Thank you for registering with the CS Department Student Portal!
-        
-        Please use this verification code to complete your registration:
-        {verification_code}
-        
-        This code will expire in 15 minutes.
-        
-        If you didn't create an account, please ignore this email.
-        
-        Best regards,
-        IT Support Team
-        Koforidua Technical University
-        """
-        
+        html_content, text_content = self.templates.render('verification', user_name=user_name,
+                                                           verification_code=verification_code)
         return self.send_email(to_email, subject, html_content, text_content)
 
 # Global instance
@@ -0,0 +1,26 @@
+"""
+Local files readable only by the OS user running the app.
+
+The shared cache and the notification outbox keep user data in SQLite files
+next to the app. create_private makes their directory 0700 and the file 0600
+before SQLite opens it; SQLite then gives the -wal and -shm files the same
+mode as the database file.
+"""
+
+import os
+
+
+def create_private(path, check_owner=False):
+    """Create path (and its directory) for this OS user only; existing files are tightened to 0600.
+
+    With check_owner, refuse a directory owned by another user (e.g. one
+    planted in a shared temp dir).
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    if check_owner and os.stat(directory).st_uid != os.getuid():
+        raise PermissionError(f"Directory {directory} is owned by another user")
+    os.close(os.open(path, os.O_RDWR | os.O_CREAT, 0o600))
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(path + suffix):
+            os.chmod(path + suffix, 0o600)
@@ -0,0 +1,140 @@
+"""
+Compact in-memory forms of user and issue records.
+
+Long-lived copies (the per-process user cache, the issue mirror) hold
+thousands of records, and a plain dict per record costs a hash table plus a
+key and value object for each of the ~25 profile fields. A CompactRecord
+keeps only the fields listings need in __slots__, interns values that repeat
+across records (roles, statuses, categories), and packs every other field
+into one JSON bytes blob that is decoded only when one of those fields is
+read. The shared SQLite cache stores records as to_row() lists, so reading
+one back rebuilds the record without decoding its cold fields either.
+
+Records are read-only mappings: record['username'], record.get('phone') and
+dict(record) all work, and Jinja templates can use record.username. expand()
+turns a record (or a plain dict) into a mutable dict, decoding the cold
+fields once. Firebase never stores nulls, so None in a slot means the field
+is absent.
+"""
+
+import json
+import sys
+
+
+class CompactRecord:
+    """Read-only mapping with hot fields in slots and cold fields packed as JSON"""
+
+    __slots__ = ('id', '_cold')
+
+    # Fields kept as attributes; everything else is packed into _cold
+    HOT = ()
+    _HOT_FIELDS = frozenset()
+    # Hot fields whose few distinct values are shared between records
+    INTERNED = ()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._HOT_FIELDS = frozenset(cls.HOT)
+
+    @classmethod
+    def from_dict(cls, data, record_id=None):
+        """Pack a stored record (record_id defaults to data['id'])"""
+        record = cls.__new__(cls)
+        record.id = record_id if record_id is not None else data.get('id')
+        for field in cls.HOT:
+            value = data.get(field)
+            if field in cls.INTERNED and type(value) is str:
+                value = sys.intern(value)
+            setattr(record, field, value)
+        cold = {key: value for key, value in data.items() if key not in cls._HOT_FIELDS and key != 'id'}
+        record._cold = json.dumps(cold, separators=(',', ':')).encode('utf-8') if cold else None
+        return record
+
+    def to_row(self):
+        """A JSON-ready list: id, the hot fields in HOT order, then the cold fields still packed"""
+        cold = self._cold.decode('utf-8') if self._cold else None
+        return [self.id, *(getattr(self, field) for field in self.HOT), cold]
+
+    @classmethod
+    def from_row(cls, row):
+        """Rebuild a record from to_row() without decoding its cold fields; None if HOT has changed"""
+        if not isinstance(row, list) or len(row) != len(cls.HOT) + 2:
+            return None
+        record = cls.__new__(cls)
+        record.id = row[0]
+        for field, value in zip(cls.HOT, row[1:-1]):
+            if field in cls.INTERNED and type(value) is str:
+                value = sys.intern(value)
+            setattr(record, field, value)
+        record._cold = row[-1].encode('utf-8') if row[-1] else None
+        return record
+
+    def _cold_fields(self):
+        return json.loads(self._cold) if self._cold else {}
+
+    def to_dict(self, with_id=False):
+        """A fresh dict of the stored fields, plus 'id' if with_id"""
+        data = {'id': self.id} if with_id and self.id is not None else {}
+        data.update((field, getattr(self, field)) for field in self.HOT if getattr(self, field) is not None)
+        data.update(self._cold_fields())
+        return data
+
+    # Mapping protocol
+    def keys(self):
+        keys = ['id'] if self.id is not None else []
+        keys += [field for field in self.HOT if getattr(self, field) is not None]
+        return keys + list(self._cold_fields())
+
+    def __getitem__(self, key):
+        if key == 'id' and self.id is not None:
+            return self.id
+        if key in self._HOT_FIELDS:
+            value = getattr(self, key)
+            if value is None:
+                raise KeyError(key)
+            return value
+        return self._cold_fields()[key]
+
+    def get(self, key, default=None):
+        if key in self._HOT_FIELDS:
+            value = getattr(self, key)
+            return default if value is None else value
+        if key == 'id' and self.id is not None:
+            return self.id
+        return self._cold_fields().get(key, default)
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+    def __repr__(self):
+        return f'{type(self).__name__}(id={self.id!r})'
+
+
+class UserRecord(CompactRecord):
+    """A user as listings and joins see it; password hash and contact details stay packed"""
+
+    HOT = ('username', 'role', 'email', 'first_name', 'last_name', 'student_id',
+           'level', 'department', 'created_at')
+    INTERNED = ('role', 'level', 'department')
+    __slots__ = HOT
+
+
+class IssueRecord(CompactRecord):
+    """An issue as dashboards see it; message and response stay packed"""
+
+    HOT = ('student_id', 'subject', 'category', 'status', 'created_at', 'updated_at')
+    INTERNED = ('student_id', 'category', 'status')
+    __slots__ = HOT
+
+
+def expand(value):
+    """A mutable dict copy of a record or plain dict, including 'id' if known"""
+    if isinstance(value, CompactRecord):
+        return value.to_dict(with_id=True)
+    return dict(value)
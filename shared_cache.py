@@ -0,0 +1,175 @@
+"""
+Host-wide cache shared by every gunicorn worker through a SQLite WAL file.
+
+SharedCache has the same interface as ttl_cache.TTLCache, so SimpleFirebaseDB
+can use either. Values are stored as JSON with an expiry time, kept for an
+extra stale_ttl for get_stale(), and the least recently read entries of a
+namespace are evicted once it grows past maxsize. In WAL mode readers never
+wait for writers, and reads only write back their access time once per
+TOUCH_INTERVAL, so the common read path is a single indexed SELECT.
+
+With a record_type (e.g. records.UserRecord), values are stored as the
+record's to_row() list and read back as records, the same compact form
+TTLCache keeps with pack=record_type.from_dict.
+
+One worker warming the cache warms it for all of them, and an invalidate()
+deletes the shared row, so every worker sees the change on its next read.
+"""
+
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from private_files import create_private
+
+# Default location is private to this OS user: a 0700 directory under XDG_RUNTIME_DIR (or the temp dir)
+_RUNTIME_DIR = os.path.join(os.environ.get('XDG_RUNTIME_DIR') or tempfile.gettempdir(), f'portal-cache-{os.getuid()}')
+SHARED_CACHE_PATH = os.environ.get('SHARED_CACHE_PATH', os.path.join(_RUNTIME_DIR, 'shared_cache.db'))
+
+# Seconds between access-time updates of one entry (keeps reads read-only)
+TOUCH_INTERVAL = 10.0
+
+# Writes between eviction passes
+EVICT_EVERY = 200
+
+_MISSING = object()
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS cache_entries (
+    namespace TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    expires_at REAL NOT NULL,
+    stale_until REAL NOT NULL,
+    accessed_at REAL NOT NULL,
+    PRIMARY KEY (namespace, key)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_cache_lru ON cache_entries (namespace, accessed_at);
+"""
+
+
+class SharedCache:
+    """SQLite-backed TTL/LRU cache for one namespace, shared across processes"""
+
+    def __init__(self, namespace, ttl, maxsize=10000, stale_ttl=0, db_path=SHARED_CACHE_PATH, record_type=None):
+        self.namespace = namespace
+        # CompactRecord subclass values are stored as and returned as; None keeps plain JSON
+        self.record_type = record_type
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.stale_ttl = stale_ttl
+        self.db_path = db_path
+        self._local = threading.local()
+        self._writes = 0
+
+        create_private(db_path, check_owner=os.path.dirname(os.path.abspath(db_path)) == os.path.abspath(_RUNTIME_DIR))
+        conn = self._connect()
+        conn.executescript(SCHEMA)
+        conn.close()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=5, isolation_level=None)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        return conn
+
+    def _db(self):
+        """Per-thread connection (sqlite3 connections are not shareable)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or getattr(self._local, 'pid', None) != os.getpid():
+            conn = self._local.conn = self._connect()
+            self._local.pid = os.getpid()
+        return conn
+
+    def _read(self, key, stale):
+        now = time.time()
+        try:
+            row = self._db().execute(
+                'SELECT value, expires_at, accessed_at FROM cache_entries '
+                'WHERE namespace = ? AND key = ? AND stale_until > ?',
+                (self.namespace, str(key), now)
+            ).fetchone()
+        except sqlite3.Error as e:
+            print(f"⚠️ Shared cache read failed: {e}")
+            return _MISSING
+        if row is None:
+            return _MISSING
+        value, expires_at, accessed_at = row
+        if expires_at <= now and not stale:
+            return _MISSING
+        if now - accessed_at > TOUCH_INTERVAL:
+            self._execute('UPDATE cache_entries SET accessed_at = ? WHERE namespace = ? AND key = ?',
+                          (now, self.namespace, str(key)))
+        value = json.loads(value)
+        if self.record_type is not None:
+            # A row written before the record's fields changed is a miss
+            value = self.record_type.from_row(value)
+            return _MISSING if value is None else value
+        return value
+
+    def _execute(self, sql, params):
+        try:
+            self._db().execute(sql, params)
+            return True
+        except sqlite3.Error as e:
+            # The cache is an optimisation; a busy or broken file must not fail the caller
+            print(f"⚠️ Shared cache write failed: {e}")
+            return False
+
+    def get(self, key, default=None):
+        """Return the cached value for key, or default if missing or expired"""
+        value = self._read(key, stale=False)
+        return default if value is _MISSING else value
+
+    def get_stale(self, key, default=None):
+        """Return the value for key even if expired, as long as it is within stale_ttl"""
+        value = self._read(key, stale=True)
+        return default if value is _MISSING else value
+
+    def set(self, key, value, ttl=None):
+        """Cache value under key for ttl seconds (defaults to the cache TTL)"""
+        now = time.time()
+        expires_at = now + (self.ttl if ttl is None else ttl)
+        if self.record_type is not None:
+            if not isinstance(value, self.record_type):
+                value = self.record_type.from_dict(value)
+            value = value.to_row()
+        self._execute(
+            'INSERT OR REPLACE INTO cache_entries (namespace, key, value, expires_at, stale_until, accessed_at) '
+            'VALUES (?, ?, ?, ?, ?, ?)',
+            (self.namespace, str(key), json.dumps(value, separators=(',', ':')),
+             expires_at, expires_at + self.stale_ttl, now)
+        )
+        self._writes += 1
+        if self._writes % EVICT_EVERY == 0:
+            self.evict()
+
+    def evict(self):
+        """Drop entries past their stale window, then the least recently read over maxsize"""
+        now = time.time()
+        self._execute('DELETE FROM cache_entries WHERE namespace = ? AND stale_until <= ?',
+                      (self.namespace, now))
+        self._execute(
+            'DELETE FROM cache_entries WHERE namespace = ? AND key IN ('
+            '  SELECT key FROM cache_entries WHERE namespace = ? '
+            '  ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)',
+            (self.namespace, self.namespace, self.maxsize)
+        )
+
+    def invalidate(self, key):
+        """Drop a single entry for every worker"""
+        self._execute('DELETE FROM cache_entries WHERE namespace = ? AND key = ?',
+                      (self.namespace, str(key)))
+
+    def clear(self):
+        """Drop every entry in this namespace"""
+        self._execute('DELETE FROM cache_entries WHERE namespace = ?', (self.namespace,))
+
+    def __len__(self):
+        try:
+            return self._db().execute('SELECT COUNT(*) FROM cache_entries WHERE namespace = ?',
+                                      (self.namespace,)).fetchone()[0]
+        except sqlite3.Error:
+            return 0
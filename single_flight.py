@@ -0,0 +1,61 @@
+"""
+Request coalescing for identical concurrent reads.
+
+When several threads ask for the same key at once, only the first (the
+leader) runs the fetch; the others wait for it and share its result or its
+exception. Nothing is kept once the call finishes, so this only removes
+duplicate in-flight work and never serves an old value - pair it with
+ttl_cache for that.
+"""
+
+import threading
+
+
+class _Call:
+    """One in-flight fetch and the threads waiting on it"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.waiters = 0
+        self.value = None
+        self.error = None
+
+
+class SingleFlight:
+    """Runs at most one call per key at a time and shares its outcome"""
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn, clone=None):
+        """Return (fn(), role) with role 'leader' or 'follower'.
+
+        Followers get clone(value) so callers can mutate their result; when
+        anyone joined, the leader gets a clone too and the shared value is
+        never handed out.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                call.waiters += 1
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return (clone(call.value) if clone else call.value), 'follower'
+
+        try:
+            call.value = fn()
+        except BaseException as error:
+            call.error = error
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+                shared = call.waiters > 0
+            call.done.set()
+        return (clone(call.value) if clone and shared else call.value), 'leader'
@@ -0,0 +1,523 @@
+"""
+SQL storage backend (SQLite by default) built on SQLAlchemy Core.
+
+Selected with STORAGE_BACKEND=sql. Every record keeps its full field set in a
+JSON ``data`` column, so it round-trips exactly like the Firebase records,
+while the fields the app looks up or filters by are copied into indexed
+columns. Counts, per-student listings and cursor pagination become indexed
+queries on the local database, with no network round trips.
+"""
+
+import hmac
+import os
+import threading
+import uuid
+from datetime import datetime, timedelta
+from sqlalchemy import (
+    Boolean, Column, Index, JSON, MetaData, String, Table,
+    and_, create_engine, delete, event, func, insert, or_, select, update
+)
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from werkzeug.security import generate_password_hash
+import metrics
+from storage import StorageBackend, ISSUE_PAGE_SIZE, USER_SUMMARY_FIELDS
+
+STORAGE_DATABASE_URL = os.environ.get('STORAGE_DATABASE_URL', 'sqlite:///portal.db')
+
+metadata = MetaData()
+
+users = Table(
+    'users', metadata,
+    Column('id', String(40), primary_key=True),
+    Column('username', String(150), nullable=False, unique=True),
+    Column('email', String(255)),
+    Column('student_id', String(64)),
+    Column('phone', String(64)),
+    Column('role', String(32)),
+    Column('created_at', String(32)),
+    Column('data', JSON, nullable=False),
+    Index('ix_users_email', 'email'),
+    Index('ix_users_student_id', 'student_id'),
+    Index('ix_users_phone', 'phone'),
+    Index('ix_users_role', 'role'),
+)
+
+issues = Table(
+    'issues', metadata,
+    Column('id', String(40), primary_key=True),
+    Column('student_id', String(40)),
+    Column('status', String(32)),
+    Column('category', String(64)),
+    Column('created_at', String(32)),
+    Column('data', JSON, nullable=False),
+    Index('ix_issues_created_at', 'created_at', 'id'),
+    Index('ix_issues_status_created_at', 'status', 'created_at', 'id'),
+    Index('ix_issues_student_created_at', 'student_id', 'created_at'),
+    Index('ix_issues_category', 'category'),
+)
+
+verification_codes = Table(
+    'verification_codes', metadata,
+    Column('user_id', String(40), primary_key=True),
+    Column('purpose', String(32), primary_key=True),
+    Column('code', String(16), nullable=False),
+    Column('created_at', String(32)),
+    Column('expires_at', String(32), nullable=False),
+    Column('used', Boolean, nullable=False, default=False),
+    Index('ix_verification_codes_expires_at', 'expires_at'),
+)
+
+password_resets = Table(
+    'password_resets', metadata,
+    Column('token_hash', String(64), primary_key=True),
+    Column('user_id', String(40), nullable=False),
+    Column('created_at', String(32)),
+    Column('expires_at', String(32), nullable=False),
+    Column('used', Boolean, nullable=False, default=False),
+    Column('used_at', String(32)),
+    Index('ix_password_resets_expires_at', 'expires_at'),
+)
+
+settings_table = Table(
+    'system_settings', metadata,
+    Column('name', String(32), primary_key=True),
+    Column('value', JSON, nullable=False),
+)
+
+# Record fields mirrored into indexed columns
+USER_COLUMNS = ('username', 'email', 'student_id', 'phone', 'role', 'created_at')
+ISSUE_COLUMNS = ('student_id', 'status', 'category', 'created_at')
+
+
+def _new_id():
+    return uuid.uuid4().hex
+
+
+def _columns(record, names):
+    return {name: record.get(name) for name in names}
+
+
+def _summary_columns():
+    """Columns selecting just USER_SUMMARY_FIELDS, reading the JSON only for fields without their own column"""
+    return [users.c[field] if field in USER_COLUMNS else users.c.data[field].as_string().label(field)
+            for field in USER_SUMMARY_FIELDS]
+
+
+def _summary(row):
+    """A summary row as {'id', ...fields}, leaving out empty fields like the Firebase nodes"""
+    return {field: value for field, value in row._mapping.items() if value is not None}
+
+
+def _record(row):
+    """A stored record as the dict the app expects (fields plus 'id')"""
+    record = dict(row.data)
+    record['id'] = row.id
+    return record
+
+
+def _apply_path_updates(document, updates):
+    """Apply Firebase-style {'a/b': value} updates to a nested dict (None deletes)"""
+    for path, value in updates.items():
+        keys = [key for key in path.split('/') if key]
+        node = document
+        for key in keys[:-1]:
+            if not isinstance(node.get(key), dict):
+                node[key] = {}
+            node = node[key]
+        if value is None:
+            node.pop(keys[-1], None)
+        else:
+            node[keys[-1]] = value
+    return document
+
+
+@metrics.instrument_methods
+class SQLStorage(StorageBackend):
+    """Storage backend on a SQL database via SQLAlchemy (SQLite by default)"""
+
+    def __init__(self, database_url=STORAGE_DATABASE_URL):
+        self.database_url = database_url
+        self.engine = create_engine(database_url, pool_pre_ping=True)
+        if self.engine.dialect.name == 'sqlite':
+            event.listen(self.engine, 'connect', self._configure_sqlite)
+        self._pid = os.getpid()
+        self._pid_lock = threading.Lock()
+        metadata.create_all(self.engine)
+        print(f"🗄️ SQL storage initialized ({self.engine.url.render_as_string(hide_password=True)})")
+
+    @staticmethod
+    def _configure_sqlite(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        # WAL lets readers in other workers proceed while one worker writes
+        cursor.execute('PRAGMA journal_mode=WAL')
+        cursor.execute('PRAGMA synchronous=NORMAL')
+        cursor.execute('PRAGMA busy_timeout=10000')
+        cursor.close()
+
+    def _engine(self):
+        """The engine, with pooled connections dropped after a fork"""
+        if self._pid != os.getpid():
+            with self._pid_lock:
+                if self._pid != os.getpid():
+                    self.engine.dispose(close=False)
+                    self._pid = os.getpid()
+        return self.engine
+
+    def _read(self, statement):
+        with self._engine().connect() as conn:
+            return conn.execute(statement).fetchall()
+
+    # Users
+    def get_user_by_id(self, user_id):
+        """Get user by ID"""
+        rows = self._read(select(users.c.id, users.c.data).where(users.c.id == user_id))
+        return _record(rows[0]) if rows else None
+
+    def _find_user_by_field(self, field, value):
+        """Get user whose field equals value (an indexed column)"""
+        if not value:
+            return None
+        rows = self._read(select(users.c.id, users.c.data).where(users.c[field] == value).limit(1))
+        return _record(rows[0]) if rows else None
+
+    def get_users_by_ids(self, user_ids):
+        """Get many users at once as {user_id: user}"""
+        user_ids = [user_id for user_id in dict.fromkeys(user_ids) if user_id]
+        if not user_ids:
+            return {}
+        rows = self._read(select(users.c.id, users.c.data).where(users.c.id.in_(user_ids)))
+        return {row.id: _record(row) for row in rows}
+
+    def get_all_users(self):
+        """Get all users"""
+        return [_record(row) for row in self._read(select(users.c.id, users.c.data).order_by(users.c.username))]
+
+    def get_user_summaries(self, user_ids):
+        """Get {user_id: summary} without loading the full profile JSON"""
+        user_ids = [user_id for user_id in dict.fromkeys(user_ids) if user_id]
+        if not user_ids:
+            return {}
+        rows = self._read(select(users.c.id, *_summary_columns()).where(users.c.id.in_(user_ids)))
+        return {row.id: _summary(row) for row in rows}
+
+    def list_user_summaries(self):
+        """Get every user's summary, sorted by username"""
+        return [_summary(row) for row in self._read(select(users.c.id, *_summary_columns()).order_by(users.c.username))]
+
+    def create_user(self, username, password, role, **additional_data):
+        """Create new user with extended information"""
+        error = self._check_new_user(username, additional_data)
+        if error:
+            return None, error
+
+        user_data = self._new_user_record(username, password, role, additional_data)
+        user_id = _new_id()
+        try:
+            with self._engine().begin() as conn:
+                conn.execute(insert(users).values(id=user_id, data=user_data, **_columns(user_data, USER_COLUMNS)))
+        except IntegrityError:
+            return None, "User already exists"
+        except SQLAlchemyError as e:
+            print(f"❌ Failed to create user: {e}")
+            return None, "Failed to create user"
+        return user_id, "User created successfully"
+
+    def _update_user(self, user_id, changes):
+        """Merge changes into a user record (None deletes a field); False if not found"""
+        with self._engine().begin() as conn:
+            row = conn.execute(select(users.c.data).where(users.c.id == user_id)).first()
+            if row is None:
+                return False
+            user_data = dict(row.data)
+            for field, value in changes.items():
+                if value is None:
+                    user_data.pop(field, None)
+                else:
+                    user_data[field] = value
+            conn.execute(update(users).where(users.c.id == user_id)
+                         .values(data=user_data, **_columns(user_data, USER_COLUMNS)))
+        return True
+
+    def delete_user(self, user_id):
+        """Permanently delete a user"""
+        with self._engine().begin() as conn:
+            deleted = conn.execute(delete(users).where(users.c.id == user_id)).rowcount
+        if not deleted:
+            return False, "User not found"
+        return True, "User deleted successfully"
+
+    def update_user_profile(self, user_id, profile_data):
+        """Update profile fields for a user"""
+        changes = dict(profile_data)
+        changes['updated_at'] = datetime.now().isoformat()
+        try:
+            if not self._update_user(user_id, changes):
+                return False, "User not found"
+        except IntegrityError:
+            return False, "User already exists"
+        return True, "Profile updated successfully"
+
+    def update_user_password(self, username, new_password):
+        """Update user password"""
+        user = self.get_user_by_username(username)
+        if not user:
+            return False, "User not found"
+
+        if self._update_user(user['id'], {
+            'password_hash': generate_password_hash(new_password),
+            'password': None,
+            'updated_at': datetime.now().isoformat()
+        }):
+            return True, "Password updated successfully"
+        return False, "Failed to update password"
+
+    def mark_email_verified(self, user_id):
+        """Flag a user's email address as verified"""
+        if self._update_user(user_id, {'email_verified': True, 'verified_at': datetime.now().isoformat()}):
+            return True, "Email verified successfully"
+        return False, "User not found"
+
+    def reset_user_password(self, user_id, new_password):
+        """Reset user password using user ID"""
+        now = datetime.now().isoformat()
+        if self._update_user(user_id, {
+            'password_hash': generate_password_hash(new_password),
+            'password': None,
+            'updated_at': now,
+            'password_reset_at': now
+        }):
+            return True, "Password reset successfully"
+        return False, "User not found"
+
+    # Verification codes
+    def store_verification_code(self, user_id, code, purpose='registration'):
+        """Store verification code, replacing any earlier code for the same purpose"""
+        now = datetime.now()
+        key = (verification_codes.c.user_id == user_id) & (verification_codes.c.purpose == purpose)
+        with self._engine().begin() as conn:
+            conn.execute(delete(verification_codes).where(key))
+            conn.execute(insert(verification_codes).values(
+                user_id=user_id, purpose=purpose, code=code, used=False,
+                created_at=now.isoformat(),
+                expires_at=(now + timedelta(minutes=15)).isoformat()  # 15 min expiry
+            ))
+        return f'{purpose}/{user_id}'
+
+    def verify_code(self, code, purpose='registration', user_id=None):
+        """Verify and use a verification code"""
+        query = select(verification_codes).where(verification_codes.c.purpose == purpose)
+        if user_id is not None:
+            query = query.where(verification_codes.c.user_id == user_id)
+        else:
+            query = query.where(verification_codes.c.code == str(code))
+
+        now = datetime.now()
+        with self._engine().begin() as conn:
+            for row in conn.execute(query).fetchall():
+                record = row._asdict()
+                if hmac.compare_digest(str(record['code']), str(code)) and not self._is_stale(record, now):
+                    # Codes are single use
+                    conn.execute(delete(verification_codes).where(
+                        (verification_codes.c.user_id == row.user_id) & (verification_codes.c.purpose == purpose)
+                    ))
+                    return row.user_id
+        return None
+
+    def sweep_verification_codes(self):
+        """Delete used and expired verification codes"""
+        now = datetime.now().isoformat()
+        with self._engine().begin() as conn:
+            deleted = conn.execute(delete(verification_codes).where(
+                or_(verification_codes.c.used.is_(True), verification_codes.c.expires_at <= now)
+            )).rowcount
+        return True, f"Removed {deleted} stale verification codes"
+
+    # Password reset tokens
+    def create_password_reset_token(self, user_id):
+        """Create a password reset token for a user"""
+        token = self.generate_reset_token()
+        now = datetime.now()
+        with self._engine().begin() as conn:
+            conn.execute(insert(password_resets).values(
+                token_hash=self._reset_token_hash(token), user_id=user_id, used=False,
+                created_at=now.isoformat(),
+                expires_at=(now + timedelta(hours=1)).isoformat()  # Token expires in 1 hour
+            ))
+        return token
+
+    def verify_reset_token(self, token):
+        """Verify if a reset token is valid and not expired"""
+        if not token:
+            return None, None
+        token_hash = self._reset_token_hash(token)
+        rows = self._read(select(password_resets).where(password_resets.c.token_hash == token_hash))
+        if rows:
+            record = rows[0]._asdict()
+            if (hmac.compare_digest(record['token_hash'], token_hash) and
+                    not self._is_stale(record, datetime.now())):
+                return record['user_id'], token_hash
+        return None, None
+
+    def use_reset_token(self, reset_id):
+        """Mark a reset token as used"""
+        with self._engine().begin() as conn:
+            updated = conn.execute(update(password_resets).where(password_resets.c.token_hash == reset_id)
+                                   .values(used=True, used_at=datetime.now().isoformat())).rowcount
+        return bool(updated)
+
+    def sweep_reset_tokens(self):
+        """Delete used and expired reset tokens"""
+        now = datetime.now().isoformat()
+        with self._engine().begin() as conn:
+            deleted = conn.execute(delete(password_resets).where(
+                or_(password_resets.c.used.is_(True), password_resets.c.expires_at <= now)
+            )).rowcount
+        return True, f"Removed {deleted} stale reset tokens"
+
+    # Issues
+    def _issues(self, *conditions, limit=None, newest_first=True):
+        query = select(issues.c.id, issues.c.data)
+        if conditions:
+            query = query.where(*conditions)
+        if newest_first:
+            query = query.order_by(issues.c.created_at.desc(), issues.c.id.desc())
+        else:
+            query = query.order_by(issues.c.created_at, issues.c.id)
+        if limit is not None:
+            query = query.limit(limit)
+        return [_record(row) for row in self._read(query)]
+
+    def _count_issues_by(self, column):
+        rows = self._read(select(column, func.count()).group_by(column))
+        return {key if key is not None else 'unknown': count for key, count in rows}
+
+    def get_all_issues(self):
+        """Get all issues"""
+        return self._issues()
+
+    def get_issue_summary(self):
+        """Get all issues plus per-status and per-category counts"""
+        return {
+            'issues': self._issues(),
+            'status_counts': self._count_issues_by(issues.c.status),
+            'category_counts': self._count_issues_by(issues.c.category)
+        }
+
+    def list_issues(self, page_size=ISSUE_PAGE_SIZE, cursor=None, status=None, direction='next'):
+        """Get one page of issues (newest first) plus next/previous cursors.
+
+        A keyset query on (created_at, id), so each page costs one indexed
+        range scan no matter how deep into the listing it is.
+        """
+        older = direction != 'prev'
+        conditions = []
+        if status:
+            conditions.append(issues.c.status == status)
+        bound = self.parse_issue_cursor(cursor)
+        if bound:
+            created_at, issue_id = bound
+            if older:
+                conditions.append(or_(issues.c.created_at < created_at,
+                                      and_(issues.c.created_at == created_at, issues.c.id < issue_id)))
+            else:
+                conditions.append(or_(issues.c.created_at > created_at,
+                                      and_(issues.c.created_at == created_at, issues.c.id > issue_id)))
+
+        matches = self._issues(*conditions, limit=page_size + 1, newest_first=older)
+        return self._build_issue_page(matches, page_size, bound, older)
+
+    def get_issues_by_student(self, student_id):
+        """Get issues by student ID"""
+        return self._issues(issues.c.student_id == student_id)
+
+    def get_issues_by_status(self, status):
+        """Get issues by status"""
+        return self._issues(issues.c.status == status)
+
+    def get_issue_by_id(self, issue_id):
+        """Get issue by ID"""
+        found = self._issues(issues.c.id == issue_id, newest_first=False)
+        return found[0] if found else None
+
+    def create_issue(self, student_id, subject, category, message):
+        """Create new issue"""
+        issue_data = self._new_issue_record(student_id, subject, category, message)
+        issue_id = _new_id()
+        try:
+            with self._engine().begin() as conn:
+                conn.execute(insert(issues).values(id=issue_id, data=issue_data, **_columns(issue_data, ISSUE_COLUMNS)))
+        except SQLAlchemyError as e:
+            print(f"❌ Failed to create issue: {e}")
+            return None, "Failed to create issue"
+        return issue_id, "Issue created successfully"
+
+    def update_issue_status(self, issue_id, status, response=None):
+        """Update issue status"""
+        with self._engine().begin() as conn:
+            row = conn.execute(select(issues.c.data).where(issues.c.id == issue_id)).first()
+            if row is None:
+                return False, "Failed to update issue"
+            issue_data = dict(row.data)
+            issue_data['status'] = status
+            issue_data['updated_at'] = datetime.now().isoformat()
+            if response:
+                issue_data['response'] = response
+            conn.execute(update(issues).where(issues.c.id == issue_id)
+                         .values(data=issue_data, **_columns(issue_data, ISSUE_COLUMNS)))
+        return True, "Issue updated successfully"
+
+    def delete_issue(self, issue_id):
+        """Permanently delete an issue"""
+        with self._engine().begin() as conn:
+            deleted = conn.execute(delete(issues).where(issues.c.id == issue_id)).rowcount
+        if not deleted:
+            return False, "Issue not found"
+        return True, "Issue deleted successfully"
+
+    # System Settings
+    def _load_system_settings(self):
+        """Get the stored settings document"""
+        rows = self._read(select(settings_table.c.value).where(settings_table.c.name == 'system'))
+        return rows[0].value if rows else None
+
+    def _write_settings(self, conn, settings_data):
+        updated = conn.execute(update(settings_table).where(settings_table.c.name == 'system')
+                               .values(value=settings_data)).rowcount
+        if not updated:
+            conn.execute(insert(settings_table).values(name='system', value=settings_data))
+
+    def _patch_settings(self, updates):
+        """Apply {'categories/x': value, ...} updates to the settings document"""
+        try:
+            with self._engine().begin() as conn:
+                row = conn.execute(select(settings_table.c.value).where(settings_table.c.name == 'system')).first()
+                settings_data = dict(row.value) if row else self.get_default_system_settings()
+                self._write_settings(conn, _apply_path_updates(settings_data, updates))
+        except SQLAlchemyError as e:
+            print(f"❌ Failed to update settings: {e}")
+            return False
+        return True
+
+    def update_system_settings(self, settings_data):
+        """Update system settings"""
+        try:
+            with self._engine().begin() as conn:
+                self._write_settings(conn, settings_data)
+        except SQLAlchemyError as e:
+            print(f"❌ Failed to update settings: {e}")
+            return False
+        return True
+
+    # Statistics
+    def get_user_count_by_role(self):
+        """Get user count by role"""
+        rows = self._read(select(users.c.role, func.count()).group_by(users.c.role))
+        return {role if role is not None else 'unknown': count for role, count in rows}
+
+    def get_issue_count_by_status(self):
+        """Get issue count by status"""
+        return self._count_issues_by(issues.c.status)
+
+    def get_issue_count_by_category(self):
+        """Get issue count by category"""
+        return self._count_issues_by(issues.c.category)
@@ -0,0 +1,507 @@
+"""
+Storage interface shared by the database backends.
+
+StorageBackend lists every data-access method the app uses and implements
+the parts that do not depend on where the data lives (password checks,
+cursor pagination, settings lookups, default records). SimpleFirebaseDB
+stores data in the Firebase Realtime Database over REST; SQLStorage keeps it
+in SQLite (or any SQLAlchemy database) for local, network-free deployments.
+"""
+
+import copy
+import hashlib
+import os
+import secrets
+import string
+from datetime import datetime
+from werkzeug.security import generate_password_hash, check_password_hash
+
+# Issues per page on paginated listings
+ISSUE_PAGE_SIZE = int(os.environ.get('ISSUE_PAGE_SIZE', '20'))
+
+# Fields listing pages and username joins need; never includes credentials
+USER_SUMMARY_FIELDS = ('username', 'role', 'department', 'level', 'created_at')
+
+
+class StorageUnavailable(Exception):
+    """The backend could not be reached, as opposed to a record not existing"""
+
+
+class StorageBackend:
+    """Data access for users, issues, verification codes, reset tokens and settings"""
+
+    # Users
+    def get_user_by_id(self, user_id):
+        """Get user by ID"""
+        raise NotImplementedError
+
+    def _find_user_by_field(self, field, value):
+        """Get the user whose field (username, email, student_id, phone) equals value"""
+        raise NotImplementedError
+
+    def get_user_by_username(self, username):
+        """Get user by username"""
+        return self._find_user_by_field('username', username)
+
+    def get_user_by_student_id(self, student_id):
+        """Get user by student ID"""
+        return self._find_user_by_field('student_id', student_id)
+
+    def get_user_by_email(self, email):
+        """Get user by email"""
+        return self._find_user_by_field('email', email)
+
+    def get_user_identity(self, user_id):
+        """Get the minimal identity (id, username, role) for a logged-in user"""
+        return self.remember_user_identity(self.get_user_by_id(user_id))
+
+    def remember_user_identity(self, user):
+        """Identity of a user record that was already fetched (backends may cache it)"""
+        if not user or not user.get('id') or not user.get('username'):
+            return None
+        return {'id': user['id'], 'username': user['username'], 'role': user.get('role')}
+
+    def invalidate_user_identity(self, user_id):
+        """Forget any cached copy of a user (password or role changed)"""
+
+    def get_users_by_ids(self, user_ids):
+        """Get many users at once as {user_id: user}"""
+        raise NotImplementedError
+
+    def get_all_users(self):
+        """Get all users, sorted by username"""
+        raise NotImplementedError
+
+    @staticmethod
+    def user_summary(user):
+        """Project a user record down to USER_SUMMARY_FIELDS"""
+        return {field: user[field] for field in USER_SUMMARY_FIELDS if user.get(field) is not None}
+
+    def get_user_summaries(self, user_ids):
+        """Get {user_id: summary} for many users; a summary is id plus USER_SUMMARY_FIELDS"""
+        return {user_id: dict(self.user_summary(user), id=user_id)
+                for user_id, user in self.get_users_by_ids(user_ids).items()}
+
+    def list_user_summaries(self):
+        """Get every user's summary, sorted by username"""
+        return [dict(self.user_summary(user), id=user['id']) for user in self.get_all_users()]
+
+    def verify_password(self, username, password):
+        """Verify user password"""
+        user = self.get_user_by_username(username)
+        if user and check_password_hash(user.get('password_hash', user.get('password', '')), password):
+            return user
+        return None
+
+    @staticmethod
+    def _new_user_record(username, password, role, additional_data):
+        """The stored form of a newly registered user"""
+        return {
+            'username': username,
+            'password_hash': generate_password_hash(password),
+            'role': role,
+            'created_at': datetime.now().isoformat(),
+            # Personal Information
+            'first_name': additional_data.get('first_name', ''),
+            'last_name': additional_data.get('last_name', ''),
+            'email': additional_data.get('email', ''),
+            'phone': additional_data.get('phone', ''),
+            'date_of_birth': additional_data.get('date_of_birth', ''),
+            'gender': additional_data.get('gender', ''),
+            # Academic Information
+            'student_id': additional_data.get('student_id', ''),
+            'level': additional_data.get('level', ''),
+            'department': additional_data.get('department', ''),
+            'program': additional_data.get('program', ''),
+            # Additional Information
+            'address': additional_data.get('address', ''),
+            'emergency_contact_name': additional_data.get('emergency_contact_name', ''),
+            'emergency_contact_phone': additional_data.get('emergency_contact_phone', ''),
+            # System fields
+            'terms_accepted': additional_data.get('terms_accepted', False),
+            'profile_complete': True
+        }
+
+    def _check_new_user(self, username, additional_data):
+        """Return an error message if a new user would clash with an existing one"""
+        if self.get_user_by_username(username):
+            return "User already exists"
+        student_id = additional_data.get('student_id')
+        if student_id and self.get_user_by_student_id(student_id):
+            return "Student ID already exists"
+        email = additional_data.get('email')
+        if email and self.get_user_by_email(email):
+            return "Email address already exists"
+        return None
+
+    def create_user(self, username, password, role, **additional_data):
+        """Create new user with extended information; returns (user_id, message)"""
+        raise NotImplementedError
+
+    def delete_user(self, user_id):
+        """Permanently delete a user; returns (success, message)"""
+        raise NotImplementedError
+
+    def update_user_profile(self, user_id, profile_data):
+        """Update profile fields for a user; returns (success, message)"""
+        raise NotImplementedError
+
+    def update_user_password(self, username, new_password):
+        """Update user password; returns (success, message)"""
+        raise NotImplementedError
+
+    def mark_email_verified(self, user_id):
+        """Flag a user's email address as verified; returns (success, message)"""
+        raise NotImplementedError
+
+    def reset_user_password(self, user_id, new_password):
+        """Reset user password using user ID; returns (success, message)"""
+        raise NotImplementedError
+
+    def find_user_for_reset(self, contact_info, student_id, method):
+        """Find user by email/phone and verify with student ID"""
+        field = 'email' if method == 'email' else 'phone' if method == 'phone' else None
+        if not field:
+            return None
+
+        user = self._find_user_by_field(field, contact_info)
+
+        # Verify student ID matches
+        if user and user.get('student_id') == student_id:
+            return user
+        return None
+
+    # Verification codes and reset tokens
+    def generate_verification_code(self):
+        """Generate a 6-digit verification code"""
+        return str(100000 + secrets.randbelow(900000))
+
+    def store_verification_code(self, user_id, code, purpose='registration'):
+        """Store the live verification code for a user and purpose"""
+        raise NotImplementedError
+
+    def verify_code(self, code, purpose='registration', user_id=None):
+        """Verify and use a verification code; returns the user id or None"""
+        raise NotImplementedError
+
+    def sweep_verification_codes(self):
+        """Delete used and expired verification codes; returns (success, message)"""
+        raise NotImplementedError
+
+    def generate_reset_token(self):
+        """Generate a secure reset token"""
+        return ''.join(secrets.choice(string.ascii_letters + string.digits) for _ in range(32))
+
+    @staticmethod
+    def _reset_token_hash(token):
+        """SHA-256 of a reset token - the only form of the token that is stored"""
+        return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def _is_stale(record, now):
+        """True for a used, expired or malformed code/token record"""
+        if not isinstance(record, dict) or record.get('used', False):
+            return True
+        try:
+            return datetime.fromisoformat(record['expires_at']) <= now
+        except (KeyError, TypeError, ValueError):
+            return True
+
+    def create_password_reset_token(self, user_id):
+        """Create a password reset token for a user; returns the raw token"""
+        raise NotImplementedError
+
+    def verify_reset_token(self, token):
+        """Return (user_id, reset_id) for a valid token, else (None, None)"""
+        raise NotImplementedError
+
+    def use_reset_token(self, reset_id):
+        """Mark a reset token as used"""
+        raise NotImplementedError
+
+    def sweep_reset_tokens(self):
+        """Delete used and expired reset tokens; returns (success, message)"""
+        raise NotImplementedError
+
+    def sweep_expired_records(self):
+        """Run every sweep once; returns a list of (success, message)"""
+        return [self.sweep_verification_codes(), self.sweep_reset_tokens()]
+
+    # Issues
+    def get_all_issues(self):
+        """Get all issues, newest first"""
+        raise NotImplementedError
+
+    def get_issue_summary(self):
+        """Get all issues plus per-status and per-category counts"""
+        raise NotImplementedError
+
+    @staticmethod
+    def issue_cursor(issue):
+        """Opaque pagination cursor for an issue: 'created_at|issue_id'"""
+        return f"{issue.get('created_at', '')}|{issue['id']}"
+
+    @staticmethod
+    def parse_issue_cursor(cursor):
+        """The (created_at, issue_id) key a cursor points at, or None if it is missing or malformed"""
+        if not isinstance(cursor, str) or '|' not in cursor:
+            return None
+        created_at, issue_id = cursor.rsplit('|', 1)
+        return (created_at, issue_id) if issue_id else None
+
+    @staticmethod
+    def _issue_sort_key(issue):
+        return (issue.get('created_at', ''), issue['id'])
+
+    def paginate_issues(self, issues, page_size=ISSUE_PAGE_SIZE, cursor=None, status=None, direction='next'):
+        """Paginate an in-memory newest-first issue list with the same cursors as list_issues"""
+        older = direction != 'prev'
+        bound = self.parse_issue_cursor(cursor)
+
+        matches = []
+        ordered = issues if older else reversed(issues)
+        for issue in ordered:
+            key = self._issue_sort_key(issue)
+            if bound and (key >= bound if older else key <= bound):
+                continue
+            if status and issue.get('status') != status:
+                continue
+            matches.append(issue)
+            if len(matches) > page_size:
+                break
+
+        return self._build_issue_page(matches, page_size, bound, older)
+
+    def _build_issue_page(self, matches, page_size, bound, older):
+        """Turn nearest-first matches (one past the page if more exist) into a page.
+
+        bound is the parsed cursor the page was read from, None on the first page.
+        """
+        has_more = len(matches) > page_size
+        page = matches[:page_size]
+        if not older:
+            page.reverse()
+
+        next_cursor = prev_cursor = None
+        if page:
+            # Moving back from an older page means newer issues exist, and vice versa
+            more_older = has_more if older else True
+            more_newer = bound is not None if older else has_more
+            if more_older:
+                next_cursor = self.issue_cursor(page[-1])
+            if more_newer:
+                prev_cursor = self.issue_cursor(page[0])
+
+        return {'issues': page, 'next_cursor': next_cursor, 'prev_cursor': prev_cursor}
+
+    def list_issues(self, page_size=ISSUE_PAGE_SIZE, cursor=None, status=None, direction='next'):
+        """Get one page of issues (newest first) plus next/previous cursors"""
+        raise NotImplementedError
+
+    def get_issues_by_student(self, student_id):
+        """Get issues by student ID, newest first"""
+        raise NotImplementedError
+
+    def get_issues_by_status(self, status):
+        """Get issues by status"""
+        issues = self.get_all_issues()
+        return [issue for issue in issues if issue.get('status') == status]
+
+    def get_issue_by_id(self, issue_id):
+        """Get issue by ID"""
+        raise NotImplementedError
+
+    @staticmethod
+    def _new_issue_record(student_id, subject, category, message):
+        """The stored form of a newly submitted issue"""
+        return {
+            'student_id': student_id,
+            'subject': subject,
+            'category': category,
+            'message': message,
+            'status': 'pending',
+            'response': '',
+            'created_at': datetime.now().isoformat()
+        }
+
+    def create_issue(self, student_id, subject, category, message):
+        """Create new issue; returns (issue_id, message)"""
+        raise NotImplementedError
+
+    def update_issue_status(self, issue_id, status, response=None):
+        """Update issue status; returns (success, message)"""
+        raise NotImplementedError
+
+    def delete_issue(self, issue_id):
+        """Permanently delete an issue; returns (success, message)"""
+        raise NotImplementedError
+
+    # System Settings
+    def _load_system_settings(self):
+        """The stored settings document, or None if none has been saved.
+
+        Raises StorageUnavailable if the backend cannot be reached.
+        """
+        raise NotImplementedError
+
+    def _patch_settings(self, updates):
+        """Write only the changed settings subtrees ({'categories/x': value, ...})"""
+        raise NotImplementedError
+
+    def update_system_settings(self, settings_data):
+        """Replace the whole settings document"""
+        raise NotImplementedError
+
+    def invalidate_settings_cache(self):
+        """Force the next settings read to go to the database"""
+
+    def get_system_settings(self):
+        """Get all system settings"""
+        try:
+            settings = self._load_system_settings()
+        except StorageUnavailable:
+            # Serve defaults for this request; never write them over stored settings
+            settings = None
+        if not settings:
+            # Return default settings if none exist
+            return self.get_default_system_settings()
+        # Callers may modify the result, so never hand out the cached object
+        return copy.deepcopy(settings)
+
+    def get_default_system_settings(self):
+        """Get default system settings"""
+        return {
+            'system_info': {
+                'name': 'KTU Student Portal',
+                'full_name': 'Koforidua Technical University Student Portal',
+                'description': 'Submit and track your academic concerns',
+                'contact_email': 'support@ktu.edu.gh',
+                'phone': '+233-000-000-000'
+            },
+            'categories': {
+                'academic': {'name': 'Academic', 'description': 'Course content, schedules, lecturer issues'},
+                'exams_grades': {'name': 'Exams & Grades', 'description': 'Missing grades, exam timetables, remark requests'},
+                'technical': {'name': 'Technical', 'description': 'Portal issues, software problems'},
+                'administration': {'name': 'Administration', 'description': 'Registration, ID cards, fee clearance'},
+                'facilities': {'name': 'Facilities', 'description': 'Library, labs, study spaces'},
+                'welfare': {'name': 'Welfare', 'description': 'Counseling, conflicts, special needs'},
+                'other': {'name': 'Other', 'description': 'Any other concerns'}
+            },
+            'academic_levels': {
+                '100': 'Level 100',
+                '200': 'Level 200',
+                '300': 'Level 300',
+                '400': 'Level 400',
+                'graduate': 'Graduate',
+                'postgraduate': 'Postgraduate'
+            },
+            'index_prefixes': {
+                'CS': 'Computer Science',
+                'IT': 'Information Technology',
+                'EE': 'Electrical Engineering',
+                'ME': 'Mechanical Engineering',
+                'CE': 'Civil Engineering',
+                'BA': 'Business Administration'
+            },
+            'email_settings': {
+                'from_name': 'KTU Student Portal',
+                'from_email': 'noreply@ktu.edu.gh',
+                'support_email': 'support@ktu.edu.gh'
+            },
+            'registration_settings': {
+                'require_email_verification': True,
+                'allowed_email_domain': '@ktu.edu.gh',
+                'min_password_length': 8,
+                'require_index_prefix': False
+            },
+            'notification_messages': {
+                'registration_success': 'Registration successful! Please check your email for verification code.',
+                'email_verification_required': 'Please verify your email address before logging in.',
+                'login_success': 'Login successful!',
+                'invalid_credentials': 'Invalid username or password.',
+                'access_denied': 'Access denied. Admin privileges required.'
+            }
+        }
+
+    def get_setting(self, setting_path):
+        """Get a specific setting by path (e.g., 'system_info.name')"""
+        try:
+            settings = self._load_system_settings()
+        except StorageUnavailable:
+            settings = None
+        settings = settings or self.get_default_system_settings()
+        keys = setting_path.split('.')
+        current = settings
+
+        for key in keys:
+            if isinstance(current, dict) and key in current:
+                current = current[key]
+            else:
+                return None
+
+        return copy.deepcopy(current) if isinstance(current, (dict, list)) else current
+
+    def update_setting(self, setting_path, value):
+        """Update a specific setting by path"""
+        return self._patch_settings({setting_path.replace('.', '/'): value})
+
+    def add_category(self, key, name, description):
+        """Add a new concern category"""
+        return self._patch_settings({
+            f'categories/{key}': {
+                'name': name,
+                'description': description
+            }
+        })
+
+    def remove_category(self, key):
+        """Remove a concern category"""
+        settings = self.get_system_settings()
+        if 'categories' in settings and key in settings['categories']:
+            return self._patch_settings({f'categories/{key}': None})
+        return False
+
+    def add_index_prefix(self, prefix, description):
+        """Add a new index number prefix"""
+        return self._patch_settings({f'index_prefixes/{prefix}': description})
+
+    def remove_index_prefix(self, prefix):
+        """Remove an index number prefix"""
+        settings = self.get_system_settings()
+        if 'index_prefixes' in settings and prefix in settings['index_prefixes']:
+            return self._patch_settings({f'index_prefixes/{prefix}': None})
+        return False
+
+    def initialize_default_settings(self):
+        """Initialize system with default settings if none exist"""
+        current_settings = self._load_system_settings()
+        if not current_settings:
+            default_settings = self.get_default_system_settings()
+            return self.update_system_settings(default_settings)
+        return True
+
+    # Statistics
+    def get_user_count_by_role(self):
+        """Get user count by role"""
+        raise NotImplementedError
+
+    def get_issue_count_by_status(self):
+        """Get issue count by status"""
+        raise NotImplementedError
+
+    def get_issue_count_by_category(self):
+        """Get issue count by category"""
+        raise NotImplementedError
+
+    # Maintenance
+    def rebuild_user_indexes(self):
+        """Rebuild derived user lookup data; returns (success, message)"""
+        return True, "User lookups are indexed by the database"
+
+    def rebuild_student_issue_index(self):
+        """Rebuild derived per-student issue data; returns (success, message)"""
+        return True, "Student issues are indexed by the database"
+
+    def reconcile_counters(self):
+        """Repair materialized counters; returns (success, message)"""
+        return True, "Counts are computed by the database"
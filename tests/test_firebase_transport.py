@@ -0,0 +1,266 @@
+"""
+FirebaseTransport against a local stand-in server.
+
+The stand-in is a keep-alive http.server that records which client
+connection served each request, so connection reuse can be observed
+directly. Paths choose the behaviour: /ok echoes the request, /slow delays
+its answer, /fail always answers 503 and /flaky answers 503 until it has
+failed the number of times given by ?failures=N.
+
+Run from the project root:
+    python -m pytest tests
+"""
+
+import json
+import os
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+from urllib.parse import parse_qs, urlparse
+
+import requests
+
+from firebase_transport import CircuitBreaker, FirebaseTransport, FirebaseUnavailable, RetryBudget
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _handle(self):
+        url = urlparse(self.path)
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length).decode('utf-8') if length else None
+        server = self.server
+        with server.lock:
+            server.requests.append((self.command, url.path, self.client_address))
+            hits = server.hits[url.path] = server.hits.get(url.path, 0) + 1
+
+        status = 200
+        if url.path == '/slow':
+            time.sleep(float(parse_qs(url.query).get('delay', ['1'])[0]))
+        elif url.path == '/fail':
+            status = 503
+        elif url.path == '/flaky' and hits <= int(parse_qs(url.query).get('failures', ['0'])[0]):
+            status = 503
+
+        payload = json.dumps({'method': self.command, 'body': json.loads(body) if body else None}).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    do_GET = do_PUT = do_POST = do_PATCH = do_DELETE = _handle
+
+
+class TransportTestCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), StandInHandler)
+        cls.server.daemon_threads = True
+        cls.server.lock = threading.Lock()
+        cls.server.requests = []
+        cls.server.hits = {}
+        cls.thread = threading.Thread(target=cls.server.serve_forever, daemon=True)
+        cls.thread.start()
+        cls.base_url = f'http://127.0.0.1:{cls.server.server_address[1]}'
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        with self.server.lock:
+            self.server.requests.clear()
+            self.server.hits.clear()
+
+    def make_transport(self, **kwargs):
+        kwargs.setdefault('breaker', CircuitBreaker(failure_threshold=100, cooldown=30))
+        kwargs.setdefault('retry_budget', RetryBudget(ratio=1, max_tokens=100))
+        transport = FirebaseTransport(**kwargs)
+        # Keep retry tests fast; the jitter itself is not under test
+        transport.backoff_base = 0.001
+        transport.backoff_max = 0.01
+        self.addCleanup(transport.close)
+        return transport
+
+    def hits(self, path):
+        with self.server.lock:
+            return self.server.hits.get(path, 0)
+
+
+class ConnectionTests(TransportTestCase):
+    def test_requests_reuse_one_connection(self):
+        transport = self.make_transport()
+        for _ in range(5):
+            self.assertEqual(transport.request('GET', self.base_url + '/ok').status_code, 200)
+        clients = {client for _, _, client in self.server.requests}
+        self.assertEqual(len(self.server.requests), 5)
+        self.assertEqual(len(clients), 1)
+
+    def test_patch_sends_json_body(self):
+        transport = self.make_transport()
+        response = transport.request('PATCH', self.base_url + '/ok', json={'status': 'resolved'})
+        self.assertEqual(response.json(), {'method': 'PATCH', 'body': {'status': 'resolved'}})
+
+    def test_unsupported_method_is_rejected(self):
+        transport = self.make_transport()
+        with self.assertRaises(ValueError):
+            transport.request('OPTIONS', self.base_url + '/ok')
+        self.assertEqual(self.server.requests, [])
+
+    @unittest.skipUnless(hasattr(os, 'fork'), 'needs os.fork')
+    def test_session_is_rebuilt_after_fork(self):
+        transport = self.make_transport()
+        transport.request('GET', self.base_url + '/ok')
+        parent_session = transport._session
+
+        read_end, write_end = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            # Child: report whether it got its own working session, then exit without cleanup
+            try:
+                response = transport.request('GET', self.base_url + '/ok')
+                ok = transport._session is not parent_session and response.status_code == 200
+            except Exception:
+                ok = False
+            os.write(write_end, b'1' if ok else b'0')
+            os._exit(0)
+        os.close(write_end)
+        result = os.read(read_end, 1)
+        os.close(read_end)
+        os.waitpid(pid, 0)
+
+        self.assertEqual(result, b'1')
+        self.assertIs(transport._session, parent_session)
+        clients = {client for _, _, client in self.server.requests}
+        self.assertEqual(len(clients), 2)
+
+
+class TimeoutTests(TransportTestCase):
+    def test_read_timeout_raises_unavailable(self):
+        transport = self.make_transport(read_timeout=0.2, max_attempts=1)
+        started = time.monotonic()
+        with self.assertRaises(FirebaseUnavailable) as raised:
+            transport.request('GET', self.base_url + '/slow?delay=1')
+        self.assertLess(time.monotonic() - started, 0.9)
+        self.assertIn('Read timed out', str(raised.exception))
+
+    def test_connect_timeout_is_retried_then_raises(self):
+        transport = self.make_transport(connect_timeout=0.5, read_timeout=5, max_attempts=3)
+        session = transport._get_session()
+        with mock.patch.object(session, 'request', side_effect=requests.ConnectTimeout('timed out')) as send:
+            with self.assertRaises(FirebaseUnavailable):
+                transport.request('GET', self.base_url + '/ok')
+        self.assertEqual(send.call_count, 3)
+        connect_timeout, read_timeout = send.call_args_list[0].kwargs['timeout']
+        self.assertLessEqual(connect_timeout, 0.5)
+        self.assertLessEqual(read_timeout, 5)
+
+    def test_attempt_timeouts_are_capped_by_the_deadline(self):
+        transport = self.make_transport(connect_timeout=3, read_timeout=10, deadline=0.3, max_attempts=1)
+        started = time.monotonic()
+        with self.assertRaises(FirebaseUnavailable):
+            transport.request('GET', self.base_url + '/slow?delay=1')
+        self.assertLess(time.monotonic() - started, 0.9)
+
+    def test_no_retry_once_the_deadline_has_passed(self):
+        transport = self.make_transport(read_timeout=0.25, deadline=0.4, max_attempts=5)
+        with self.assertRaises(FirebaseUnavailable):
+            transport.request('GET', self.base_url + '/slow?delay=1')
+        self.assertLessEqual(self.hits('/slow'), 2)
+
+
+class RetryTests(TransportTestCase):
+    def test_idempotent_request_is_retried_until_it_succeeds(self):
+        transport = self.make_transport(max_attempts=3)
+        response = transport.request('GET', self.base_url + '/flaky?failures=2')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.hits('/flaky'), 3)
+
+    def test_post_is_not_retried(self):
+        transport = self.make_transport(max_attempts=3)
+        with self.assertRaises(FirebaseUnavailable):
+            transport.request('POST', self.base_url + '/fail', json={'subject': 'x'})
+        self.assertEqual(self.hits('/fail'), 1)
+
+    def test_gives_up_after_max_attempts(self):
+        transport = self.make_transport(max_attempts=3)
+        with self.assertRaises(FirebaseUnavailable):
+            transport.request('PUT', self.base_url + '/fail', json={'a': 1})
+        self.assertEqual(self.hits('/fail'), 3)
+
+    def test_retry_budget_limits_retries(self):
+        transport = self.make_transport(max_attempts=5, retry_budget=RetryBudget(ratio=0, max_tokens=1))
+        with self.assertRaises(FirebaseUnavailable):
+            transport.request('GET', self.base_url + '/fail')
+        self.assertEqual(self.hits('/fail'), 2)
+        with self.assertRaises(FirebaseUnavailable):
+            transport.request('GET', self.base_url + '/fail')
+        self.assertEqual(self.hits('/fail'), 3)
+
+    def test_client_errors_are_returned_not_retried(self):
+        transport = self.make_transport(max_attempts=3)
+        session = transport._get_session()
+        response = requests.Response()
+        response.status_code = 404
+        with mock.patch.object(session, 'request', return_value=response) as send:
+            self.assertEqual(transport.request('GET', self.base_url + '/missing').status_code, 404)
+        self.assertEqual(send.call_count, 1)
+
+
+class CircuitBreakerTests(TransportTestCase):
+    def test_breaker_opens_rejects_and_recovers(self):
+        breaker = CircuitBreaker(failure_threshold=2, cooldown=0.2)
+        transport = self.make_transport(max_attempts=1, breaker=breaker)
+
+        for _ in range(2):
+            with self.assertRaises(FirebaseUnavailable):
+                transport.request('GET', self.base_url + '/fail')
+        self.assertEqual(breaker.state, 'open')
+
+        # Rejected without reaching the server
+        with self.assertRaises(FirebaseUnavailable):
+            transport.request('GET', self.base_url + '/ok')
+        self.assertEqual(self.hits('/ok'), 0)
+
+        time.sleep(0.25)
+        self.assertEqual(breaker.state, 'half-open')
+        self.assertEqual(transport.request('GET', self.base_url + '/ok').status_code, 200)
+        self.assertEqual(breaker.state, 'closed')
+
+    def test_failed_probe_reopens_the_breaker(self):
+        breaker = CircuitBreaker(failure_threshold=1, cooldown=0.2)
+        transport = self.make_transport(max_attempts=1, breaker=breaker)
+        with self.assertRaises(FirebaseUnavailable):
+            transport.request('GET', self.base_url + '/fail')
+        time.sleep(0.25)
+        with self.assertRaises(FirebaseUnavailable):
+            transport.request('GET', self.base_url + '/fail')
+        self.assertEqual(breaker.state, 'open')
+        self.assertEqual(self.hits('/fail'), 2)
+
+    def test_half_open_allows_a_single_probe(self):
+        breaker = CircuitBreaker(failure_threshold=1, cooldown=0.01)
+        breaker.record_failure()
+        time.sleep(0.02)
+        self.assertTrue(breaker.allow())
+        self.assertFalse(breaker.allow())
+
+    def test_stream_requests_bypass_the_breaker(self):
+        breaker = CircuitBreaker(failure_threshold=1, cooldown=30)
+        breaker.record_failure()
+        transport = self.make_transport(breaker=breaker)
+        response = transport.request('GET', self.base_url + '/ok', stream=True)
+        self.assertEqual(response.status_code, 200)
+        response.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
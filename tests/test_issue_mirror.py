@@ -0,0 +1,217 @@
+"""
+IssueMirror against the in-process Firebase emulator.
+
+Each test starts a fresh FirebaseEmulator with a few issues, points a mirror
+at its /issues stream and changes the data through the REST API, so the
+mirror sees the same put/patch events Firebase would send. The emulator's
+drop_streams() ends the open streams the way Firebase does when it closes a
+connection, which exercises reconnecting and resyncing.
+
+Run from the project root:
+    python -m pytest tests
+"""
+
+import time
+import unittest
+
+from firebase_emulator import FirebaseEmulator
+from firebase_transport import CircuitBreaker, FirebaseTransport, RetryBudget
+from issue_mirror import IssueMirror
+from records import IssueRecord
+
+
+ISSUES = {
+    'a': {'student_id': 's1', 'subject': 'Wi-Fi', 'status': 'pending', 'created_at': '2025-01-01T10:00:00'},
+    'b': {'student_id': 's2', 'subject': 'Fees', 'status': 'pending', 'created_at': '2025-01-02T10:00:00'},
+}
+
+
+class MirrorTestCase(unittest.TestCase):
+    def setUp(self):
+        self.emulator = FirebaseEmulator(data={'issues': ISSUES})
+        self.base_url = self.emulator.start()
+        self.addCleanup(self.emulator.stop)
+        self.transport = FirebaseTransport(
+            breaker=CircuitBreaker(failure_threshold=100, cooldown=30),
+            retry_budget=RetryBudget(ratio=1, max_tokens=100)
+        )
+        self.addCleanup(self.transport.close)
+
+    def make_mirror(self, **kwargs):
+        kwargs.setdefault('reconnect_delay', 0.05)
+        kwargs.setdefault('max_reconnect_delay', 0.2)
+        mirror = IssueMirror(self.base_url, self.transport, **kwargs)
+        # Cleanups run last-in first-out, so the mirror stops before the emulator
+        self.addCleanup(mirror.stop)
+        mirror.start()
+        self.assertTrue(mirror.wait_until_ready(timeout=5))
+        return mirror
+
+    def write(self, method, path, body=None):
+        response = self.transport.request(method, f"{self.base_url}{path}.json", json=body)
+        self.assertEqual(response.status_code, 200)
+
+    def wait_for(self, condition, timeout=5):
+        """Poll until condition() is true; events arrive on the mirror's thread"""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if condition():
+                return
+            time.sleep(0.01)
+        self.fail('condition not met before the timeout')
+
+
+class InitialSyncTests(MirrorTestCase):
+    def test_not_ready_before_start(self):
+        mirror = IssueMirror(self.base_url, self.transport)
+        self.assertFalse(mirror.ready)
+        self.assertEqual(mirror.get_all(), {})
+
+    def test_first_put_loads_the_whole_node(self):
+        mirror = self.make_mirror()
+        self.assertTrue(mirror.ready)
+        self.assertEqual(mirror.get_all(), ISSUES)
+        self.assertEqual(len(mirror), 2)
+
+    def test_empty_node_is_ready_and_empty(self):
+        self.write('DELETE', 'issues')
+        mirror = self.make_mirror()
+        self.assertTrue(mirror.ready)
+        self.assertEqual(mirror.get_all(), {})
+
+    def test_stop_clears_ready(self):
+        mirror = self.make_mirror()
+        mirror.stop()
+        self.assertFalse(mirror.ready)
+
+    def test_get_returns_a_copy(self):
+        mirror = self.make_mirror()
+        mirror.get('a')['status'] = 'resolved'
+        self.assertEqual(mirror.get('a')['status'], 'pending')
+
+
+class EventTests(MirrorTestCase):
+    def test_put_adds_and_replaces_a_child(self):
+        mirror = self.make_mirror()
+        self.write('PUT', 'issues/c', {'student_id': 's1', 'subject': 'Library', 'status': 'pending'})
+        self.wait_for(lambda: mirror.get('c') is not None)
+        self.assertEqual(mirror.get('c')['subject'], 'Library')
+
+        self.write('PUT', 'issues/c', {'student_id': 's1', 'subject': 'Library hours'})
+        self.wait_for(lambda: mirror.get('c')['subject'] == 'Library hours')
+        self.assertNotIn('status', mirror.get('c'))
+
+    def test_post_adds_a_child_under_a_push_id(self):
+        mirror = self.make_mirror()
+        self.write('POST', 'issues', {'student_id': 's3', 'subject': 'Parking'})
+        self.wait_for(lambda: len(mirror) == 3)
+        self.assertIn('Parking', [issue['subject'] for issue in mirror.get_all().values()])
+
+    def test_nested_put_changes_one_field(self):
+        mirror = self.make_mirror()
+        self.write('PUT', 'issues/a/status', 'resolved')
+        self.wait_for(lambda: mirror.get('a')['status'] == 'resolved')
+        self.assertEqual(mirror.get('a')['subject'], 'Wi-Fi')
+
+    def test_nested_put_creates_missing_parents(self):
+        mirror = self.make_mirror()
+        self.write('PUT', 'issues/a/history/first', {'status': 'pending'})
+        self.wait_for(lambda: 'history' in mirror.get('a'))
+        self.assertEqual(mirror.get('a')['history'], {'first': {'status': 'pending'}})
+
+    def test_patch_on_a_child_updates_several_fields(self):
+        mirror = self.make_mirror()
+        self.write('PATCH', 'issues/a', {'status': 'resolved', 'response': 'Router replaced'})
+        self.wait_for(lambda: mirror.get('a').get('response') == 'Router replaced')
+        self.assertEqual(mirror.get('a')['status'], 'resolved')
+        self.assertEqual(mirror.get('a')['subject'], 'Wi-Fi')
+
+    def test_multi_path_patch_updates_several_children(self):
+        mirror = self.make_mirror()
+        self.write('PATCH', 'issues', {
+            'a/status': 'in_progress',
+            'b/status': 'resolved',
+            'c': {'student_id': 's1', 'subject': 'Hostel'},
+        })
+        self.wait_for(lambda: mirror.get('c') is not None)
+        self.assertEqual(mirror.get('a')['status'], 'in_progress')
+        self.assertEqual(mirror.get('b')['status'], 'resolved')
+        self.assertEqual(mirror.get('c')['subject'], 'Hostel')
+
+    def test_delete_removes_a_child(self):
+        mirror = self.make_mirror()
+        self.write('DELETE', 'issues/a')
+        self.wait_for(lambda: mirror.get('a') is None)
+        self.assertEqual(list(mirror.get_all()), ['b'])
+
+    def test_null_in_a_patch_deletes_fields_and_children(self):
+        mirror = self.make_mirror()
+        self.write('PATCH', 'issues', {'a/subject': None, 'b': None})
+        self.wait_for(lambda: mirror.get('b') is None)
+        self.assertNotIn('subject', mirror.get('a'))
+
+    def test_deleting_the_last_field_drops_the_child(self):
+        self.write('PUT', 'issues/c', {'subject': 'Only field'})
+        mirror = self.make_mirror()
+        self.write('DELETE', 'issues/c/subject')
+        self.wait_for(lambda: mirror.get('c') is None)
+        self.assertEqual(len(mirror), 2)
+
+    def test_replacing_the_parent_resyncs(self):
+        mirror = self.make_mirror()
+        self.write('PUT', '', {'issues': {'z': {'subject': 'Fresh'}}})
+        self.wait_for(lambda: list(mirror.get_all()) == ['z'])
+        self.assertTrue(mirror.ready)
+
+
+class RecordTypeTests(MirrorTestCase):
+    def test_children_are_stored_as_records_and_read_as_dicts(self):
+        mirror = self.make_mirror(record_type=IssueRecord)
+        self.assertIsInstance(mirror.records()['a'], IssueRecord)
+        self.assertEqual(mirror.get('a'), ISSUES['a'])
+
+    def test_nested_changes_keep_the_record_type(self):
+        mirror = self.make_mirror(record_type=IssueRecord)
+        self.write('PATCH', 'issues', {'a/status': 'resolved', 'a/response': 'Done'})
+        self.wait_for(lambda: mirror.get('a')['status'] == 'resolved')
+        self.assertIsInstance(mirror.records()['a'], IssueRecord)
+        self.assertEqual(mirror.get('a')['response'], 'Done')
+
+
+class ReconnectTests(MirrorTestCase):
+    def test_reconnects_after_the_stream_is_dropped(self):
+        mirror = self.make_mirror()
+        self.emulator.drop_streams()
+        self.wait_for(lambda: mirror.reconnects >= 1 and mirror.ready)
+
+        self.write('PATCH', 'issues/a', {'status': 'resolved'})
+        self.wait_for(lambda: mirror.get('a')['status'] == 'resolved')
+
+    def test_changes_missed_while_disconnected_are_resynced(self):
+        mirror = self.make_mirror(reconnect_delay=0.5)
+        self.emulator.drop_streams()
+        self.wait_for(lambda: not mirror.ready)
+
+        # Written while the mirror is waiting to reconnect, so no event reaches it
+        self.write('DELETE', 'issues/a')
+        self.write('PUT', 'issues/c', {'subject': 'Missed'})
+        self.assertIsNotNone(mirror.get('a'))
+
+        self.wait_for(lambda: mirror.ready and mirror.get('c') is not None)
+        self.assertIsNone(mirror.get('a'))
+        self.assertEqual(mirror.reconnects, 1)
+
+    def test_keeps_retrying_until_the_server_answers(self):
+        mirror = self.make_mirror()
+        self.emulator.failure_rate = 1.0
+        self.emulator.drop_streams()
+        self.wait_for(lambda: mirror.reconnects >= 2)
+        self.assertFalse(mirror.ready)
+
+        self.emulator.failure_rate = 0.0
+        self.wait_for(lambda: mirror.ready)
+        self.assertEqual(mirror.get_all(), ISSUES)
+
+
+if __name__ == '__main__':
+    unittest.main()